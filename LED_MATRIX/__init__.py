@@ -0,0 +1,9 @@
+# __init__.py
+import os
+import sys
+
+# The modules here import each other by bare name so they can still be run as
+# standalone scripts; put this directory on the path when used as a package.
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+if PACKAGE_DIR not in sys.path:
+    sys.path.insert(0, PACKAGE_DIR)
@@ -0,0 +1,13 @@
+# __main__.py
+import os
+import sys
+
+# Running the directory directly (python LED_MATRIX) skips __init__.py
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+if PACKAGE_DIR not in sys.path:
+    sys.path.insert(0, PACKAGE_DIR)
+
+from cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,446 @@
+# agenda.py
+import ctypes
+import ctypes.util
+import os
+import select
+import sys
+import threading
+import time
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+from itertools import count
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from generation import sanitize_text
+from settings import DEBUG, CALENDAR_PATHS, CALENDAR_HORIZON_DAYS, CALENDAR_POLL_INTERVAL
+
+DAY = 86400
+WEEKDAYS = {"MO": 0, "TU": 1, "WE": 2, "TH": 3, "FR": 4, "SA": 5, "SU": 6}
+
+# inotify events that can mean a calendar file changed
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+def unfold(text):
+    """Join the continuation lines of an iCalendar file."""
+    lines = []
+    for line in text.splitlines():
+        if line[:1] in (" ", "\t") and lines:
+            lines[-1] += line[1:]
+        elif line:
+            lines.append(line)
+    return lines
+
+def parse_property(line):
+    """Split a content line into its upper-cased name, parameters and value."""
+    name_params, _, value = line.partition(":")
+    name, *params = name_params.split(";")
+    parameters = {}
+    for param in params:
+        key, _, param_value = param.partition("=")
+        parameters[key.upper()] = param_value.strip('"')
+    return name.upper(), parameters, value
+
+def parse_datetime(value, params):
+    """A DATE or DATE-TIME value as (datetime, all_day); floating and unknown zones are local time."""
+    if params.get("VALUE") == "DATE" or len(value) == 8:
+        return datetime.strptime(value[:8], "%Y%m%d"), True
+    moment = datetime.strptime(value[:15], "%Y%m%dT%H%M%S")
+    if value.endswith("Z"):
+        return moment.replace(tzinfo=timezone.utc), False
+    if "TZID" in params:
+        try:
+            return moment.replace(tzinfo=ZoneInfo(params["TZID"])), False
+        except (ZoneInfoNotFoundError, ValueError):
+            pass  # e.g. Windows zone names from Outlook
+    return moment, False
+
+def parse_duration(value):
+    """An iCalendar DURATION such as PT1H30M or P1D as a timedelta."""
+    sign = -1 if value.startswith("-") else 1
+    value = value.lstrip("+-").lstrip("P")
+    total = timedelta()
+    number = ""
+    for char in value:
+        if char.isdigit():
+            number += char
+        elif char in "WDHMS" and number:
+            unit = {"W": "weeks", "D": "days", "H": "hours", "M": "minutes", "S": "seconds"}[char]
+            total += timedelta(**{unit: int(number)})
+            number = ""
+    return sign * total
+
+def parse_rule(value):
+    return {key.upper(): part for key, _, part in (item.partition("=") for item in value.split(";"))}
+
+def parse_ics(text):
+    """The VEVENTs of an iCalendar file as dicts, with recurrence rules left unexpanded."""
+    events = []
+    event = None
+    nested = 0  # Depth of components inside the event, e.g. VALARM, whose properties are not the event's
+    for line in unfold(text):
+        name, params, value = parse_property(line)
+        if name == "BEGIN" and value.upper() == "VEVENT" and event is None:
+            event = {"uid": None, "summary": "", "start": None, "end": None, "duration": None, "all_day": False,
+                     "rule": None, "exdates": set(), "recurrence_id": None, "cancelled": False}
+            nested = 0
+        elif event is None:
+            continue
+        elif name == "BEGIN":
+            nested += 1
+        elif name == "END" and nested:
+            nested -= 1
+        elif nested:
+            continue
+        elif name == "END" and value.upper() == "VEVENT":
+            if event["start"] is not None and not event["cancelled"]:
+                events.append(finish_event(event))
+            event = None
+        elif name == "UID":
+            event["uid"] = value
+        elif name == "SUMMARY":
+            event["summary"] = value.replace("\\,", ",").replace("\\;", ";").replace("\\n", " ")
+        elif name == "DTSTART":
+            event["start"], event["all_day"] = parse_datetime(value, params)
+        elif name == "DTEND":
+            event["end"] = parse_datetime(value, params)[0]
+        elif name == "DURATION":
+            event["duration"] = parse_duration(value)
+        elif name == "RRULE":
+            event["rule"] = parse_rule(value)
+        elif name == "EXDATE":
+            for item in value.split(","):
+                event["exdates"].add(parse_datetime(item, params)[0].timestamp())
+        elif name == "RECURRENCE-ID":
+            event["recurrence_id"] = parse_datetime(value, params)[0].timestamp()
+        elif name == "STATUS" and value.upper() == "CANCELLED":
+            event["cancelled"] = True
+    return events
+
+def finish_event(event):
+    if event["duration"] is None:
+        if event["end"] is not None:
+            event["duration"] = event["end"] - event["start"]
+        else:
+            event["duration"] = timedelta(days=1) if event["all_day"] else timedelta()
+    del event["end"], event["cancelled"]
+    return event
+
+def month_weekdays(year, month, ordinal, weekday):
+    """Days of the month that are the `ordinal`th `weekday` (negative counts from the end; 0 is all)."""
+    first = datetime(year, month, 1)
+    days_in_month = ((first + timedelta(days=32)).replace(day=1) - first).days
+    days = [day for day in range(1, days_in_month + 1) if (first.weekday() + day - 1) % 7 == weekday]
+    if ordinal == 0:
+        return days
+    index = ordinal - 1 if ordinal > 0 else ordinal
+    return [days[index]] if -len(days) <= index < len(days) else []
+
+def parse_byday(value):
+    """BYDAY items such as MO or -1FR as (ordinal, weekday) pairs; ordinal 0 means every one."""
+    pairs = []
+    for item in value.split(","):
+        item = item.strip().upper()
+        if item[-2:] in WEEKDAYS:
+            pairs.append((int(item[:-2] or 0), WEEKDAYS[item[-2:]]))
+    return pairs
+
+def candidates(start, rule, after, before):
+    """(occurrence, index) pairs of a recurrence rule in order, from about `after` until `before`.
+
+    Daily and weekly rules jump straight to `after` instead of stepping through every earlier
+    period, so old recurring events cost the same as new ones. Unsupported frequencies give
+    only the first occurrence.
+    """
+    freq = rule.get("FREQ", "").upper()
+    interval = max(1, int(rule.get("INTERVAL", 1)))
+    byday = parse_byday(rule.get("BYDAY", ""))
+    start_time = start.timestamp()
+
+    if freq == "DAILY":
+        skip = max(0, int((after - start_time) // DAY) // interval - 1)
+        for n in count(skip):
+            occurrence = start + timedelta(days=n * interval)
+            if occurrence.timestamp() >= before:
+                return
+            yield occurrence, n
+
+    elif freq == "WEEKLY":
+        weekdays = sorted({weekday for _, weekday in byday}) or [start.weekday()]
+        first_week = sum(1 for weekday in weekdays if weekday >= start.weekday())
+        week_start = start - timedelta(days=start.weekday())
+        skip = max(0, int((after - start_time) // (7 * DAY)) // interval - 1)
+        index = 0 if skip == 0 else first_week + (skip - 1) * len(weekdays)
+        for n in count(skip):
+            monday = week_start + timedelta(weeks=n * interval)
+            if monday.timestamp() >= before:
+                return
+            for weekday in weekdays:
+                occurrence = monday + timedelta(days=weekday)
+                if occurrence >= start:
+                    yield occurrence, index
+                    index += 1
+
+    elif freq == "MONTHLY":
+        index = 0
+        for n in count(0):
+            year, month = divmod(start.month - 1 + n * interval, 12)
+            year += start.year
+            if start.replace(year=year, month=month + 1, day=1).timestamp() >= before:
+                return
+            if byday:
+                days = sorted(day for ordinal, weekday in byday for day in month_weekdays(year, month + 1, ordinal, weekday))
+            else:
+                days = [start.day]
+            for day in days:
+                try:
+                    occurrence = start.replace(year=year, month=month + 1, day=day)
+                except ValueError:
+                    continue  # e.g. the 31st in a 30-day month
+                if occurrence >= start:
+                    yield occurrence, index
+                    index += 1
+
+    elif freq == "YEARLY":
+        index = 0
+        for n in count(0):
+            if start.replace(year=start.year + n * interval, month=1, day=1).timestamp() >= before:
+                return
+            try:
+                occurrence = start.replace(year=start.year + n * interval)
+            except ValueError:
+                continue  # 29 February
+            yield occurrence, index
+            index += 1
+
+    else:
+        yield start, 0
+
+def expand(event, window_start, window_end, overridden=frozenset()):
+    """(start, end) timestamps of the event's occurrences that overlap the window."""
+    duration = event["duration"].total_seconds()
+    if event["rule"] is None:
+        start = event["start"].timestamp()
+        if start + duration > window_start and start < window_end:
+            yield start, start + duration
+        return
+
+    rule = event["rule"]
+    limit = int(rule["COUNT"]) if "COUNT" in rule else None
+    until = None
+    if "UNTIL" in rule:
+        until_date, all_day = parse_datetime(rule["UNTIL"], {})
+        until = until_date.timestamp() + (DAY - 1 if all_day else 0)
+    for occurrence, index in candidates(event["start"], rule, window_start - duration, window_end):
+        start = occurrence.timestamp()
+        if (limit is not None and index >= limit) or (until is not None and start > until) or start >= window_end:
+            return
+        if start + duration > window_start and start not in event["exdates"] and (event["uid"], start) not in overridden:
+            yield start, start + duration
+
+def event_text(start, summary, all_day, now):
+    """How an event is shown, e.g. "TUE 14.30 STANDUP", without the day when it is today."""
+    local = datetime.fromtimestamp(start)
+    today = datetime.fromtimestamp(now).date()
+    if local.date() == today:
+        day = ""
+    elif local.date() - today < timedelta(days=7):
+        day = local.strftime("%a") + " "
+    else:
+        day = f"{local.month}/{local.day} "
+    clock = "" if all_day else f"{local.hour:02d}.{local.minute:02d} "
+    return sanitize_text(f"{day}{clock}{summary}").strip().upper() or " "
+
+def calendar_files(paths=CALENDAR_PATHS):
+    """Every .ics file named in `paths` or found under the directories in it."""
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, names in os.walk(path):
+                for name in sorted(names):
+                    if name.lower().endswith(".ics"):
+                        yield os.path.join(directory, name)
+        elif os.path.isfile(path):
+            yield path
+
+def watched_directories(paths=CALENDAR_PATHS):
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, _ in os.walk(path):
+                yield directory
+        elif os.path.isfile(path):
+            yield os.path.dirname(os.path.abspath(path))  # Editors replace files by renaming
+
+class CalendarIndex:
+    """Event occurrences in a window, sorted by start so the next one is a binary search."""
+
+    def __init__(self, occurrences=()):
+        self.occurrences = sorted(occurrences)  # (start, end, summary, all day)
+        self.starts = [occurrence[0] for occurrence in self.occurrences]
+
+    def next_event(self, now):
+        """The first occurrence starting after `now`, or None."""
+        index = bisect_right(self.starts, now)
+        return self.occurrences[index] if index < len(self.occurrences) else None
+
+class Agenda:
+    """Parsed calendar files, re-read only when their mtime or size changes, and their index."""
+
+    def __init__(self, paths=CALENDAR_PATHS, horizon=CALENDAR_HORIZON_DAYS * DAY):
+        self.paths = paths
+        self.horizon = horizon
+        self.files = {}  # path -> (mtime_ns, size, parsed events)
+        self.index = CalendarIndex()
+        self.rebuild_at = 0.0  # When the expanded window needs to move forward
+        self.lock = threading.Lock()  # Held while the index is swapped, not while parsing
+
+    def scan(self):
+        """Re-parse new and changed files and forget removed ones; returns True if anything changed."""
+        changed = False
+        seen = set()
+        for path in calendar_files(self.paths):
+            seen.add(path)
+            try:
+                info = os.stat(path)
+                cached = self.files.get(path)
+                if cached is not None and cached[:2] == (info.st_mtime_ns, info.st_size):
+                    continue
+                with open(path, encoding="utf-8", errors="replace") as f:
+                    events = parse_ics(f.read())
+            except (OSError, ValueError) as e:
+                if DEBUG:
+                    print(f"Error reading calendar {path}: {e}")
+                continue
+            self.files[path] = (info.st_mtime_ns, info.st_size, events)
+            changed = True
+        for path in set(self.files) - seen:
+            del self.files[path]
+            changed = True
+        return changed
+
+    def rebuild(self, now):
+        """Expand every event into a fresh index covering the next CALENDAR_HORIZON_DAYS."""
+        events = [event for _, _, parsed in self.files.values() for event in parsed]
+        overridden = {(event["uid"], event["recurrence_id"]) for event in events if event["recurrence_id"] is not None}
+        window_start, window_end = now - DAY, now + self.horizon
+        occurrences = []
+        for event in events:
+            if event["recurrence_id"] is not None:
+                expanded = expand(event, window_start, window_end)
+            else:
+                expanded = expand(event, window_start, window_end, overridden)
+            for start, end in expanded:
+                occurrences.append((start, end, event["summary"], event["all_day"]))
+        index = CalendarIndex(occurrences)
+        with self.lock:
+            self.index = index
+        self.rebuild_at = now + self.horizon / 2
+
+    def refresh(self, now):
+        """Bring the index up to date with the files; the slow part, kept off the render thread."""
+        if self.scan() or now >= self.rebuild_at:
+            self.rebuild(now)
+
+    def text(self, now):
+        """The next event as scrolling text, or a blank when there is none."""
+        with self.lock:
+            event = self.index.next_event(now)
+        if event is None:
+            return " "
+        start, _, summary, all_day = event
+        return event_text(start, summary, all_day, now)
+
+    def next_change(self, now):
+        """When text() next changes on its own: the next event starts, the day changes or the window moves."""
+        with self.lock:
+            event = self.index.next_event(now)
+        midnight = datetime.fromtimestamp(now).replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        changes = [midnight.timestamp(), self.rebuild_at]
+        if event is not None:
+            changes.append(event[0])
+        return min(changes)
+
+class FileWatcher:
+    """inotify on the calendar directories through libc; without it, waits poll instead."""
+
+    def __init__(self, paths=CALENDAR_PATHS):
+        self.paths = paths
+        self.fd = None
+        try:
+            self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+            self.fd = fd
+        except (OSError, AttributeError) as e:
+            if DEBUG:
+                print(f"No inotify, polling calendars every {CALENDAR_POLL_INTERVAL}s: {e}")
+        self.add_watches()
+
+    def add_watches(self):
+        """Watch every calendar directory; adding an existing watch again is harmless."""
+        if self.fd is None:
+            return
+        for directory in watched_directories(self.paths):
+            self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+
+    def poll_interval(self):
+        """Longest wait before files must be checked by hand, or None when inotify covers them."""
+        if self.fd is None or not all(os.path.exists(path) for path in self.paths):
+            return CALENDAR_POLL_INTERVAL  # inotify cannot see a missing directory appear
+        return None
+
+    def clear(self):
+        """Discard pending events and watch any new subdirectories."""
+        try:
+            while os.read(self.fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+        self.add_watches()
+
+    def wait(self, timeout):
+        poll = self.poll_interval()
+        if poll is not None:
+            timeout = min(timeout, poll)
+        if self.fd is None:
+            time.sleep(timeout)
+            return
+        select.select([self.fd], [], [], timeout)
+        self.clear()
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+
+def run_agenda(state, paths=CALENDAR_PATHS):
+    """Publish the next event to `state` whenever the calendars change or it starts."""
+    agenda = Agenda(paths)
+    watcher = FileWatcher(paths)
+    try:
+        while True:
+            now = time.time()
+            agenda.refresh(now)
+            state.publish(calendar=agenda.text(now))
+            watcher.wait(max(0.0, agenda.next_change(now) - time.time()))
+    finally:
+        watcher.close()
+
+if __name__ == "__main__":
+    # Usage: python agenda.py [calendar.ics or directory ...]  -- prints the index size and next event
+    agenda = Agenda(sys.argv[1:] or CALENDAR_PATHS)
+    start = time.perf_counter()
+    agenda.scan()
+    parsed = time.perf_counter()
+    now = time.time()
+    agenda.rebuild(now)
+    built = time.perf_counter()
+    lookup_start = time.perf_counter()
+    text = agenda.text(now)
+    lookup = time.perf_counter() - lookup_start
+    print(f"{sum(len(events) for _, _, events in agenda.files.values())} events in {len(agenda.files)} files, "
+          f"{len(agenda.index.starts)} occurrences in the next {CALENDAR_HORIZON_DAYS} days")
+    print(f"parse {(parsed - start) * 1000:.1f} ms, index {(built - parsed) * 1000:.1f} ms, "
+          f"lookup {lookup * 1e6:.1f} us: {text!r}")
@@ -0,0 +1,140 @@
+# animation.py
+import random
+import time
+from bisect import bisect_right
+from led_serial import pack_grid
+
+WIDTH = 9
+HEIGHT = 34
+FRAME_BITS = WIDTH * HEIGHT
+FULL_MASK = (1 << FRAME_BITS) - 1
+
+ANIMATION_CACHE = {}  # Compiled animations by name
+
+class Animation:
+    """Packed frames with how long each one stays up, compiled once and replayed many times."""
+
+    def __init__(self, frames, durations):
+        self.frames = tuple(bytes(frame) for frame in frames)
+        self.ends = []
+        elapsed = 0.0
+        for duration in durations:
+            elapsed += duration
+            self.ends.append(elapsed)
+        self.total = elapsed
+
+def compile_animation(grids, durations):
+    """Pack a list of 0/1 grids; `durations` is one value for all frames or one per frame."""
+    if isinstance(durations, (int, float)):
+        durations = [durations] * len(grids)
+    return Animation([pack_grid(grid) for grid in grids], durations)
+
+def cached_animation(name, build):
+    """Compile an animation with `build()` on first use and reuse it afterwards."""
+    animation = ANIMATION_CACHE.get(name)
+    if animation is None:
+        animation = ANIMATION_CACHE[name] = build()
+    return animation
+
+class AnimationPlayer:
+    """Step through an animation from the caller's frame clock without blocking."""
+
+    def __init__(self):
+        self.animation = None
+        self.start = 0.0
+        self.loop = False
+        self.last_index = None
+
+    def play(self, animation, loop=False, now=None):
+        self.animation = animation
+        self.start = time.time() if now is None else now
+        self.loop = loop
+        self.last_index = None
+
+    def stop(self):
+        self.animation = None
+
+    def index_at(self, now):
+        elapsed = now - self.start
+        if self.loop and self.animation.total > 0:
+            elapsed %= self.animation.total
+        return bisect_right(self.animation.ends, elapsed)
+
+    @property
+    def active(self):
+        return self.animation is not None
+
+    def next_frame(self, now=None):
+        """Return the frame due at `now` if it differs from the last one returned, else None."""
+        if self.animation is None:
+            return None
+        if now is None:
+            now = time.time()
+        index = self.index_at(now)
+        if index >= len(self.animation.frames):
+            self.animation = None
+            return None
+        if index == self.last_index:
+            return None
+        self.last_index = index
+        return self.animation.frames[index]
+
+    def time_to_next(self, now=None):
+        """Seconds until the next frame change, for sleeping between frames."""
+        if self.animation is None:
+            return 0.0
+        if now is None:
+            now = time.time()
+        index = self.index_at(now)
+        if index >= len(self.animation.frames):
+            return 0.0
+        elapsed = now - self.start
+        if self.loop and self.animation.total > 0:
+            elapsed %= self.animation.total
+        return max(0.0, self.animation.ends[index] - elapsed)
+
+def frame_bits(vals):
+    return int.from_bytes(bytes(vals), "little") & FULL_MASK
+
+def bits_frame(bits):
+    return (bits & FULL_MASK).to_bytes(39, "little")
+
+def wipe(from_vals, to_vals, duration, steps=17):
+    """Reveal the new screen from the top down."""
+    old, new = frame_bits(from_vals), frame_bits(to_vals)
+    frames = []
+    for step in range(1, steps + 1):
+        mask = (1 << (WIDTH * (HEIGHT * step // steps))) - 1
+        frames.append(bits_frame((old & ~mask) | (new & mask)))
+    return Animation(frames, [duration / steps] * steps)
+
+def slide(from_vals, to_vals, duration, steps=17):
+    """Push the old screen up and out while the new one slides in from the bottom."""
+    old, new = frame_bits(from_vals), frame_bits(to_vals)
+    frames = []
+    for step in range(1, steps + 1):
+        rows = HEIGHT * step // steps
+        frames.append(bits_frame((old >> (WIDTH * rows)) | (new << (WIDTH * (HEIGHT - rows)))))
+    return Animation(frames, [duration / steps] * steps)
+
+def dissolve(from_vals, to_vals, duration, steps=12, seed=0):
+    """Switch pixels over to the new screen in a random order."""
+    old, new = frame_bits(from_vals), frame_bits(to_vals)
+    order = list(range(FRAME_BITS))
+    random.Random(seed).shuffle(order)
+    frames = []
+    mask = 0
+    for step in range(1, steps + 1):
+        for bit in order[FRAME_BITS * (step - 1) // steps:FRAME_BITS * step // steps]:
+            mask |= 1 << bit
+        frames.append(bits_frame((old & ~mask) | (new & mask)))
+    return Animation(frames, [duration / steps] * steps)
+
+TRANSITIONS = {
+    "wipe": wipe,
+    "slide": slide,
+    "dissolve": dissolve,
+}
+
+def make_transition(name, from_vals, to_vals, duration):
+    return TRANSITIONS[name](from_vals, to_vals, duration)
@@ -1,168 +1,342 @@
-import threading
 import time
-import serial
-from settings import DELAY, WIDTH, HEIGHT, BRIGHTNESS
-from led_serial import FWK_MAGIC, detect_serial_port, set_brightness, clear_leds, send_command_raw
-from weather import get_nws_forecast_url, get_current_temperature_and_icon_from_forecast, get_forecast_text
+from settings import (DELAY, WIDTH, HEIGHT, WEATHER_REFRESH_INTERVAL, WEATHER_RETRY_INTERVAL, NEXT_HOURS, TRANSITION, TRANSITION_TIME,
+                      IDLE_SCREEN, CLOCK_WIDGET, RUNTIME, SHARED_FRAMEBUFFER,
+                      SHOW_CALENDAR)
+from led_serial import detect_serial_port, set_brightness, clear_leds, pack_grid, send_frame, send_greyscale
+from weather import get_nws_forecast_url, refresh_forecast, get_current_period, get_next_hours_text, get_forecast_text
 from ipaddresses import get_private_ip, get_public_ip
-from generation import scroll_text, generate_temperature_grid, combine_grids
+from generation import scroll_text, generate_temperature_grid, combine_grids, sanitize_text
 from brick_breaker import start_brick_breaker_thread, clear_leds, stop_brick_breaker
+from life import start_life_thread, stop_life
 from system_monitor import main_loop as system_monitor_loop  # Import the main loop of system_monitor.py
+from providers import configure_providers, provider_time
+from control_socket import PushQueue, serve_control_socket
+from backends import open_output, needs_serial_port
+from animation import AnimationPlayer, make_transition
+from state_store import StateStore
+from brightness import BrightnessController
+from clock import run_clock, draw_fields, countdown_fields
+from supervisor import Supervisor, heartbeat, HEARTBEAT_INTERVAL
+from framebuffer import serve_shared_framebuffer
+from agenda import run_agenda
 
-shared_data = {
-    "temperature": None,
-    "forecast_word": None,
-    "private_ip": None,
-    "public_ip": None
+# Latest dashboard inputs; no_public_ip tracks the state of the IP availability
+state = StateStore(
+    temperature=None,
+    forecast_word=None,
+    private_ip=None,
+    public_ip=None,
+    no_public_ip=False,
+    brightness=None,
+    clock=None,  # (upper, lower) digits of the clock widget
+    calendar=None,  # Next calendar event, shown in place of the private IP
+)
+
+# Screens shown while there is no public IP, as (start, stop) functions
+IDLE_SCREENS = {
+    "breaker": (start_brick_breaker_thread, stop_brick_breaker),
+    "life": (start_life_thread, stop_life),
 }
-data_lock = threading.Lock()
 
-# Flag to track the state of the IP availability
-no_public_ip = False 
+# Messages and frames pushed by other programs through the control socket
+push_queue = PushQueue(on_push=state.notify)
 
-def display_temperature_and_scroll(serial_connection):
-    forecast_offset = 0
-    private_ip_offset = 0
-    public_ip_offset = 0
+def same_source(source, last_source):
+    """True when `source` continues what is shown, e.g. the next frame of the shared framebuffer."""
+    if source is last_source:
+        return True
+    return (isinstance(source, dict) and isinstance(last_source, dict)
+            and source.get("stream") is not None and source.get("stream") == last_source.get("stream"))
 
-    while True:
-        with data_lock:
-            temperature = shared_data["temperature"]
-            forecast_word = shared_data["forecast_word"]
-            private_ip = shared_data["private_ip"]
-            public_ip = shared_data["public_ip"]
+def render_pushed_item(item):
+    """Return the packed frame due for a 1-bit pushed item and the delay before the next one."""
+    if item["type"] == "text":
+        text_grid = scroll_text(item["text"])
+        text_length = len(text_grid[0])
+        full_grid = [[0] * WIDTH for _ in range(34)]
+        for row in range(5):
+            visible = text_grid[row][item["offset"]:item["offset"] + WIDTH]
+            visible += text_grid[row][:WIDTH - len(visible)]
+            full_grid[15 + row] = visible
+        item["offset"] = (item["offset"] + 1) % text_length
+        return bytes(pack_grid(full_grid)), DELAY
+
+    if item["type"] == "countdown":
+        now = time.time()
+        remaining = item["end"] - now
+        full_grid = [[0] * WIDTH for _ in range(34)]
+        if remaining > 0:
+            draw_fields(full_grid, *countdown_fields(remaining))
+            delay = remaining % 1 or 1.0  # Redraw exactly when the seconds digit changes
+        else:
+            if int(-remaining * 2) % 2 == 0:  # Flash 00 00 every half second once finished
+                draw_fields(full_grid, "00", "00")
+            delay = 0.5 - (-remaining % 0.5)
+        return bytes(pack_grid(full_grid)), delay
+
+    if item["type"] == "animation":
+        index = int((time.time() - item["start"]) / item["delay"]) % len(item["frames"])
+        return item["frames"][index], item["delay"]
+
+    return item["data"], DELAY
+
+def render_dashboard(temperature, forecast_word, private_ip, public_ip, offsets, clock=None):
+    """Compose the dashboard at the given scroll offsets; returns the packed frame and the next offsets."""
+    forecast_offset, private_ip_offset, public_ip_offset = offsets
+
+    # Generate grids for each part of the display
+    forecast_grid = scroll_text(forecast_word)
+    temperature_grid = generate_temperature_grid(temperature)
+    private_ip_grid = scroll_text(private_ip)
+    public_ip_grid = scroll_text(public_ip)
+
+    forecast_length = len(forecast_grid[0])
+    private_ip_length = len(private_ip_grid[0])
+    public_ip_length = len(public_ip_grid[0])
+    forecast_offset %= forecast_length
+    private_ip_offset %= private_ip_length
+    public_ip_offset %= public_ip_length
+
+    # Apply the offsets for scrolling
+    visible_forecast = [row[forecast_offset:forecast_offset + WIDTH] for row in forecast_grid]
+    visible_private_ip = [row[private_ip_offset:private_ip_offset + WIDTH] for row in private_ip_grid]
+    visible_public_ip = [row[public_ip_offset:public_ip_offset + WIDTH] for row in public_ip_grid]
+
+    # Wrap the text if the offset exceeds the length of the grid
+    for row in range(5):
+        if len(visible_forecast[row]) < WIDTH:
+            visible_forecast[row] += forecast_grid[row][:WIDTH - len(visible_forecast[row])]
+        if len(visible_private_ip[row]) < WIDTH:
+            visible_private_ip[row] += private_ip_grid[row][:WIDTH - len(visible_private_ip[row])]
+        if len(visible_public_ip[row]) < WIDTH:
+            visible_public_ip[row] += public_ip_grid[row][:WIDTH - len(visible_public_ip[row])]
+
+    # Combine grids for the final display
+    full_grid = [[0] * WIDTH for _ in range(35)]
+    for row in range(5):
+        full_grid[row][:WIDTH] = visible_forecast[row]
+    for row in range(5):
+        full_grid[6 + row][:WIDTH] = temperature_grid[row][:WIDTH]
+    for row in range(5):
+        full_grid[17 + row][:WIDTH] = visible_private_ip[row]
+    for row in range(5):
+        full_grid[29 + row][:WIDTH] = visible_public_ip[row]
+    if clock is not None:
+        draw_fields(full_grid, *clock)
+
+    # Update the scrolling offsets
+    next_offsets = (
+        (forecast_offset + 1) % forecast_length,
+        (private_ip_offset + 1) % private_ip_length,
+        (public_ip_offset + 1) % public_ip_length,
+    )
+    return bytes(pack_grid(full_grid)), next_offsets
+
+class DashboardDisplay:
+    """Draws the dashboard, pushed items and transitions; one step() per frame."""
+
+    def __init__(self, serial_connection):
+        self.serial_connection = serial_connection
+        self.offsets = (0, 0, 0)
+        self.last_source = None  # "dashboard" or the pushed item currently shown
+        self.last_frame = None  # Packed frame currently on the panel
+        self.last_brightness = None
+        self.transition = AnimationPlayer()
+
+    def step(self):
+        """Draw whatever is due; returns (version, timeout) for the wait until the next step.
+
+        The caller waits for a state change after `version` or `timeout` seconds, whichever is
+        first, or simply sleeps `timeout` when `version` is None.
+        """
+        version, data = state.snapshot()
+
+        # Only talk to the panel about brightness when the level changes
+        if data["brightness"] is not None and data["brightness"] != self.last_brightness:
+            set_brightness(self.serial_connection, data["brightness"])
+            self.last_brightness = data["brightness"]
 
         # If no public IP, stop the normal display loop
-        if no_public_ip:
-            time.sleep(1)  # Pause while brick breaker runs
-            continue
+        if data["no_public_ip"]:
+            self.last_source = self.last_frame = None
+            return version, HEARTBEAT_INTERVAL  # Pause while the idle screen runs
 
-        if temperature is None or forecast_word is None or private_ip is None or public_ip is None:
-            time.sleep(1)
-            continue
+        # Finish a running screen transition before drawing new content
+        if self.transition.active:
+            frame = self.transition.next_frame()
+            if frame is not None:
+                send_frame(self.serial_connection, frame)
+                self.last_frame = frame
+            return None, self.transition.time_to_next()
 
-        # Generate grids for each part of the display
-        forecast_grid = scroll_text(forecast_word)
-        temperature_grid = generate_temperature_grid(temperature)
-        private_ip_grid = scroll_text(private_ip)
-        public_ip_grid = scroll_text(public_ip)
+        # Pushed items take over the panel until they expire
+        pushed = push_queue.current()
+        if pushed is not None and pushed["type"] == "grey":
+            if pushed is not self.last_source:
+                send_greyscale(self.serial_connection, pushed["columns"])
+            self.last_source, self.last_frame = pushed, None
+            return version, min(max(0.0, pushed["expires"] - time.time()), HEARTBEAT_INTERVAL)
 
-        forecast_length = len(forecast_grid[0])
-        private_ip_length = len(private_ip_grid[0])
-        public_ip_length = len(public_ip_grid[0])
+        if pushed is not None:
+            source = pushed
+            frame, delay = render_pushed_item(pushed)
+        else:
+            middle = data["calendar"] if SHOW_CALENDAR else data["private_ip"]
+            inputs = (data["temperature"], data["forecast_word"], middle, data["public_ip"])
+            if None in inputs:
+                return version, HEARTBEAT_INTERVAL
+            source = "dashboard"
+            frame, self.offsets = render_dashboard(*inputs, self.offsets, data["clock"])
+            delay = DELAY
 
-        # Apply the offsets for scrolling
-        visible_forecast = [row[forecast_offset:forecast_offset + WIDTH] for row in forecast_grid]
-        visible_private_ip = [row[private_ip_offset:private_ip_offset + WIDTH] for row in private_ip_grid]
-        visible_public_ip = [row[public_ip_offset:public_ip_offset + WIDTH] for row in public_ip_grid]
+        # Animate the change when switching between the dashboard and pushed items
+        if TRANSITION and not same_source(source, self.last_source) and self.last_frame is not None:
+            self.transition.play(make_transition(TRANSITION, self.last_frame, frame, TRANSITION_TIME))
+            self.last_source = source
+            return None, 0
 
-        # Wrap the text if the offset exceeds the length of the grid
-        for row in range(5):
-            if len(visible_forecast[row]) < WIDTH:
-                visible_forecast[row] += forecast_grid[row][:WIDTH - len(visible_forecast[row])]
-            if len(visible_private_ip[row]) < WIDTH:
-                visible_private_ip[row] += private_ip_grid[row][:WIDTH - len(visible_private_ip[row])]
-            if len(visible_public_ip[row]) < WIDTH:
-                visible_public_ip[row] += public_ip_grid[row][:WIDTH - len(visible_public_ip[row])]
-
-        # Combine grids for the final display
-        full_grid = [[0] * WIDTH for _ in range(35)]
-        for row in range(5):
-            full_grid[row][:WIDTH] = visible_forecast[row]
-        for row in range(5):
-            full_grid[6 + row][:WIDTH] = temperature_grid[row][:WIDTH]
-        for row in range(5):
-            full_grid[17 + row][:WIDTH] = visible_private_ip[row]
-        for row in range(5):
-            full_grid[29 + row][:WIDTH] = visible_public_ip[row]
+        if frame != self.last_frame:
+            send_frame(self.serial_connection, frame)
+        self.last_source, self.last_frame = source, frame
+        return version, delay  # Next scroll step, or sooner if the inputs change
+
+def display_temperature_and_scroll(serial_connection):
+    display = DashboardDisplay(serial_connection)
+    while True:
+        heartbeat()
+        version, timeout = display.step()
+        if version is None:
+            time.sleep(timeout)
+        else:
+            state.wait_for_change(version, timeout)
+
+class DataUpdater:
+    """Publishes weather, brightness and IP changes to `state`; the fetches are left to the caller."""
+
+    def __init__(self, serial_connection):
+        self.serial_connection = serial_connection
+        self.next_weather_check = 0
+        self.last_ip_check = 0
+        self.last_period = None
+        self.period_published = False
+        self.ip_interval = 5
+        self.brightness = BrightnessController()
+        self.start_idle_screen, self.stop_idle_screen = IDLE_SCREENS[IDLE_SCREEN]
+
+    def weather_due(self, now):
+        return now >= self.next_weather_check
+
+    def weather_checked(self, now, refreshed):
+        """Schedule the next download: a full interval after a refresh, soon after a failure."""
+        self.next_weather_check = now + (WEATHER_REFRESH_INTERVAL if refreshed else WEATHER_RETRY_INTERVAL)
+
+    def ips_due(self, now):
+        return now - self.last_ip_check >= self.ip_interval
 
-        # Flatten the grid for the LED matrix and send it
-        flattened_vals = [val for row in full_grid for val in row]
-        vals = [0x00 for _ in range(39)]
-        for i in range(min(len(flattened_vals), 315)):
-            if flattened_vals[i]:
-                vals[i // 8] |= (1 << (i % 8))
+    def update_local(self, now):
+        """Publish the brightness level and the cached forecast period for `now`."""
+        level = self.brightness.update(now)
+        if level is not None:
+            state.publish(brightness=level)
 
-        command = FWK_MAGIC + [0x06] + vals
-        send_command_raw(serial_connection, command)
-        set_brightness(serial_connection, BRIGHTNESS)
+        # Advance through the cached hourly periods locally
+        period = get_current_period(now)
+        if period is not self.last_period or not self.period_published:
+            if period is not None:
+                forecast_word = get_forecast_text(period["shortForecast"])
+                if NEXT_HOURS:
+                    forecast_word += " " + get_next_hours_text(NEXT_HOURS, now)
+                state.publish(temperature=period["temperature"], forecast_word=sanitize_text(forecast_word))
+            else:
+                state.publish(temperature=" ", forecast_word=" ")
+            self.last_period = period
+            self.period_published = True
 
-        # Update the scrolling offsets
-        forecast_offset = (forecast_offset + 1) % forecast_length
-        private_ip_offset = (private_ip_offset + 1) % private_ip_length
-        public_ip_offset = (public_ip_offset + 1) % public_ip_length
+    def apply_ips(self, private_ip, public_ip, now):
+        """Publish freshly fetched addresses, switching to the idle screen while there is no public IP."""
+        no_public_ip = state.snapshot()[1]["no_public_ip"]
 
-        time.sleep(DELAY)
+        # Check if public IP is available
+        if public_ip == " ":
+            if not no_public_ip:
+                state.publish(no_public_ip=True)
+                clear_leds(self.serial_connection)
+                self.start_idle_screen(self.serial_connection)
+        else:
+            if no_public_ip:
+                self.stop_idle_screen()  # Stop the brick breaker or life screensaver
+                clear_leds(self.serial_connection)  # Clear the screen before resuming normal display
+        state.publish(private_ip=private_ip, public_ip=public_ip, no_public_ip=public_ip == " ")
+
+        self.last_ip_check = now
+
+    def close(self):
+        self.brightness.close()
 
 def update_data(serial_connection):
-    global no_public_ip
-    last_weather_check = 0
-    last_ip_check = 0
-    weather_interval = 600
-    ip_interval = 5
+    updater = DataUpdater(serial_connection)
 
     try:
         while True:
-            current_time = time.time()
+            heartbeat()
+            current_time = provider_time()  # The recording's clock when replaying
 
-            if current_time - last_weather_check >= weather_interval:
+            if updater.weather_due(current_time):
                 forecast_url = get_nws_forecast_url()
-                if forecast_url:
-                    temp, short_forecast = get_current_temperature_and_icon_from_forecast(forecast_url)
-                    with data_lock:
-                        if temp is not None:
-                            shared_data["temperature"] = temp
-                            shared_data["forecast_word"] = get_forecast_text(short_forecast)
-                        else:
-                            shared_data["temperature"] = " "
-                            shared_data["forecast_word"] = " "
-                last_weather_check = current_time
-
-            if current_time - last_ip_check >= ip_interval:
-                private_ip = get_private_ip()
-                public_ip = get_public_ip()
-                with data_lock:
-                    shared_data["private_ip"] = private_ip
-                    shared_data["public_ip"] = public_ip
-
-                # Check if public IP is available
-                if public_ip == " ":
-                    if not no_public_ip:
-                        clear_leds(serial_connection)
-                        start_brick_breaker_thread(serial_connection)
-                    no_public_ip = True
-                else:
-                    if no_public_ip:
-                        stop_brick_breaker()  # Stop the brick breaker
-                        clear_leds(serial_connection)  # Clear the screen before resuming normal display
-                    no_public_ip = False
-
-                last_ip_check = current_time
+                updater.weather_checked(current_time, bool(forecast_url) and refresh_forecast(forecast_url))
+
+            updater.update_local(current_time)
+
+            if updater.ips_due(current_time):
+                updater.apply_ips(get_private_ip(), get_public_ip(), current_time)
 
             time.sleep(1)
 
-    except Exception as e:
-        print(f"Error in update_data thread: {e}")
+    finally:
+        updater.close()
 
 def start_threads(serial_connection):
-    display_thread = threading.Thread(target=display_temperature_and_scroll, args=(serial_connection,), daemon=True)
-    display_thread.start()
+    """Start every worker under a supervisor that restarts them when they fail."""
+    supervisor = Supervisor()
+    supervisor.add("display", display_temperature_and_scroll, serial_connection)
+
+    # System monitoring (CPU, memory, battery, etc.) on the other module
+    supervisor.add("system_monitor", system_monitor_loop, slow_after=2)
 
-    # Start the thread to handle the system monitoring (CPU, memory, battery, etc.)
-    system_monitor_thread = threading.Thread(target=system_monitor_loop, daemon=True)
-    system_monitor_thread.start()
+    # Weather and IP fetches can take a few seconds, but not ten
+    supervisor.add("update_data", update_data, serial_connection, slow_after=10)
 
-    data_thread = threading.Thread(target=update_data, args=(serial_connection,), daemon=True)
-    data_thread.start()
+    # Accept pushed messages and frames from other programs
+    supervisor.add("control_socket", serve_control_socket, push_queue, stuck_after=None)
+
+    # Frames written in place by high-rate producers
+    if SHARED_FRAMEBUFFER:
+        supervisor.add("framebuffer", serve_shared_framebuffer, push_queue, stuck_after=None)
+
+    # Parse calendar files as they change, away from the display thread
+    if SHOW_CALENDAR:
+        supervisor.add("calendar", run_agenda, state, stuck_after=None)
+
+    # Publish the clock widget's digits on the exact minute or day they change
+    if CLOCK_WIDGET:
+        supervisor.add("clock", run_clock, state, stuck_after=None)
+
+    supervisor.start()
+    return supervisor
 
 def main_loop():
+    if RUNTIME == "asyncio":
+        from async_runtime import main_loop as async_main_loop
+        return async_main_loop()
+
+    configure_providers()
     SERIAL_PORT = detect_serial_port()
-    if not SERIAL_PORT:
+    if not SERIAL_PORT and needs_serial_port():
         print("No serial port detected.")
         return
 
     try:
-        with serial.Serial(SERIAL_PORT, 115200) as ser:
+        with open_output(SERIAL_PORT) as ser:
         
             start_threads(ser)
             while True:
@@ -0,0 +1,531 @@
+# async_runtime.py
+import asyncio
+import json
+import os
+import signal
+import ssl
+import subprocess
+import threading
+import time
+import traceback
+import tty
+import urllib.parse
+from settings import (DEBUG, LATITUDE, LONGITUDE, CLOCK_WIDGET, HTTP_TIMEOUT, LOOP_LAG_WARNING, VOLUME_EVENTS,
+                      WORKER_BACKOFF_MIN, WORKER_BACKOFF_MAX, CONTROL_SOCKET, SHARED_FRAMEBUFFER,
+                      SHOW_CALENDAR)
+from led_serial import detect_serial_port, set_brightness, clear_leds
+from backends import open_output, needs_serial_port
+from providers import async_provider, configure_providers, provider_time
+from weather import LOCATION_API, conditional_headers, apply_forecast
+from ipaddresses import get_private_ip
+from control_socket import bind_control_socket, receive_message, MAX_DATAGRAM
+from clock import WallClockTimer, clock_fields, next_change, FALLBACK_MAX_SLEEP
+from supervisor import BACKOFF_RESET
+from framebuffer import SharedFramebuffer, queue_newest_frame
+from agenda import Agenda, FileWatcher
+import app
+import system_monitor
+
+USER_AGENT = "Framework16-LED-Matrix"  # api.weather.gov rejects requests without one
+MAX_PENDING = 4096  # Bytes queued for a panel before whole commands are dropped
+LAG_CHECK_INTERVAL = 1  # Seconds between event loop lag measurements
+DRAIN_TIMEOUT = 1  # Seconds shutdown waits for the last commands to reach the panels
+
+class HttpError(Exception):
+    pass
+
+async def http_get(url, headers=None, timeout=HTTP_TIMEOUT):
+    """GET `url`, giving up after `timeout` seconds; returns (status, lower-cased headers, body)."""
+    return await asyncio.wait_for(request(url, headers or {}), timeout)
+
+async def request(url, headers):
+    parts = urllib.parse.urlsplit(url)
+    secure = parts.scheme == "https"
+    reader, writer = await asyncio.open_connection(
+        parts.hostname, parts.port or (443 if secure else 80), ssl=ssl.create_default_context() if secure else None)
+    try:
+        target = parts.path or "/"
+        if parts.query:
+            target += "?" + parts.query
+        lines = [f"GET {target} HTTP/1.1", f"Host: {parts.netloc}", f"User-Agent: {USER_AGENT}",
+                 "Accept-Encoding: identity", "Connection: close"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+        status_line = (await reader.readline()).split()
+        if len(status_line) < 2 or not status_line[1].isdigit():
+            raise HttpError(f"bad status line from {parts.hostname}")
+        status = int(status_line[1])
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+
+        if status in (204, 304):
+            body = b""
+        elif response_headers.get("transfer-encoding", "").lower() == "chunked":
+            body = bytearray()
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    break
+                body += await reader.readexactly(size)
+                await reader.readline()  # CRLF after each chunk
+        elif "content-length" in response_headers:
+            body = await reader.readexactly(int(response_headers["content-length"]))
+        else:
+            body = await reader.read()
+        return status, response_headers, bytes(body)
+    finally:
+        writer.close()
+
+# Coroutine versions of the network providers, recorded and replayed under the same names
+
+@async_provider("forecast_url")
+async def fetch_forecast_url():
+    latitude = LATITUDE
+    longitude = LONGITUDE
+    try:
+        #try and pull location data
+        data = json.loads((await http_get(LOCATION_API))[2])
+        latitude = data['lat']
+        longitude = data['lon']
+    except Exception as e:
+        if DEBUG:
+            print(f"Error fetching location URL: {e}")
+
+    try:
+        status, _, body = await http_get(f"https://api.weather.gov/points/{latitude},{longitude}")
+        return json.loads(body)['properties']['forecastHourly']
+    except Exception as e:
+        if DEBUG:
+            print(f"Error fetching forecast URL: {e}")
+        return None
+
+@async_provider("forecast")
+async def fetch_forecast(forecast_url, headers):
+    """Download the hourly forecast; returns the same result as weather.fetch_forecast."""
+    try:
+        status, response_headers, body = await http_get(forecast_url, headers)
+        if status == 304:
+            return {"status": 304}
+        return {
+            "status": status,
+            "periods": json.loads(body)['properties']['periods'],
+            "etag": response_headers.get('etag'),
+            "last_modified": response_headers.get('last-modified'),
+        }
+    except Exception as e:
+        if DEBUG:
+            print(f"Error getting forecast data: {e}")
+        return None
+
+@async_provider("public_ip")
+async def fetch_public_ip():
+    try:
+        status, _, body = await http_get('https://api.ipify.org?format=text')
+        return body.decode() if status == 200 else " "
+    except Exception as e:
+        if DEBUG:
+            print(f"Error fetching public IP: {e}")
+        return " "
+
+class AsyncSerial:
+    """Write-only panel connection on a non-blocking fd, flushed by the event loop.
+
+    Writes from other threads, e.g. an idle screen, are handed to the loop. Each command is queued
+    whole or dropped whole, so a slow panel loses frames but never receives half a command.
+    """
+
+    def __init__(self, port, loop):
+        self.loop = loop
+        self.loop_thread = threading.get_ident()
+        self.fd = os.open(port, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        if os.isatty(self.fd):
+            tty.setraw(self.fd)
+        self.pending = bytearray()
+        self.drained = asyncio.Event()
+        self.drained.set()
+        self.dropped = 0
+
+    def write(self, data):
+        data = bytes(data)
+        if threading.get_ident() == self.loop_thread:
+            self.queue(data)
+        else:
+            try:
+                self.loop.call_soon_threadsafe(self.queue, data)
+            except RuntimeError:
+                pass  # The loop has shut down; the panel is already cleared
+        return len(data)
+
+    def queue(self, data):
+        if self.fd is None:
+            return
+        if len(self.pending) + len(data) > MAX_PENDING:
+            self.dropped += 1
+            if DEBUG:
+                print(f"Panel is not keeping up: dropped {self.dropped} commands")
+            return
+        if not self.pending:
+            try:
+                data = data[os.write(self.fd, data):]
+            except BlockingIOError:
+                pass
+            if not data:
+                return
+            self.loop.add_writer(self.fd, self.flush)
+            self.drained.clear()
+        self.pending += data
+
+    def flush(self):
+        try:
+            del self.pending[:os.write(self.fd, self.pending)]
+        except BlockingIOError:
+            return
+        except OSError as ex:
+            print(f"Error sending command: {ex}")
+            self.pending.clear()
+        if not self.pending:
+            self.loop.remove_writer(self.fd)
+            self.drained.set()
+
+    async def drain(self, timeout=DRAIN_TIMEOUT):
+        """Wait until every queued command has been written, or `timeout` passes."""
+        try:
+            await asyncio.wait_for(self.drained.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def close(self):
+        if self.fd is not None:
+            if self.pending:
+                self.loop.remove_writer(self.fd)
+            os.close(self.fd)
+            self.fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def open_panel(port, loop):
+    """open_output with the serial backend replaced by AsyncSerial."""
+    return open_output(port, open_serial=lambda port: AsyncSerial(port, loop))
+
+async def drain_panel(panel):
+    for output in getattr(panel, "outputs", [panel]):
+        if isinstance(output, AsyncSerial):
+            await output.drain()
+
+class StateWaiter:
+    """Await new versions of a StateStore from the event loop."""
+
+    def __init__(self, store, loop):
+        self.store = store
+        self.changed = asyncio.Event()
+
+        def wake():
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(self.changed.set)
+        store.add_listener(wake)
+
+    async def wait_for_change(self, since_version, timeout=None):
+        """Like StateStore.wait_for_change, without blocking the loop."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self.changed.clear()
+            if self.store.snapshot()[0] != since_version:
+                break
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(self.changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+        return self.store.snapshot()
+
+async def run_display(panel, waiter):
+    display = app.DashboardDisplay(panel)
+    while True:
+        version, timeout = display.step()
+        if version is None:
+            await asyncio.sleep(timeout)
+        else:
+            await waiter.wait_for_change(version, timeout)
+
+async def run_data(panel):
+    updater = app.DataUpdater(panel)
+    try:
+        while True:
+            current_time = provider_time()  # The recording's clock when replaying
+
+            if updater.weather_due(current_time):
+                forecast_url = await fetch_forecast_url()
+                refreshed = False
+                if forecast_url:
+                    refreshed = apply_forecast(forecast_url, await fetch_forecast(forecast_url, conditional_headers(forecast_url)))
+                updater.weather_checked(current_time, refreshed)
+
+            updater.update_local(current_time)
+
+            if updater.ips_due(current_time):
+                updater.apply_ips(get_private_ip(), await fetch_public_ip(), current_time)
+
+            await asyncio.sleep(1)
+    finally:
+        updater.close()
+
+def watch_volume_events(loop, sampler):
+    """Re-read the volume on every mixer event; returns the event monitor process."""
+    process = subprocess.Popen(system_monitor.VOLUME_EVENTS_COMMAND, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    fd = process.stdout.fileno()
+    os.set_blocking(fd, False)
+
+    def on_output():
+        try:
+            data = os.read(fd, 4096)
+        except BlockingIOError:
+            return
+        if data:
+            sampler.trigger("volume")
+        else:
+            loop.remove_reader(fd)
+    loop.add_reader(fd, on_output)
+    return process
+
+async def sample_sensors(sampler):
+    """Read due sensors on an executor thread, so a slow amixer or /proc scan never stalls the loop."""
+    loop = asyncio.get_running_loop()
+    while True:
+        await loop.run_in_executor(None, sampler.sample_due, time.monotonic())
+        now = time.monotonic()
+        # Capped so sensors triggered by volume events are read within a frame
+        await asyncio.sleep(min(system_monitor.MONITOR_FRAME_TIME, max(0.0, sampler.next_due(now) - now)))
+
+async def run_monitor():
+    """The system monitor on its own panel; sensors are sampled off the loop while frames are drawn."""
+    loop = asyncio.get_running_loop()
+    port = system_monitor.detect_serial_port()
+    if not port and needs_serial_port():
+        return
+    sampler = system_monitor.build_sensor_sampler()
+    watcher = None
+    with open_panel(port, loop) as panel:
+        sampling = asyncio.create_task(sample_sensors(sampler))
+        try:
+            if VOLUME_EVENTS:
+                try:
+                    watcher = watch_volume_events(loop, sampler)
+                except OSError as ex:
+                    if DEBUG:
+                        print(f"Event watcher for volume stopped: {ex}")
+            combined_grid = [[0] * 9 for _ in range(34)]
+            cycle_count = 0
+            last_brightness = None
+            drawing_after = loop.time() + system_monitor.FIRST_READINGS_TIMEOUT
+            while True:
+                readings = sampler.store.snapshot()[1]
+                if system_monitor.has_all_readings(readings) or loop.time() >= drawing_after:
+                    readings = system_monitor.with_defaults(readings)
+                    if readings["brightness"] != last_brightness:
+                        set_brightness(panel, readings["brightness"])
+                        last_brightness = readings["brightness"]
+                    combined_grid, command = system_monitor.render_monitor_frame(combined_grid, readings, cycle_count)
+                    system_monitor.send_command_raw(panel, command)
+                    cycle_count += 1
+                await asyncio.sleep(system_monitor.MONITOR_FRAME_TIME)
+        finally:
+            sampling.cancel()
+            await asyncio.gather(sampling, return_exceptions=True)
+            sampler.stop()  # Closes the brightness controller; a restarted monitor builds its own
+            if watcher is not None:
+                loop.remove_reader(watcher.stdout.fileno())
+                watcher.terminate()
+                watcher.wait()
+                watcher.stdout.close()
+            clear_leds(panel)
+            await drain_panel(panel)
+
+async def run_clock(mode=CLOCK_WIDGET):
+    """Publish the clock fields on every change, waking on the timerfd when there is one."""
+    loop = asyncio.get_running_loop()
+    timer = WallClockTimer()
+    fired = asyncio.Event()
+    if timer.fd is not None:
+        os.set_blocking(timer.fd, False)
+        loop.add_reader(timer.fd, fired.set)
+    try:
+        while True:
+            now = time.time()
+            app.state.publish(clock=clock_fields(now, mode))
+            deadline = next_change(now, mode)
+            if timer.fd is None:
+                while time.time() < deadline:
+                    await asyncio.sleep(min(deadline - time.time(), FALLBACK_MAX_SLEEP))
+                continue
+            timer.arm(deadline)
+            while True:
+                fired.clear()
+                await fired.wait()
+                try:
+                    timer.acknowledge()
+                    break
+                except BlockingIOError:
+                    continue  # Woken by readiness from before the timer was re-armed
+    finally:
+        if timer.fd is not None:
+            loop.remove_reader(timer.fd)
+        timer.close()
+
+async def run_calendar():
+    """Publish the next calendar event; files are parsed on an executor thread, not the loop."""
+    loop = asyncio.get_running_loop()
+    agenda = Agenda()
+    watcher = FileWatcher()
+    changed = asyncio.Event()
+    if watcher.fd is not None:
+        loop.add_reader(watcher.fd, changed.set)
+    try:
+        while True:
+            now = time.time()
+            await loop.run_in_executor(None, agenda.refresh, now)
+            app.state.publish(calendar=agenda.text(now))
+            timeout = max(0.0, agenda.next_change(now) - time.time())
+            poll = watcher.poll_interval()
+            if poll is not None:
+                timeout = min(timeout, poll)
+            changed.clear()
+            try:
+                await asyncio.wait_for(changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            if watcher.fd is not None:
+                watcher.clear()
+    finally:
+        if watcher.fd is not None:
+            loop.remove_reader(watcher.fd)
+        watcher.close()
+
+async def watch_loop_lag():
+    """Report when a callback blocks the loop: the asyncio counterpart of the slow-worker report."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(LAG_CHECK_INTERVAL)
+        lag = loop.time() - start - LAG_CHECK_INTERVAL
+        if lag > LOOP_LAG_WARNING:
+            print(f"Event loop was blocked for {lag * 1000:.0f} ms")
+
+async def supervise(name, run, *args):
+    """Run `run(*args)` until it returns or is cancelled, restarting it with exponential backoff when it fails."""
+    backoff = WORKER_BACKOFF_MIN
+    while True:
+        started = time.monotonic()
+        try:
+            await run(*args)
+            if DEBUG:
+                print(f"Task {name} finished")
+            return  # Nothing left to do, e.g. no panel for the monitor
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error in {name} task: {type(e).__name__}: {e}")
+            if DEBUG:
+                traceback.print_exc()
+        if time.monotonic() - started >= BACKOFF_RESET:
+            backoff = WORKER_BACKOFF_MIN
+        print(f"Restarting {name} in {backoff:g}s")
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, WORKER_BACKOFF_MAX)
+
+def open_control_socket(loop, push_queue, path=CONTROL_SOCKET):
+    """Receive pushed messages on the loop instead of a blocking thread."""
+    sock = bind_control_socket(path)
+    sock.setblocking(False)
+
+    def on_datagram():
+        while True:
+            try:
+                data = sock.recv(MAX_DATAGRAM)
+            except BlockingIOError:
+                return
+            receive_message(push_queue, data)
+    loop.add_reader(sock.fileno(), on_datagram)
+    return sock
+
+def open_shared_framebuffer(loop, push_queue):
+    """Queue framebuffer frames from the loop as their notifications arrive."""
+    framebuffer = SharedFramebuffer()
+    queued = None
+
+    def on_notify():
+        nonlocal queued
+        framebuffer.clear_notifications()
+        queued = queue_newest_frame(framebuffer, push_queue, queued)
+    loop.add_reader(framebuffer.notify_fd, on_notify)
+    return framebuffer
+
+async def run_dashboard(port):
+    """Run every dashboard task on one event loop until SIGINT or SIGTERM, then shut down in order."""
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+
+    with open_panel(port, loop) as panel:
+        sock = open_control_socket(loop, app.push_queue)
+        framebuffer = open_shared_framebuffer(loop, app.push_queue) if SHARED_FRAMEBUFFER else None
+        waiter = StateWaiter(app.state, loop)
+        tasks = [
+            asyncio.create_task(supervise("display", run_display, panel, waiter)),
+            asyncio.create_task(supervise("update_data", run_data, panel)),
+            asyncio.create_task(watch_loop_lag()),
+        ]
+        if system_monitor.detect_serial_port() or not needs_serial_port():
+            tasks.append(asyncio.create_task(supervise("system_monitor", run_monitor)))
+        if CLOCK_WIDGET:
+            tasks.append(asyncio.create_task(supervise("clock", run_clock)))
+        if SHOW_CALENDAR:
+            tasks.append(asyncio.create_task(supervise("calendar", run_calendar)))
+        try:
+            await stop.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if app.state.snapshot()[1]["no_public_ip"]:
+                app.IDLE_SCREENS[app.IDLE_SCREEN][1]()  # Stop the idle screen thread
+            loop.remove_reader(sock.fileno())
+            sock.close()
+            try:
+                os.unlink(CONTROL_SOCKET)
+            except FileNotFoundError:
+                pass  # Already removed, e.g. by a newer dashboard taking over the path
+            if framebuffer is not None:
+                loop.remove_reader(framebuffer.notify_fd)
+                framebuffer.close()
+            clear_leds(panel)
+            await drain_panel(panel)
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                loop.remove_signal_handler(signum)
+
+def main_loop():
+    configure_providers()
+    SERIAL_PORT = detect_serial_port()
+    if not SERIAL_PORT and needs_serial_port():
+        print("No serial port detected.")
+        return
+
+    try:
+        asyncio.run(run_dashboard(SERIAL_PORT))
+    except (IOError, OSError) as ex:
+        print(f"Error: {ex}")
+
+if __name__ == "__main__":
+    main_loop()
@@ -0,0 +1,241 @@
+# backends.py
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from settings import OUTPUT_BACKENDS, RECORDER_PATH, RECORDER_SLOTS
+
+FWK_MAGIC = bytes([0x32, 0xAC])
+WIDTH = 9
+HEIGHT = 34
+
+# Ring file layout: header, then RECORDER_SLOTS fixed-size slots
+RING_MAGIC = b"FWKR"
+RING_HEADER = struct.Struct("<4sHHIQ")  # magic, version, slot size, slot count, frames written
+RING_HEADER_SIZE = 32
+SLOT_HEADER = struct.Struct("<dBH")  # timestamp, kind, payload length
+SLOT_SIZE = 320
+KIND_BW = 0
+KIND_GREY = 1
+RGB_FRAME_BYTES = WIDTH * HEIGHT * 3  # Whole-frame draw on an RGB matrix (RGB_Matrix.py)
+RGB_RUN = 0x30
+RGB_FILL = 0x31
+
+panels_opened = 0  # Names recordings of panels that have no serial port
+
+class CommandDecoder:
+    """Turn the raw command writes of send_command_raw back into frames."""
+
+    def __init__(self):
+        self.grey_columns = [bytes(HEIGHT) for _ in range(WIDTH)]
+        self.rgb = bytearray(RGB_FRAME_BYTES)  # RGB matrix frames are shown by their luminance
+        self.brightness = 255
+
+    def decode(self, data):
+        """Return (kind, payload) for a command that completes a frame, else None."""
+        data = bytes(data)
+        if data[:2] != FWK_MAGIC or len(data) < 3:
+            return None
+        command, payload = data[2], data[3:]
+        if command == 0x00 and payload:
+            self.brightness = payload[0]
+        elif command == 0x06 and len(payload) == RGB_FRAME_BYTES:
+            self.rgb[:] = payload
+            return self.rgb_levels()
+        elif command == 0x06:
+            return KIND_BW, payload[:39]
+        elif command in (RGB_RUN, RGB_FILL) and len(payload) >= 7:
+            start = int.from_bytes(payload[0:2], "little")
+            count = min(int.from_bytes(payload[2:4], "little"), WIDTH * HEIGHT - start)
+            pixels = payload[4:7] * count if command == RGB_FILL else payload[4:4 + count * 3]
+            self.rgb[start * 3:start * 3 + len(pixels)] = pixels
+            return self.rgb_levels()
+        elif command == 0x07 and payload and payload[0] < WIDTH:
+            self.grey_columns[payload[0]] = payload[1:HEIGHT + 1].ljust(HEIGHT, b"\0")
+        elif command == 0x08:
+            return KIND_GREY, b"".join(self.grey_columns)
+        return None
+
+    def rgb_levels(self):
+        """The RGB frame as a greyscale frame, column by column."""
+        luma = [(299 * self.rgb[led * 3] + 587 * self.rgb[led * 3 + 1] + 114 * self.rgb[led * 3 + 2]) // 1000
+                for led in range(WIDTH * HEIGHT)]
+        return KIND_GREY, bytes(luma[row * WIDTH + col] for col in range(WIDTH) for row in range(HEIGHT))
+
+def frame_to_levels(kind, payload):
+    """Expand a frame into HEIGHT rows of WIDTH brightness values (0-255)."""
+    if kind == KIND_GREY:
+        return [[payload[col * HEIGHT + row] for col in range(WIDTH)] for row in range(HEIGHT)]
+    bits = int.from_bytes(payload, "little")
+    return [[255 if bits >> (row * WIDTH + col) & 1 else 0 for col in range(WIDTH)] for row in range(HEIGHT)]
+
+class FrameRecorder:
+    """Append frames with timestamps to a fixed-size memory-mapped ring file."""
+
+    def __init__(self, path, slots=RECORDER_SLOTS):
+        self.decoder = CommandDecoder()
+        self.slots = slots
+        size = RING_HEADER_SIZE + slots * SLOT_SIZE
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != size:
+                os.ftruncate(fd, size)
+            self.map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        magic, _, slot_size, slot_count, written = RING_HEADER.unpack_from(self.map, 0)
+        if magic != RING_MAGIC or slot_size != SLOT_SIZE or slot_count != slots:
+            written = 0
+        self.written = written
+        RING_HEADER.pack_into(self.map, 0, RING_MAGIC, 1, SLOT_SIZE, slots, written)
+
+    def write(self, data):
+        frame = self.decoder.decode(data)
+        if frame is not None:
+            self.record(*frame)
+        return len(data)
+
+    def record(self, kind, payload, timestamp=None):
+        offset = RING_HEADER_SIZE + (self.written % self.slots) * SLOT_SIZE
+        SLOT_HEADER.pack_into(self.map, offset, time.time() if timestamp is None else timestamp, kind, len(payload))
+        start = offset + SLOT_HEADER.size
+        self.map[start:start + len(payload)] = payload
+        self.written += 1
+        RING_HEADER.pack_into(self.map, 0, RING_MAGIC, 1, SLOT_SIZE, self.slots, self.written)
+
+    def close(self):
+        self.map.flush()
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def read_recorded_frames(path, seconds=None):
+    """Return (timestamp, kind, payload) for the frames in a ring file, oldest first."""
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, _, slot_size, slots, written = RING_HEADER.unpack_from(data, 0)
+    if magic != RING_MAGIC:
+        raise ValueError(f"{path} is not a frame ring file")
+    frames = []
+    for index in range(max(0, written - slots), written):
+        offset = RING_HEADER_SIZE + (index % slots) * slot_size
+        timestamp, kind, length = SLOT_HEADER.unpack_from(data, offset)
+        start = offset + SLOT_HEADER.size
+        frames.append((timestamp, kind, data[start:start + length]))
+    if seconds is not None and frames:
+        cutoff = frames[-1][0] - seconds
+        frames = [frame for frame in frames if frame[0] >= cutoff]
+    return frames
+
+def measure_frame_rate(frames):
+    """Average frames per second over a list of recorded frames."""
+    if len(frames) < 2:
+        return 0.0
+    elapsed = frames[-1][0] - frames[0][0]
+    return (len(frames) - 1) / elapsed if elapsed > 0 else 0.0
+
+class TerminalRenderer:
+    """Draw the panel in the terminal, two LED rows per line using half blocks."""
+
+    instances = 0
+    output_lock = threading.Lock()
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self.decoder = CommandDecoder()
+        self.column = 2 + TerminalRenderer.instances * 14  # Side by side when several panels render
+        TerminalRenderer.instances += 1
+        self.frame_times = []
+        with TerminalRenderer.output_lock:
+            self.stream.write("\x1b[2J\x1b[?25l")
+            self.stream.flush()
+
+    def write(self, data):
+        frame = self.decoder.decode(data)
+        if frame is not None:
+            self.render(frame_to_levels(*frame))
+        return len(data)
+
+    def shade(self, level):
+        """Map an LED level to one of the 24 terminal grey shades, scaled by brightness."""
+        return 232 + level * self.decoder.brightness * 23 // (255 * 255)
+
+    def render(self, levels):
+        now = time.time()
+        self.frame_times = [t for t in self.frame_times if now - t < 1.0] + [now]
+        lines = []
+        for line in range(HEIGHT // 2):
+            top, bottom = levels[line * 2], levels[line * 2 + 1]
+            cells = "".join(
+                f"\x1b[38;5;{self.shade(top[col])}m\x1b[48;5;{self.shade(bottom[col])}m▀"
+                for col in range(WIDTH)
+            )
+            lines.append(f"\x1b[{line + 1};{self.column}H{cells}\x1b[0m")
+        lines.append(f"\x1b[{HEIGHT // 2 + 1};{self.column}H{len(self.frame_times):3d} fps")
+        with TerminalRenderer.output_lock:
+            self.stream.write("".join(lines))
+            self.stream.flush()
+
+    def close(self):
+        with TerminalRenderer.output_lock:
+            self.stream.write(f"\x1b[{HEIGHT // 2 + 2};1H\x1b[?25h")
+            self.stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class TeeOutput:
+    """Send every command to several outputs."""
+
+    def __init__(self, outputs):
+        self.outputs = outputs
+
+    def write(self, data):
+        for output in self.outputs:
+            output.write(data)
+        return len(data)
+
+    def close(self):
+        for output in self.outputs:
+            output.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def needs_serial_port(backends=None):
+    return "serial" in (backends or OUTPUT_BACKENDS)
+
+def open_output(port, backends=None, open_serial=None):
+    """Open the configured outputs for a panel; used in place of serial.Serial(port, 115200).
+
+    `open_serial(port)` replaces pyserial for the serial backend, e.g. with a non-blocking writer.
+    """
+    global panels_opened
+    panels_opened += 1
+    outputs = []
+    for backend in backends or OUTPUT_BACKENDS:
+        if backend == "serial" and open_serial is not None:
+            outputs.append(open_serial(port))
+        elif backend == "serial":
+            import serial
+            outputs.append(serial.Serial(port, 115200))
+        elif backend == "terminal":
+            outputs.append(TerminalRenderer())
+        elif backend == "record":
+            name = os.path.basename(port) if port else f"panel{panels_opened}"
+            outputs.append(FrameRecorder(RECORDER_PATH.format(name=name)))
+        else:
+            raise ValueError(f"Unknown output backend {backend!r}")
+    return outputs[0] if len(outputs) == 1 else TeeOutput(outputs)
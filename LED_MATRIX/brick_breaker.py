@@ -1,8 +1,11 @@
 import glob
-import serial
 import time
 import threading
 import random  # Add the random module
+from backends import open_output, needs_serial_port
+from animation import AnimationPlayer, compile_animation, cached_animation
+from led_serial import send_frame, pack_grid
+from settings import SERIAL_PORT_OVERRIDE
 
 FWK_MAGIC = [0x32, 0xAC]
 WIDTH = 9
@@ -20,6 +23,8 @@ def stop_brick_breaker():
 
 # Detect the serial port
 def detect_serial_port():
+    if SERIAL_PORT_OVERRIDE:
+        return SERIAL_PORT_OVERRIDE
     ports = glob.glob('/dev/ttyACM*')
     if len(ports) >= 2:
         return ports[1]
@@ -40,26 +45,18 @@ def set_brightness(serial_connection, brightness_level):
     command = FWK_MAGIC + [0x00, brightness_level]
     send_command_raw(serial_connection, command)
 
-# Function to flash the ball in the middle of the screen
-def flash_ball_in_middle(serial_connection):
-    for _ in range(3):  # Flash three times
-        full_grid = [[0] * WIDTH for _ in range(HEIGHT)]
-        full_grid[HEIGHT // 2][WIDTH // 2] = 1
-        flattened_vals = [val for row in full_grid for val in row]
-        vals = [0x00 for _ in range(40)]
-        for i in range(len(flattened_vals)):
-            if flattened_vals[i]:
-                vals[i // 8] |= (1 << (i % 8))
-        command = FWK_MAGIC + [0x06] + vals[:40]
-        send_command_raw(serial_connection, command)
-        time.sleep(0.3)  # Ball visible
-        clear_leds(serial_connection)
-        time.sleep(0.3)  # Ball invisible
+# Flash the ball in the middle of the screen three times, compiled once
+def flash_animation():
+    def build():
+        ball_grid = [[0] * WIDTH for _ in range(HEIGHT)]
+        ball_grid[HEIGHT // 2][WIDTH // 2] = 1
+        blank_grid = [[0] * WIDTH for _ in range(HEIGHT)]
+        return compile_animation([ball_grid, blank_grid] * 3, 0.3)  # Ball visible, then invisible
+    return cached_animation("brick_breaker_flash", build)
 
 # Clears the entire LED matrix by sending an empty grid
 def clear_leds(serial_connection):
-    full_grid = [[0] * WIDTH for _ in range(HEIGHT)]
-    vals = [0x00 for _ in range(40)]
+    vals = [0x00 for _ in range(39)]
     command = FWK_MAGIC + [0x06] + vals
     send_command_raw(serial_connection, command)
 
@@ -80,13 +77,23 @@ def brick_breaker_animation(serial_connection):
     # Initialize game variables
     ball_x, ball_y, ball_dx, ball_dy, paddle_x, blocks = reset_game()
     last_hit_time = time.time()  # Track the last time the ball hit something
+    flash = AnimationPlayer()  # Plays the reset flash between game frames
 
     while brick_breaker_running:
+        # Let the flash finish before drawing the next round
+        if flash.active:
+            frame = flash.next_frame()
+            if frame is not None:
+                send_frame(serial_connection, frame)
+            time.sleep(min(flash.time_to_next(), 0.1))
+            continue
+
         current_time = time.time()
         if current_time - last_hit_time > TIMEOUT:  # If time passed without a hit, reset the game
-            flash_ball_in_middle(serial_connection)  # Optional: flash to indicate reset
+            flash.play(flash_animation())  # Optional: flash to indicate reset
             ball_x, ball_y, ball_dx, ball_dy, paddle_x, blocks = reset_game()
             ball_hit()  # Reset the timer after restarting the game
+            continue
 
         full_grid = [[0] * WIDTH for _ in range(HEIGHT)]
         full_grid[0] = [1] * WIDTH  # Top line
@@ -102,14 +109,8 @@ def brick_breaker_animation(serial_connection):
                 if blocks[row][col] == 1:
                     full_grid[row + 1][col] = 1
 
-        # Send the grid data to the matrix
-        flattened_vals = [val for row in full_grid for val in row]
-        vals = [0x00 for _ in range(40)]
-        for i in range(len(flattened_vals)):
-            if flattened_vals[i]:
-                vals[i // 8] |= (1 << (i % 8))
-        command = FWK_MAGIC + [0x06] + vals[:40]
-        send_command_raw(serial_connection, command)
+        # Send the visible 34 rows to the matrix (the draw command takes 39 bytes)
+        send_frame(serial_connection, pack_grid(full_grid))
 
         # Update ball position
         ball_x += ball_dx
@@ -158,14 +159,7 @@ def brick_breaker_animation(serial_connection):
 
         # Ball goes past the paddle (missed)
         if ball_y >= HEIGHT - 2:
-            flash_ball_in_middle(serial_connection)  # Flash the ball in the middle
-            ball_x, ball_y, ball_dx, ball_dy, paddle_x, blocks = reset_game()  # Reset the game
-            ball_hit()  # Reset the timer after game reset
-
-
-        # Ball goes past the paddle (missed)
-        if ball_y >= HEIGHT - 2:
-            flash_ball_in_middle(serial_connection)  # Flash the ball in the middle
+            flash.play(flash_animation())  # Flash the ball in the middle
             ball_x, ball_y, ball_dx, ball_dy, paddle_x, blocks = reset_game()  # Reset the game
             ball_hit()  # Reset the timer after game reset
 
@@ -187,11 +181,11 @@ def start_brick_breaker_thread(serial_connection):
 # Main loop to detect the serial port and start the animation
 def main_loop():
     SERIAL_PORT = detect_serial_port()
-    if not SERIAL_PORT:
+    if not SERIAL_PORT and needs_serial_port():
         return
 
     try:
-        with serial.Serial(SERIAL_PORT, 115200) as ser:
+        with open_output(SERIAL_PORT) as ser:
             set_brightness(ser, 64)
             start_brick_breaker_thread(ser)
             
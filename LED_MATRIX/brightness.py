@@ -0,0 +1,119 @@
+# brightness.py
+import glob
+import math
+import os
+import time
+from settings import (DEBUG, AUTO_BRIGHTNESS, BRIGHTNESS, MIN_BRIGHTNESS, NIGHT_BRIGHTNESS,
+                      BRIGHTNESS_SMOOTHING, BRIGHTNESS_HYSTERESIS, IIO_ROOT, LATITUDE, LONGITUDE)
+
+TWILIGHT = 1800  # Seconds over which the solar schedule ramps between night and day
+FULL_BRIGHT_LUX = 1000  # Ambient light at which the panel reaches BRIGHTNESS
+
+def read_float(path, default):
+    try:
+        with open(path, "r") as f:
+            return float(f.read().strip())
+    except (IOError, OSError, ValueError):
+        return default
+
+def find_light_sensor(root=IIO_ROOT):
+    """Return (input path, scale, offset) of the first IIO ambient light sensor, or None."""
+    for device in sorted(glob.glob(os.path.join(root, "iio:device*"))):
+        for name in ("in_illuminance_input", "in_illuminance_raw", "in_intensity_both_raw"):
+            path = os.path.join(device, name)
+            if os.path.exists(path):
+                prefix = path.rsplit("_", 1)[0]
+                scale = read_float(prefix + "_scale", 1.0)
+                offset = read_float(prefix + "_offset", 0.0)
+                return path, scale, offset
+    return None
+
+def sun_times(timestamp, latitude=LATITUDE, longitude=LONGITUDE):
+    """Sunrise and sunset (Unix time) for the day containing `timestamp`, from the sunrise equation.
+
+    Returns (None, None) during polar night and (-inf, inf) during polar day.
+    """
+    julian_date = timestamp / 86400 + 2440587.5
+    day = round(julian_date - 2451545.0 + longitude / 360)  # Day whose solar noon is nearest
+    mean_solar_time = day - longitude / 360
+    anomaly = math.radians((357.5291 + 0.98560028 * mean_solar_time) % 360)
+    center = 1.9148 * math.sin(anomaly) + 0.0200 * math.sin(2 * anomaly) + 0.0003 * math.sin(3 * anomaly)
+    ecliptic = math.radians((math.degrees(anomaly) + center + 180 + 102.9372) % 360)
+    transit = 2451545.0 + mean_solar_time + 0.0053 * math.sin(anomaly) - 0.0069 * math.sin(2 * ecliptic)
+    declination = math.asin(math.sin(ecliptic) * math.sin(math.radians(23.4397)))
+    latitude = math.radians(latitude)
+    cos_hour_angle = ((math.sin(math.radians(-0.833)) - math.sin(latitude) * math.sin(declination))
+                      / (math.cos(latitude) * math.cos(declination)))
+    if cos_hour_angle > 1:
+        return None, None
+    if cos_hour_angle < -1:
+        return -math.inf, math.inf
+    hour_angle = math.degrees(math.acos(cos_hour_angle))
+    sunrise = (transit - hour_angle / 360 - 2440587.5) * 86400
+    sunset = (transit + hour_angle / 360 - 2440587.5) * 86400
+    return sunrise, sunset
+
+def solar_level(now):
+    """Brightness from the local solar schedule, ramping over TWILIGHT around sunrise and sunset."""
+    sunrise, sunset = sun_times(now)
+    if sunrise is None:
+        return NIGHT_BRIGHTNESS
+    daylight = min(now - sunrise, sunset - now) / TWILIGHT + 0.5
+    daylight = max(0.0, min(1.0, daylight))
+    return round(NIGHT_BRIGHTNESS + (BRIGHTNESS - NIGHT_BRIGHTNESS) * daylight)
+
+def lux_level(lux):
+    """Brightness for an ambient light level, on a log scale from dark to FULL_BRIGHT_LUX."""
+    fraction = math.log10(max(lux, 0.0) + 1) / math.log10(FULL_BRIGHT_LUX + 1)
+    fraction = max(0.0, min(1.0, fraction))
+    return round(MIN_BRIGHTNESS + (BRIGHTNESS - MIN_BRIGHTNESS) * fraction)
+
+class BrightnessController:
+    """Pick the panel brightness from the light sensor, or the sun when there is none."""
+
+    def __init__(self, sensor_root=IIO_ROOT):
+        self.level = None
+        self.lux = None  # Smoothed ambient light
+        self.sensor_fd = None
+        sensor = find_light_sensor(sensor_root) if AUTO_BRIGHTNESS else None
+        if sensor is not None:
+            path, self.scale, self.offset = sensor
+            self.sensor_fd = os.open(path, os.O_RDONLY)
+        if DEBUG:
+            print(f"Brightness from {'light sensor ' + path if sensor else 'solar schedule'}")
+
+    def read_lux(self):
+        try:
+            raw = float(os.pread(self.sensor_fd, 32, 0))
+        except (OSError, ValueError):
+            return self.lux
+        lux = (raw + self.offset) * self.scale
+        if self.lux is None:
+            self.lux = lux
+        else:
+            self.lux += BRIGHTNESS_SMOOTHING * (lux - self.lux)
+        return self.lux
+
+    def target_level(self, now):
+        if not AUTO_BRIGHTNESS:
+            return BRIGHTNESS
+        if self.sensor_fd is not None:
+            lux = self.read_lux()
+            if lux is not None:
+                return lux_level(lux)
+        return solar_level(now)
+
+    def close(self):
+        if self.sensor_fd is not None:
+            os.close(self.sensor_fd)
+            self.sensor_fd = None
+
+    def update(self, now=None):
+        """Return the brightness to send when it should change, else None."""
+        target = self.target_level(time.time() if now is None else now)
+        if self.level is not None:
+            at_limit = target in (MIN_BRIGHTNESS, NIGHT_BRIGHTNESS, BRIGHTNESS)
+            if target == self.level or (abs(target - self.level) < BRIGHTNESS_HYSTERESIS and not at_limit):
+                return None
+        self.level = target
+        return target
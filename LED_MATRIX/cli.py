@@ -0,0 +1,205 @@
+# cli.py
+import argparse
+import importlib
+import importlib.util
+import os
+import sys
+import time
+
+START_TIME = time.perf_counter()
+IMPORT_TIMES = []  # (module name, seconds) for every lazy import
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def lazy_import(name):
+    """Import a module when a command needs it, recording how long it took."""
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    IMPORT_TIMES.append((name, time.perf_counter() - start))
+    return module
+
+def import_rgb_matrix():
+    """RGB_Matrix.py lives at the repository root, outside this directory."""
+    start = time.perf_counter()
+    spec = importlib.util.spec_from_file_location("RGB_Matrix", os.path.join(REPO_DIR, "RGB_Matrix.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    IMPORT_TIMES.append(("RGB_Matrix", time.perf_counter() - start))
+    return module
+
+def print_import_report():
+    total = time.perf_counter() - START_TIME
+    for name, seconds in IMPORT_TIMES:
+        print(f"import {name:<16} {seconds * 1000:8.1f} ms", file=sys.stderr)
+    print(f"total {'':<16} {total * 1000:8.1f} ms", file=sys.stderr)
+
+def resolve_port(args, led_serial):
+    port = args.port or led_serial.detect_serial_port()
+    if not port:
+        print("No serial port detected.")
+    return port
+
+def run_frames(args):
+    """Show a recorded ring file: frame rate, and optionally replay it in the terminal."""
+    backends = lazy_import("backends")
+    frames = backends.read_recorded_frames(args.path, args.seconds)
+    if args.play:
+        renderer = backends.TerminalRenderer()
+        try:
+            for (timestamp, kind, payload), next_frame in zip(frames, frames[1:] + [None]):
+                renderer.render(backends.frame_to_levels(kind, payload))
+                if next_frame:
+                    time.sleep(max(0.0, next_frame[0] - timestamp))
+        finally:
+            renderer.close()
+    print(f"{len(frames)} frames, {backends.measure_frame_rate(frames):.2f} fps")
+
+def run_emulator(args):
+    """Emulate the LED module on a pty, previewing it in the terminal or benchmarking the serial path."""
+    emulator_module = lazy_import("emulator")
+    emulator = emulator_module.LedMatrixEmulator()
+    emulator.start()
+    print(f"Emulated LED module on {emulator.port}", file=sys.stderr)
+    try:
+        if args.bench:
+            print(emulator_module.measure_serial_path(emulator, args.bench))
+            return
+        renderer = lazy_import("backends").TerminalRenderer()
+        emulator.on_frame = renderer.render
+        try:
+            while True:
+                time.sleep(1)
+        finally:
+            renderer.close()
+    finally:
+        emulator.close()
+        print(f"{emulator.frames} frames, {len(emulator.errors)} protocol errors", file=sys.stderr)
+
+def run_dashboard(args):
+    if args.runtime:
+        # Must happen before app reads RUNTIME
+        lazy_import("settings").RUNTIME = args.runtime
+    lazy_import("app").main_loop()
+
+def run_monitor(args):
+    if args.view:
+        # Must happen before system_monitor reads HISTORY_VIEW
+        lazy_import("settings").HISTORY_VIEW = args.view
+    lazy_import("system_monitor").main_loop()
+
+def run_breaker(args):
+    lazy_import("brick_breaker").main_loop()
+
+def run_life(args):
+    if args.rule:
+        # Must happen before life reads LIFE_RULE
+        lazy_import("settings").LIFE_RULE = args.rule
+    lazy_import("life").main_loop()
+
+def run_spectrum(args):
+    lazy_import("spectrum").main_loop(args.source or lazy_import("settings").AUDIO_SOURCE, args.stats)
+
+def run_play(args):
+    playback = lazy_import("playback")
+    playback.main_loop(args.path, args.mode or lazy_import("settings").PLAYBACK_MODE, loop=not args.once,
+                       to_framebuffer=args.framebuffer, show_stats=args.stats)
+
+def run_rgb(args):
+    rgb_matrix = import_rgb_matrix()
+    if args.delta:
+        rgb_matrix.DELTA_COMMANDS = True
+    rgb_matrix.main(args.effect)
+
+def run_clear(args):
+    led_serial = lazy_import("led_serial")
+    port = resolve_port(args, led_serial)
+    if port:
+        with led_serial.open_raw_port(port) as connection:
+            led_serial.clear_leds(connection)
+
+def run_brightness(args):
+    led_serial = lazy_import("led_serial")
+    port = resolve_port(args, led_serial)
+    if port:
+        with led_serial.open_raw_port(port) as connection:
+            led_serial.set_brightness(connection, args.level)
+
+def brightness_level(value):
+    level = int(value)
+    if not 0 <= level <= 255:
+        raise argparse.ArgumentTypeError("brightness must be between 0 and 255")
+    return level
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="LED_MATRIX", description="Framework 16 LED matrix tools")
+    parser.add_argument("--import-time", action="store_true", help="print how long module imports took")
+    parser.add_argument("--backend", help="comma-separated outputs: serial, terminal, record")
+    parser.add_argument("--serial-port", help="use this port instead of detecting one, e.g. an emulator pty")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    dashboard = commands.add_parser("dashboard", help="weather, temperature and IP dashboard")
+    dashboard.add_argument("--runtime", choices=["threads", "asyncio"], help="worker threads or one event loop (default RUNTIME)")
+    dashboard.set_defaults(func=run_dashboard)
+    monitor = commands.add_parser("monitor", help="battery, volume, CPU and memory monitor")
+    monitor.add_argument("--view", choices=["seconds", "hour", "day"], help="span of the CPU and memory graphs (default HISTORY_VIEW)")
+    monitor.set_defaults(func=run_monitor)
+    commands.add_parser("breaker", help="brick breaker animation").set_defaults(func=run_breaker)
+    life = commands.add_parser("life", help="cellular automaton screensaver")
+    life.add_argument("--rule", help='birth/survival rule, e.g. "B36/S23" (default LIFE_RULE)')
+    life.set_defaults(func=run_life)
+    spectrum = commands.add_parser("spectrum", help="audio spectrum visualizer (needs NumPy)")
+    spectrum.add_argument("--source", help='"monitor", "capture", a .wav file, a FIFO or "-" (default AUDIO_SOURCE)')
+    spectrum.add_argument("--stats", action="store_true", help="print frame rate, frame time and CPU use on exit")
+    spectrum.set_defaults(func=run_spectrum)
+    play = commands.add_parser("play", help="play a GIF or video clip (needs NumPy, and Pillow or ffmpeg)")
+    play.add_argument("path", help="GIF, or any clip ffmpeg can decode")
+    play.add_argument("--mode", choices=["floyd", "ordered", "grey"], help="dithering, or greyscale (default PLAYBACK_MODE)")
+    play.add_argument("--once", action="store_true", help="play once instead of looping")
+    play.add_argument("--framebuffer", action="store_true", help="play through the running dashboard's shared framebuffer")
+    play.add_argument("--stats", action="store_true", help="print frame rate, dropped frames and CPU use on exit")
+    play.set_defaults(func=run_play)
+    rgb = commands.add_parser("rgb", help="cycle colors on an RGB matrix")
+    rgb.add_argument("--effect", choices=["cycle", "wipe"], default="cycle")
+    rgb.add_argument("--delta", action="store_true", help="send only changed LEDs (needs firmware run/fill commands)")
+    rgb.set_defaults(func=run_rgb)
+
+    clear = commands.add_parser("clear", help="turn off all LEDs")
+    clear.add_argument("--port", help="serial port (detected if omitted)")
+    clear.set_defaults(func=run_clear)
+
+    brightness = commands.add_parser("brightness", help="set the LED brightness")
+    brightness.add_argument("level", type=brightness_level, help="0-255")
+    brightness.add_argument("--port", help="serial port (detected if omitted)")
+    brightness.set_defaults(func=run_brightness)
+
+    frames = commands.add_parser("frames", help="inspect a recorded frame ring file")
+    frames.add_argument("path", help="ring file written by the record backend")
+    frames.add_argument("--seconds", type=float, help="only the last N seconds")
+    frames.add_argument("--play", action="store_true", help="replay the frames in the terminal")
+    frames.set_defaults(func=run_frames)
+
+    emulator = commands.add_parser("emulator", help="emulate the LED module on a pseudo-terminal")
+    emulator.add_argument("--bench", type=int, metavar="FRAMES", help="measure latency and throughput, then exit")
+    emulator.set_defaults(func=run_emulator)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    # Overrides must happen before the modules that read these settings are imported
+    if args.backend:
+        lazy_import("settings").OUTPUT_BACKENDS = args.backend.split(",")
+    if args.serial_port:
+        lazy_import("settings").SERIAL_PORT_OVERRIDE = args.serial_port
+    try:
+        args.func(args)
+    except KeyboardInterrupt:
+        pass
+    except (IOError, OSError) as ex:
+        print(f"Error: {ex}")
+        return 1
+    finally:
+        if args.import_time:
+            print_import_report()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+# clock.py
+import ctypes
+import ctypes.util
+import errno
+import math
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from dictionary import DICTIONARY
+from settings import DEBUG, CLOCK_WIDGET, CLOCK_24_HOUR
+
+WIDTH = 9
+HEIGHT = 34
+UPPER_ROW = 12  # First row of the upper two digits, in the gap below the temperature
+LOWER_ROW = 23  # First row of the lower two digits, in the gap above the public IP
+FALLBACK_MAX_SLEEP = 5  # Longest plain sleep when no wall-clock timer is available
+
+def render_pair(text):
+    """Two glyphs side by side, centred in the panel width; five rows of 9 pixels."""
+    first, second = DICTIONARY[text[0]], DICTIONARY[text[1]]
+    return tuple((0,) + tuple(first[row]) + (0,) + tuple(second[row]) + (0,) for row in range(5))
+
+# Every two-digit value, rendered once
+DIGIT_PAIRS = {f"{n:02d}": render_pair(f"{n:02d}") for n in range(100)}
+
+def draw_fields(grid, upper, lower):
+    """Draw two-digit fields into the upper and lower gaps of a dashboard grid."""
+    for row in range(5):
+        grid[UPPER_ROW + row][:WIDTH] = DIGIT_PAIRS[upper][row]
+        grid[LOWER_ROW + row][:WIDTH] = DIGIT_PAIRS[lower][row]
+    return grid
+
+def clock_fields(now, mode=CLOCK_WIDGET):
+    """The (upper, lower) digits shown for `mode`: hours over minutes, or day over month."""
+    local = datetime.fromtimestamp(now)
+    if mode == "date":
+        return f"{local.day:02d}", f"{local.month:02d}"
+    hour = local.hour if CLOCK_24_HOUR else (local.hour - 1) % 12 + 1
+    return f"{hour:02d}", f"{local.minute:02d}"
+
+def next_change(now, mode=CLOCK_WIDGET):
+    """Wall-clock time at which clock_fields next changes."""
+    if mode == "date":
+        midnight = datetime.fromtimestamp(now).replace(hour=0, minute=0, second=0, microsecond=0)
+        return (midnight + timedelta(days=1)).timestamp()
+    return (math.floor(now / 60) + 1) * 60  # Time zones are whole minutes from UTC
+
+def countdown_fields(remaining):
+    """Minutes over seconds for a countdown, or hours over minutes once it is 100 minutes or more."""
+    remaining = max(0, math.ceil(remaining))
+    minutes, seconds = divmod(remaining, 60)
+    if minutes >= 100:
+        return f"{min(minutes // 60, 99):02d}", f"{minutes % 60:02d}"
+    return f"{minutes:02d}", f"{seconds:02d}"
+
+class Timespec(ctypes.Structure):
+    _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+class Itimerspec(ctypes.Structure):
+    _fields_ = [("it_interval", Timespec), ("it_value", Timespec)]
+
+TFD_TIMER_ABSTIME = 1
+TFD_TIMER_CANCEL_ON_SET = 2
+
+class WallClockTimer:
+    """Sleep until absolute wall-clock times.
+
+    Uses a CLOCK_REALTIME timerfd, from os on Python 3.13+ or libc through ctypes before that. It
+    fires on the exact second after a suspend, unlike time.sleep which pauses while suspended, and
+    its fd can be watched by an event loop.
+    """
+
+    def __init__(self):
+        self.fd = None
+        self.libc = None
+        if hasattr(os, "timerfd_create"):
+            self.fd = os.timerfd_create(time.CLOCK_REALTIME, flags=os.TFD_CLOEXEC)
+            self.backend = "timerfd"
+        else:
+            try:
+                self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+                self.libc.timerfd_settime.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.POINTER(Itimerspec), ctypes.c_void_p]
+                self.fd = self.libc.timerfd_create(time.CLOCK_REALTIME, os.O_CLOEXEC)
+                if self.fd < 0:
+                    raise OSError(ctypes.get_errno(), "timerfd_create failed")
+                self.backend = "ctypes timerfd"
+            except (OSError, AttributeError):
+                self.fd = None
+                self.backend = "sleep"
+        if DEBUG:
+            print(f"Clock timer: {self.backend}")
+
+    def arm(self, deadline):
+        """Make the fd readable at `deadline` (Unix time), or as soon as the system clock is set."""
+        flags = TFD_TIMER_ABSTIME | TFD_TIMER_CANCEL_ON_SET
+        if self.libc is None:
+            os.timerfd_settime(self.fd, flags=flags, initial=deadline)
+            return
+        value = Itimerspec(Timespec(0, 0), Timespec(int(deadline), int(deadline % 1 * 1e9)))
+        if self.libc.timerfd_settime(self.fd, flags, ctypes.byref(value), None) < 0:
+            raise OSError(ctypes.get_errno(), "timerfd_settime failed")
+
+    def acknowledge(self):
+        """Read the expiry from the fd once it is readable."""
+        try:
+            os.read(self.fd, 8)
+        except OSError as e:
+            if e.errno != errno.ECANCELED:  # The clock was set; the caller recomputes its deadline
+                raise
+
+    def sleep_until(self, deadline):
+        """Return at `deadline` (Unix time), or early if the system clock is set."""
+        if self.fd is not None:
+            self.arm(deadline)
+            self.acknowledge()
+        else:
+            while time.time() < deadline:
+                time.sleep(min(deadline - time.time(), FALLBACK_MAX_SLEEP))
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+
+def run_clock(state, mode=CLOCK_WIDGET):
+    """Publish the clock fields to `state` on every change, sleeping in between."""
+    timer = WallClockTimer()
+    try:
+        while True:
+            now = time.time()
+            state.publish(clock=clock_fields(now, mode))
+            timer.sleep_until(next_change(now, mode))
+    finally:
+        timer.close()
+
+def start_clock_thread(state, mode=CLOCK_WIDGET):
+    clock_thread = threading.Thread(target=run_clock, args=(state, mode), daemon=True)
+    clock_thread.start()
+    return clock_thread
+
+if __name__ == "__main__":
+    # Usage: python clock.py [time|date]  -- prints the fields as they change
+    mode = sys.argv[1] if len(sys.argv) > 1 else "time"
+    timer = WallClockTimer()
+    while True:
+        now = time.time()
+        print(f"{datetime.fromtimestamp(now).isoformat(timespec='milliseconds')} {clock_fields(now, mode)} ({timer.backend})")
+        timer.sleep_until(next_change(now, mode))
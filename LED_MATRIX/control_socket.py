@@ -0,0 +1,147 @@
+# control_socket.py
+import base64
+import json
+import math
+import os
+import socket
+import sys
+import threading
+import time
+from settings import DEBUG, CONTROL_SOCKET, PUSH_DEFAULT_TTL, COUNTDOWN_HOLD
+from generation import sanitize_text
+
+MAX_DATAGRAM = 65536
+FRAME_BYTES = 39  # Packed 1-bit 9x34 frame
+GREY_BYTES = 9 * 34  # Greyscale frame, one byte per LED, column by column
+MIN_ANIMATION_DELAY = 0.02  # Seconds per animation frame; about the time the module takes to draw one
+
+class PushQueue:
+    """Pushed items waiting for the display, highest priority first."""
+
+    def __init__(self, on_push=None):
+        self.items = []
+        self.lock = threading.Lock()
+        self.on_push = on_push  # Called after each push, e.g. to wake the display
+
+    def push(self, item, replaces=None):
+        """Queue `item`, removing `replaces` if it is still queued, e.g. the previous frame of a stream."""
+        now = time.time()
+        item["start"] = now
+        item["expires"] = now + item.get("ttl", PUSH_DEFAULT_TTL)
+        with self.lock:
+            if replaces is not None:
+                self.items = [queued for queued in self.items if queued is not replaces]
+            self.items.append(item)
+        if self.on_push is not None:
+            self.on_push()
+
+    def current(self, now=None):
+        """Return the live item with the highest priority (newest wins ties), or None."""
+        if now is None:
+            now = time.time()
+        with self.lock:
+            self.items = [item for item in self.items if item["expires"] > now]
+            if not self.items:
+                return None
+            return max(reversed(self.items), key=lambda item: item.get("priority", 0))
+
+def parse_message(message):
+    """Validate a decoded client message and turn it into a queue item."""
+    kind = message.get("type")
+    item = {
+        "type": kind,
+        "priority": int(message.get("priority", 0)),
+        "ttl": float(message.get("ttl", PUSH_DEFAULT_TTL)),
+    }
+    if kind == "text":
+        item["text"] = sanitize_text(str(message["text"]))
+        item["offset"] = 0
+    elif kind == "frame":
+        item["data"] = base64.b64decode(message["data"])
+        if len(item["data"]) != FRAME_BYTES:
+            raise ValueError(f"frame must be {FRAME_BYTES} bytes")
+    elif kind == "grey":
+        data = base64.b64decode(message["data"])
+        if len(data) != GREY_BYTES:
+            raise ValueError(f"greyscale frame must be {GREY_BYTES} bytes")
+        item["columns"] = [data[col * 34:(col + 1) * 34] for col in range(9)]
+    elif kind == "animation":
+        item["frames"] = [base64.b64decode(frame) for frame in message["frames"]]
+        if not item["frames"] or any(len(frame) != FRAME_BYTES for frame in item["frames"]):
+            raise ValueError(f"animation frames must be {FRAME_BYTES} bytes each")
+        item["delay"] = float(message.get("delay", 0.1))
+        if not math.isfinite(item["delay"]) or item["delay"] < MIN_ANIMATION_DELAY:
+            raise ValueError(f"animation delay must be at least {MIN_ANIMATION_DELAY} seconds")
+    elif kind == "countdown":
+        seconds = float(message["seconds"])
+        if seconds <= 0:
+            raise ValueError("countdown seconds must be positive")
+        item["end"] = time.time() + seconds
+        item["ttl"] = seconds + COUNTDOWN_HOLD  # Shown until it has finished flashing
+    else:
+        raise ValueError(f"unknown message type {kind!r}")
+    return item
+
+def bind_control_socket(path=CONTROL_SOCKET):
+    """Create the daemon's datagram socket, replacing one left behind by an earlier run."""
+    if os.path.exists(path):
+        os.unlink(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock.bind(path)
+    os.chmod(path, 0o600)
+    return sock
+
+def receive_message(push_queue, data):
+    """Queue one received datagram for display, dropping malformed ones."""
+    try:
+        push_queue.push(parse_message(json.loads(data)))
+    except Exception as e:
+        if DEBUG:
+            print(f"Rejected pushed message: {e}")
+
+def serve_control_socket(push_queue, path=CONTROL_SOCKET):
+    """Receive client datagrams on a Unix socket and queue them for display."""
+    sock = bind_control_socket(path)
+    while True:
+        receive_message(push_queue, sock.recv(MAX_DATAGRAM))
+
+def start_control_socket_thread(push_queue, path=CONTROL_SOCKET):
+    control_thread = threading.Thread(target=serve_control_socket, args=(push_queue, path), daemon=True)
+    control_thread.start()
+    return control_thread
+
+def push_message(message, path=CONTROL_SOCKET):
+    """Send one message to the running daemon."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+        sock.sendto(json.dumps(message).encode(), path)
+
+def push_text(text, priority=0, ttl=PUSH_DEFAULT_TTL, path=CONTROL_SOCKET):
+    push_message({"type": "text", "text": text, "priority": priority, "ttl": ttl}, path)
+
+def push_frame(vals, priority=0, ttl=PUSH_DEFAULT_TTL, path=CONTROL_SOCKET):
+    """Push a packed 39-byte frame, e.g. from led_serial.pack_grid."""
+    data = base64.b64encode(bytes(vals)).decode()
+    push_message({"type": "frame", "data": data, "priority": priority, "ttl": ttl}, path)
+
+def push_greyscale(columns, priority=0, ttl=PUSH_DEFAULT_TTL, path=CONTROL_SOCKET):
+    """Push a greyscale frame given as 9 columns of 34 brightness values."""
+    data = base64.b64encode(b"".join(bytes(column) for column in columns)).decode()
+    push_message({"type": "grey", "data": data, "priority": priority, "ttl": ttl}, path)
+
+def push_animation(frames, delay=0.1, priority=0, ttl=PUSH_DEFAULT_TTL, path=CONTROL_SOCKET):
+    """Push a list of packed 39-byte frames shown `delay` seconds apart."""
+    encoded = [base64.b64encode(bytes(vals)).decode() for vals in frames]
+    push_message({"type": "animation", "frames": encoded, "delay": delay, "priority": priority, "ttl": ttl}, path)
+
+def push_countdown(seconds, priority=0, path=CONTROL_SOCKET):
+    """Start a countdown timer shown as minutes over seconds."""
+    push_message({"type": "countdown", "seconds": seconds, "priority": priority}, path)
+
+if __name__ == "__main__":
+    # Usage: python control_socket.py "some text" [priority] [ttl]
+    if len(sys.argv) < 2:
+        print("Usage: control_socket.py TEXT [PRIORITY] [TTL]")
+        sys.exit(1)
+    priority = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    ttl = float(sys.argv[3]) if len(sys.argv) > 3 else PUSH_DEFAULT_TTL
+    push_text(sys.argv[1], priority, ttl)
@@ -286,5 +286,12 @@ DICTIONARY = {
         [0, 1, 0],
         [1, 0, 0]
     ], 
+    '-': [
+        [0, 0, 0],
+        [0, 0, 0],
+        [1, 1, 1],
+        [0, 0, 0],
+        [0, 0, 0]
+    ],
 }
 
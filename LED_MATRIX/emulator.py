@@ -0,0 +1,184 @@
+# emulator.py
+import os
+import select
+import sys
+import threading
+import time
+import tty
+
+FWK_MAGIC = bytes([0x32, 0xAC])
+WIDTH = 9
+HEIGHT = 34
+
+# Payload length of each command the module understands
+BRIGHTNESS = 0x00
+SLEEP = 0x03
+DRAW_BW = 0x06
+STAGE_GREY_COL = 0x07
+DRAW_GREY_COL_BUFFER = 0x08
+COMMAND_LENGTHS = {
+    BRIGHTNESS: 1,
+    SLEEP: 1,
+    DRAW_BW: 39,
+    STAGE_GREY_COL: 1 + HEIGHT,
+    DRAW_GREY_COL_BUFFER: 0,
+}
+COMMAND_TIMEOUT = 0.05  # A command still incomplete after this long is reported as short
+
+class LedMatrixEmulator:
+    """Decode the LED module's command stream from a pseudo-terminal into a framebuffer."""
+
+    def __init__(self):
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw(self.slave_fd)  # Keep the slave open so the pty survives clients closing it
+        self.port = os.ttyname(self.slave_fd)
+        self.buffer = bytearray()
+        self.last_data_time = 0.0
+        self.framebuffer = [[0] * WIDTH for _ in range(HEIGHT)]  # Levels 0-255 as shown
+        self.grey_columns = [[0] * HEIGHT for _ in range(WIDTH)]  # Staged, not yet shown
+        self.brightness = 255
+        self.sleeping = False
+        self.frames = 0
+        self.bytes_received = 0
+        self.errors = []
+        self.frame_done = threading.Condition()
+        self.on_frame = None  # Called with the framebuffer after every drawn frame
+        self.running = False
+        self.thread = None
+
+    def error(self, message):
+        self.errors.append(message)
+        print(f"emulator: {message}", file=sys.stderr)
+
+    def feed(self, data, now=None):
+        """Decode as many complete commands as `data` finishes."""
+        self.buffer += data
+        self.bytes_received += len(data)
+        self.last_data_time = time.monotonic() if now is None else now
+        while True:
+            start = self.buffer.find(FWK_MAGIC)
+            if start == -1:
+                # Keep a trailing first magic byte, it may be the start of the next command
+                keep = 1 if self.buffer[-1:] == FWK_MAGIC[:1] else 0
+                if len(self.buffer) > keep:
+                    self.error(f"{len(self.buffer) - keep} unexpected byte(s) after a command (previous payload too long?)")
+                    del self.buffer[:len(self.buffer) - keep]
+                return
+            if start > 0:
+                self.error(f"{start} unexpected byte(s) before a command (previous payload too long?)")
+                del self.buffer[:start]
+            if len(self.buffer) < 3:
+                return
+            command = self.buffer[2]
+            if command not in COMMAND_LENGTHS:
+                self.error(f"unknown command 0x{command:02x}")
+                del self.buffer[:3]
+                continue
+            end = 3 + COMMAND_LENGTHS[command]
+            if len(self.buffer) < end:
+                return
+            payload = bytes(self.buffer[3:end])
+            del self.buffer[:end]
+            self.apply(command, payload)
+
+    def check_timeout(self, now=None):
+        """Report and drop a command whose payload stopped arriving."""
+        now = time.monotonic() if now is None else now
+        if self.buffer and now - self.last_data_time > COMMAND_TIMEOUT:
+            if self.buffer[:2] == FWK_MAGIC and len(self.buffer) >= 3 and self.buffer[2] in COMMAND_LENGTHS:
+                expected = COMMAND_LENGTHS[self.buffer[2]]
+                self.error(f"command 0x{self.buffer[2]:02x} payload is {len(self.buffer) - 3} byte(s), expected {expected}")
+            else:
+                self.error(f"{len(self.buffer)} unexpected byte(s) after a command (previous payload too long?)")
+            self.buffer.clear()
+
+    def apply(self, command, payload):
+        if command == BRIGHTNESS:
+            self.brightness = payload[0]
+        elif command == SLEEP:
+            self.sleeping = bool(payload[0])
+        elif command == DRAW_BW:
+            bits = int.from_bytes(payload, "little")
+            self.framebuffer = [[255 if bits >> (row * WIDTH + col) & 1 else 0 for col in range(WIDTH)]
+                                for row in range(HEIGHT)]
+            self.frame_drawn()
+        elif command == STAGE_GREY_COL:
+            if payload[0] >= WIDTH:
+                self.error(f"greyscale column {payload[0]} out of range")
+                return
+            self.grey_columns[payload[0]] = list(payload[1:])
+        elif command == DRAW_GREY_COL_BUFFER:
+            self.framebuffer = [[self.grey_columns[col][row] for col in range(WIDTH)] for row in range(HEIGHT)]
+            self.frame_drawn()
+
+    def frame_drawn(self):
+        with self.frame_done:
+            self.frames += 1
+            self.frame_done.notify_all()
+        if self.on_frame is not None:
+            self.on_frame(self.framebuffer)
+
+    def wait_for_frames(self, count, timeout=1.0):
+        """Block until at least `count` frames have been drawn in total."""
+        with self.frame_done:
+            return self.frame_done.wait_for(lambda: self.frames >= count, timeout)
+
+    def run(self):
+        self.running = True
+        while self.running:
+            readable, _, _ = select.select([self.master_fd], [], [], COMMAND_TIMEOUT)
+            if readable:
+                self.feed(os.read(self.master_fd, 4096))
+            else:
+                self.check_timeout()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def close(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+        os.close(self.master_fd)
+        os.close(self.slave_fd)
+
+def open_client(port):
+    """Open the emulator like the real code would, through pyserial when it is installed."""
+    try:
+        import serial
+    except ImportError:
+        from led_serial import open_raw_port
+        return open_raw_port(port)
+    return serial.Serial(port, 115200)
+
+def measure_serial_path(emulator, count=200):
+    """Send `count` draw commands through the pty; returns latency and throughput figures."""
+    command = bytes(FWK_MAGIC) + bytes([DRAW_BW]) + bytes(39)
+    latencies = []
+    with open_client(emulator.port) as client:
+        start = time.perf_counter()
+        for _ in range(count):
+            sent = time.perf_counter()
+            target = emulator.frames + 1
+            client.write(command)
+            if not emulator.wait_for_frames(target):
+                raise TimeoutError("emulator did not decode the frame")
+            latencies.append(time.perf_counter() - sent)
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "frames": count,
+        "fps": count / elapsed,
+        "bytes_per_second": count * len(command) / elapsed,
+        "latency_median_ms": latencies[len(latencies) // 2] * 1000,
+        "latency_max_ms": latencies[-1] * 1000,
+    }
+
+if __name__ == "__main__":
+    emulator = LedMatrixEmulator()
+    emulator.start()
+    print(f"Emulated LED module on {emulator.port}")
+    print(measure_serial_path(emulator))
+    emulator.close()
@@ -0,0 +1,219 @@
+# framebuffer.py
+import mmap
+import os
+import select
+import stat
+import struct
+import sys
+import time
+from settings import (DEBUG, SHARED_FRAMEBUFFER_PATH, SHARED_FRAMEBUFFER_PRIORITY, SHARED_FRAMEBUFFER_TTL)
+from control_socket import FRAME_BYTES, GREY_BYTES
+
+# File layout: a header, then two slots that writers fill alternately
+MAGIC = b"FWFB"
+LAYOUT_VERSION = 1
+SLOTS = 2
+HEADER = struct.Struct("<4sHHI")  # Magic, layout version, slot count, number of the newest complete frame
+PUBLISHED_OFFSET = 8  # The frame number, on its own for single-store updates
+HEADER_SIZE = 64
+SLOT_HEADER = struct.Struct("<IBxH")  # Sequence (odd while being written), kind, payload length
+SLOT_SIZE = 320  # Slot header plus the largest payload, rounded up
+FILE_SIZE = HEADER_SIZE + SLOTS * SLOT_SIZE
+UINT32 = struct.Struct("<I")
+
+KIND_FRAME = 1  # Packed 1-bit frame, as from led_serial.pack_grid
+KIND_GREY = 2  # Greyscale frame, one byte per LED, column by column
+PAYLOAD_BYTES = {KIND_FRAME: FRAME_BYTES, KIND_GREY: GREY_BYTES}
+READ_RETRIES = 3  # Attempts at a frame that is being overwritten before waiting for the next
+
+def notify_path(path):
+    return path + ".notify"
+
+def slot_offset(number):
+    return HEADER_SIZE + (number % SLOTS) * SLOT_SIZE
+
+class SharedFramebuffer:
+    """The daemon's side of the shared framebuffer: a small mmap'd file plus a notification FIFO.
+
+    A writer fills the slot not holding the newest frame, bracketed by an odd and then even slot
+    sequence, publishes the frame number and writes a byte to the FIFO. Reading checks the
+    sequence before and after copying, so a frame overwritten mid-read is retried, never shown.
+    """
+
+    def __init__(self, path=SHARED_FRAMEBUFFER_PATH):
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size != FILE_SIZE:
+                os.ftruncate(fd, FILE_SIZE)
+            self.map = mmap.mmap(fd, FILE_SIZE)
+        finally:
+            os.close(fd)
+        # Writers keep their mapping across daemon restarts, so an existing layout is reused
+        if HEADER.unpack_from(self.map)[:3] != (MAGIC, LAYOUT_VERSION, SLOTS):
+            self.map[:] = bytes(FILE_SIZE)
+            HEADER.pack_into(self.map, 0, MAGIC, LAYOUT_VERSION, SLOTS, 0)
+        self.last_number = UINT32.unpack_from(self.map, PUBLISHED_OFFSET)[0]  # Not replayed after a restart
+        self.torn = 0  # Reads that raced a writer
+        self.rejected = 0  # Frames with an unknown kind or length
+
+        fifo = notify_path(path)
+        if os.path.exists(fifo) and not stat.S_ISFIFO(os.stat(fifo).st_mode):
+            os.unlink(fifo)
+        if not os.path.exists(fifo):
+            os.mkfifo(fifo, 0o600)
+        # Opened for writing too, so the FIFO never reports end of file between writers
+        self.notify_fd = os.open(fifo, os.O_RDWR | os.O_NONBLOCK)
+
+    def read(self):
+        """The newest complete frame as (kind, payload) if a new one was published, else None."""
+        for _ in range(READ_RETRIES):
+            number = UINT32.unpack_from(self.map, PUBLISHED_OFFSET)[0]
+            if number == self.last_number:
+                return None
+            offset = slot_offset(number)
+            sequence, kind, length = SLOT_HEADER.unpack_from(self.map, offset)
+            start = offset + SLOT_HEADER.size
+            payload = self.map[start:start + min(length, SLOT_SIZE - SLOT_HEADER.size)]
+            if sequence % 2 == 0 and UINT32.unpack_from(self.map, offset)[0] == sequence:
+                self.last_number = number
+                if PAYLOAD_BYTES.get(kind) != length:
+                    self.rejected += 1
+                    return None
+                return kind, payload
+            self.torn += 1
+        return None
+
+    def wait(self, timeout=None):
+        """Block until a writer signals, then clear every pending notification."""
+        select.select([self.notify_fd], [], [], timeout)
+        self.clear_notifications()
+
+    def clear_notifications(self):
+        try:
+            while os.read(self.notify_fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def close(self):
+        os.close(self.notify_fd)
+        self.map.close()
+
+class FramebufferWriter:
+    """A producer's side of the shared framebuffer; one writer at a time.
+
+    Either call write_frame / write_greyscale, or draw in place: fill the view returned by
+    begin(), release it and call commit().
+    """
+
+    def __init__(self, path=SHARED_FRAMEBUFFER_PATH):
+        try:
+            fd = os.open(path, os.O_RDWR)  # Created by the daemon
+        except FileNotFoundError:
+            raise FileNotFoundError(f"No shared framebuffer at {path}; start the dashboard with SHARED_FRAMEBUFFER = True")
+        try:
+            self.map = mmap.mmap(fd, FILE_SIZE)
+        finally:
+            os.close(fd)
+        if HEADER.unpack_from(self.map)[:3] != (MAGIC, LAYOUT_VERSION, SLOTS):
+            self.map.close()
+            raise ValueError(f"{path} is not a version {LAYOUT_VERSION} LED framebuffer")
+        self.notify_path = notify_path(path)
+        self.notify_fd = None
+        self.number = None
+        self.sequence = None
+
+    def begin(self, kind=KIND_FRAME):
+        """Mark the back slot as being written; returns a writable memoryview of its payload."""
+        self.number = (UINT32.unpack_from(self.map, PUBLISHED_OFFSET)[0] + 1) % 2 ** 32
+        offset = slot_offset(self.number)
+        sequence = UINT32.unpack_from(self.map, offset)[0]
+        self.sequence = (sequence + (1 if sequence % 2 == 0 else 2)) % 2 ** 32  # Odd: being written
+        SLOT_HEADER.pack_into(self.map, offset, self.sequence, kind, PAYLOAD_BYTES[kind])
+        start = offset + SLOT_HEADER.size
+        return memoryview(self.map)[start:start + PAYLOAD_BYTES[kind]]
+
+    def commit(self):
+        """Publish the slot filled since begin() and wake the daemon."""
+        UINT32.pack_into(self.map, slot_offset(self.number), (self.sequence + 1) % 2 ** 32)
+        UINT32.pack_into(self.map, PUBLISHED_OFFSET, self.number)
+        self.notify()
+
+    def notify(self):
+        if self.notify_fd is None:
+            try:
+                self.notify_fd = os.open(self.notify_path, os.O_WRONLY | os.O_NONBLOCK)
+            except OSError:
+                return  # No daemon reading; it picks up the newest frame when it starts
+        try:
+            os.write(self.notify_fd, b"\0")
+        except BlockingIOError:
+            pass  # Notifications are already pending
+        except OSError:
+            os.close(self.notify_fd)
+            self.notify_fd = None
+
+    def write_frame(self, vals):
+        """Publish a packed 39-byte frame, e.g. from led_serial.pack_grid."""
+        with self.begin(KIND_FRAME) as view:
+            view[:] = bytes(vals)
+        self.commit()
+
+    def write_greyscale(self, columns):
+        """Publish a greyscale frame given as 9 columns of 34 brightness values."""
+        with self.begin(KIND_GREY) as view:
+            view[:] = b"".join(bytes(column[:34]) for column in columns[:9])
+        self.commit()
+
+    def close(self):
+        if self.notify_fd is not None:
+            os.close(self.notify_fd)
+        self.map.close()
+
+def make_item(kind, payload):
+    """A push queue item for a frame read from the framebuffer."""
+    item = {"priority": SHARED_FRAMEBUFFER_PRIORITY, "ttl": SHARED_FRAMEBUFFER_TTL, "stream": "framebuffer"}
+    if kind == KIND_GREY:
+        item["type"] = "grey"
+        item["columns"] = [payload[col * 34:(col + 1) * 34] for col in range(9)]
+    else:
+        item["type"] = "frame"
+        item["data"] = payload
+    return item
+
+def queue_newest_frame(framebuffer, push_queue, previous=None):
+    """Queue the newest frame in place of the previous one; returns the item now queued."""
+    frame = framebuffer.read()
+    if frame is None:
+        return previous
+    item = make_item(*frame)
+    push_queue.push(item, replaces=previous)
+    return item
+
+def serve_shared_framebuffer(push_queue, path=SHARED_FRAMEBUFFER_PATH):
+    """Show frames from the shared framebuffer as they are published."""
+    framebuffer = SharedFramebuffer(path)
+    item = None
+    try:
+        while True:
+            framebuffer.wait()
+            item = queue_newest_frame(framebuffer, push_queue, item)
+    finally:
+        if DEBUG:
+            print(f"Shared framebuffer: {framebuffer.torn} torn reads, {framebuffer.rejected} rejected frames")
+        framebuffer.close()
+
+if __name__ == "__main__":
+    # Usage: python framebuffer.py [fps] [seconds]  -- streams a sweeping bar to the running daemon
+    fps = float(sys.argv[1]) if len(sys.argv) > 1 else 60
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    writer = FramebufferWriter()
+    start = time.monotonic()
+    frame = 0
+    while time.monotonic() - start < seconds:
+        row = frame % 34
+        writer.write_greyscale([bytes(255 if y == row else 0 for y in range(34))] * 9)
+        frame += 1
+        time.sleep(max(0.0, start + frame / fps - time.monotonic()))
+    writer.close()
+    print(f"{frame} frames in {time.monotonic() - start:.1f}s")
@@ -2,6 +2,10 @@
 from dictionary import DICTIONARY
 from settings import WIDTH, HEIGHT
 
+def sanitize_text(text):
+    """Replace characters without a glyph so the text can be passed to scroll_text."""
+    return "".join(char if char == "." or char.upper() in DICTIONARY else " " for char in text)
+
 def scroll_text(text):
     text_grid = []
     for row in range(5):
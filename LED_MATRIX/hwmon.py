@@ -0,0 +1,114 @@
+# hwmon.py
+import glob
+import os
+import sys
+from settings import DEBUG, HWMON_ROOT
+
+# hwmon driver names, in order of preference
+CPU_DRIVERS = ("k10temp", "zenpower", "coretemp", "cpu_thermal", "acpitz")
+GPU_DRIVERS = ("amdgpu", "nouveau", "radeon")
+CPU_LABELS = ("Tctl", "Tdie", "Package id 0")  # Preferred CPU temperature inputs
+READ_SIZE = 32
+
+def read_text(path):
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except (IOError, OSError):
+        return None
+
+def pick_temp_input(device, preferred_labels=()):
+    """Choose the temp*_input of a device whose label is preferred, else the first one."""
+    inputs = sorted(glob.glob(os.path.join(device, "temp*_input")))
+    for label in preferred_labels:
+        for path in inputs:
+            if read_text(path.replace("_input", "_label")) == label:
+                return path
+    return inputs[0] if inputs else None
+
+def discover_hwmon(root=HWMON_ROOT):
+    """Scan the hwmon tree once and return the CPU and GPU temperature and fan input paths."""
+    devices = {}
+    for device in sorted(glob.glob(os.path.join(root, "hwmon*"))):
+        devices.setdefault(read_text(os.path.join(device, "name")), device)
+
+    sensors = {"cpu_temp": None, "gpu_temp": None, "fans": []}
+    for driver in CPU_DRIVERS:
+        if driver in devices:
+            sensors["cpu_temp"] = pick_temp_input(devices[driver], CPU_LABELS)
+            break
+    for driver in GPU_DRIVERS:
+        if driver in devices:
+            sensors["gpu_temp"] = pick_temp_input(devices[driver])
+            break
+    for device in sorted(glob.glob(os.path.join(root, "hwmon*"))):
+        sensors["fans"] += sorted(glob.glob(os.path.join(device, "fan*_input")))
+    if DEBUG:
+        print(f"hwmon sensors: {sensors}")
+    return sensors
+
+class HwmonReader:
+    """Keep the chosen hwmon inputs open and re-read them with pread on every sample."""
+
+    def __init__(self, root=HWMON_ROOT):
+        sensors = discover_hwmon(root)
+        self.cpu_fd = self.open_input(sensors["cpu_temp"])
+        self.gpu_fd = self.open_input(sensors["gpu_temp"])
+        self.fan_fds = [fd for fd in (self.open_input(path) for path in sensors["fans"]) if fd is not None]
+
+    def open_input(self, path):
+        if path is None:
+            return None
+        try:
+            return os.open(path, os.O_RDONLY)
+        except OSError:
+            return None
+
+    def read_value(self, fd):
+        if fd is None:
+            return None
+        try:
+            return int(os.pread(fd, READ_SIZE, 0))
+        except (OSError, ValueError):
+            return None  # Sensors can return EIO while the device is suspended
+
+    def read(self):
+        """Return CPU and GPU temperatures in degrees C and the fastest fan in RPM (None if missing)."""
+        cpu_temp = self.read_value(self.cpu_fd)
+        gpu_temp = self.read_value(self.gpu_fd)
+        fan_speeds = [speed for speed in (self.read_value(fd) for fd in self.fan_fds) if speed is not None]
+        return {
+            "cpu_temp": cpu_temp / 1000 if cpu_temp is not None else None,
+            "gpu_temp": gpu_temp / 1000 if gpu_temp is not None else None,
+            "fan": max(fan_speeds) if fan_speeds else None,
+        }
+
+    def close(self):
+        for fd in [self.cpu_fd, self.gpu_fd] + self.fan_fds:
+            if fd is not None:
+                os.close(fd)
+
+def make_fake_hwmon(root, cpu_temp=45000, gpu_temp=40000, fans=(2400, 2600)):
+    """Build a fake hwmon tree (k10temp, amdgpu and a two-fan EC) for tests and headless development."""
+    def write_device(index, name, files):
+        device = os.path.join(root, f"hwmon{index}")
+        os.makedirs(device, exist_ok=True)
+        files["name"] = name
+        for filename, value in files.items():
+            with open(os.path.join(device, filename), "w") as f:
+                f.write(f"{value}\n")
+        return device
+
+    write_device(0, "acpitz", {"temp1_input": 30000})
+    write_device(1, "k10temp", {"temp1_input": cpu_temp, "temp1_label": "Tctl", "temp3_input": cpu_temp - 5000, "temp3_label": "Tccd1"})
+    write_device(2, "amdgpu", {"temp1_input": gpu_temp, "temp1_label": "edge"})
+    write_device(3, "cros_ec", {f"fan{i + 1}_input": speed for i, speed in enumerate(fans)})
+    return root
+
+if __name__ == "__main__":
+    # Usage: python hwmon.py [--fake DIR]
+    root = HWMON_ROOT
+    if len(sys.argv) > 2 and sys.argv[1] == "--fake":
+        root = make_fake_hwmon(sys.argv[2])
+    print(discover_hwmon(root))
+    print(HwmonReader(root).read())
@@ -2,7 +2,9 @@
 import socket
 import requests
 from settings import DEBUG
+from providers import provider
 
+@provider("private_ip")
 def get_private_ip():
     try:
         s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -15,6 +17,7 @@ def get_private_ip():
             print(f"Error fetching private IP: {e}")
         return " "
 
+@provider("public_ip")
 def get_public_ip():
     try:
         response = requests.get('https://api.ipify.org', params={'format': 'text'})
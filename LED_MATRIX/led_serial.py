@@ -1,8 +1,8 @@
 # led-serial.py
 import glob
-import serial
-import time
-from settings import DEBUG
+import os
+import tty
+from settings import DEBUG, SERIAL_PORT_OVERRIDE
 
 FWK_MAGIC = [0x32, 0xAC]
 WIDTH = 9
@@ -16,6 +16,8 @@ DEGREE = [
 ]
 
 def detect_serial_port():
+    if SERIAL_PORT_OVERRIDE:
+        return SERIAL_PORT_OVERRIDE
     ports = glob.glob('/dev/ttyACM*')
     if len(ports) >= 2:
         return ports[1]
@@ -26,6 +28,13 @@ def detect_serial_port():
             print("No serial ports found.")
         return None
 
+def open_raw_port(port):
+    """Open the module's tty in raw mode without pyserial, for quick one-shot commands."""
+    fd = os.open(port, os.O_WRONLY | os.O_NOCTTY)
+    if os.isatty(fd):
+        tty.setraw(fd)
+    return os.fdopen(fd, "wb", buffering=0)
+
 def send_command_raw(serial_connection, command):
     try:
         serial_connection.write(bytes(command))
@@ -42,3 +51,25 @@ def clear_leds(serial_connection):
     vals = [0x00 for _ in range(39)]
     command = FWK_MAGIC + [0x06] + vals
     send_command_raw(serial_connection, command)
+
+def pack_grid(grid):
+    """Pack a grid of 0/1 rows into the 39-byte payload of the draw command."""
+    vals = [0x00 for _ in range(39)]
+    for y, row in enumerate(grid[:34]):
+        for x, val in enumerate(row[:WIDTH]):
+            if val:
+                i = y * WIDTH + x
+                vals[i // 8] |= (1 << (i % 8))
+    return vals
+
+def send_frame(serial_connection, vals):
+    """Draw a packed 1-bit frame."""
+    command = FWK_MAGIC + [0x06] + list(vals)
+    send_command_raw(serial_connection, command)
+
+def send_greyscale(serial_connection, columns):
+    """Draw a greyscale frame given as 9 columns of 34 brightness values."""
+    for col, column in enumerate(columns[:WIDTH]):
+        command = FWK_MAGIC + [0x07, col] + list(column[:34])
+        send_command_raw(serial_connection, command)
+    send_command_raw(serial_connection, FWK_MAGIC + [0x08])
@@ -0,0 +1,168 @@
+# life.py
+import random
+import threading
+import time
+from backends import open_output, needs_serial_port
+from animation import AnimationPlayer, make_transition, bits_frame, FULL_MASK
+from led_serial import detect_serial_port, set_brightness, clear_leds, send_frame
+from settings import DEBUG, LIFE_RULE, LIFE_DELAY, LIFE_HISTORY, TRANSITION_TIME
+
+WIDTH = 9
+HEIGHT = 34
+CELLS = WIDTH * HEIGHT
+
+# The whole board is one int in the panel's bit order (cell x, y is bit x + 9 * y), so every
+# row is a 9-bit field and a shift moves all rows at once
+FIRST_COLUMN = sum(1 << (WIDTH * y) for y in range(HEIGHT))
+LAST_COLUMN = FIRST_COLUMN << (WIDTH - 1)
+
+# Global flag to stop the life thread
+life_running = False
+
+def stop_life():
+    global life_running
+    life_running = False
+
+def parse_rule(rule):
+    """Birth and survival neighbour counts from a rule like "B3/S23" (Conway) or "B36/S23" (HighLife)."""
+    birth, survive = set(), set()
+    for part in rule.upper().split("/"):
+        if part[:1] == "B":
+            birth = {int(n) for n in part[1:]}
+        elif part[:1] == "S":
+            survive = {int(n) for n in part[1:]}
+        else:
+            raise ValueError(f"Invalid rule {rule!r}, expected e.g. B3/S23")
+    return frozenset(birth), frozenset(survive)
+
+def neighbour_planes(board):
+    """The board shifted onto each cell's 8 neighbours, wrapping at every edge."""
+    # Rows above and below: rotate the whole board by one row
+    up = ((board >> WIDTH) | (board << (CELLS - WIDTH))) & FULL_MASK
+    down = ((board << WIDTH) | (board >> (CELLS - WIDTH))) & FULL_MASK
+    planes = []
+    for middle, rows in ((False, up), (True, board), (False, down)):
+        # Columns to the right and left: rotate each 9-bit row by one
+        right = ((rows >> 1) & ~LAST_COLUMN) | ((rows & FIRST_COLUMN) << (WIDTH - 1))
+        left = ((rows << 1) & ~FIRST_COLUMN & FULL_MASK) | ((rows & LAST_COLUMN) >> (WIDTH - 1))
+        planes += (left, right) if middle else (left, rows, right)
+    return planes
+
+def full_add(a, b, c):
+    return a ^ b ^ c, (a & b) | (c & (a ^ b))
+
+def count_bits(planes):
+    """Add the 8 neighbour planes cell-wise; returns the 1, 2, 4 and 8 bits of every count."""
+    n0, n1, n2, n3, n4, n5, n6, n7 = planes
+    sum_a, carry_a = full_add(n0, n1, n2)
+    sum_b, carry_b = full_add(n3, n4, n5)
+    sum_c, carry_c = n6 ^ n7, n6 & n7
+    ones, carry_d = full_add(sum_a, sum_b, sum_c)
+    twos_partial, carry_e = full_add(carry_a, carry_b, carry_c)
+    twos, carry_f = twos_partial ^ carry_d, twos_partial & carry_d
+    return ones, twos, carry_e ^ carry_f, carry_e & carry_f
+
+def count_equals(bits, n):
+    """Mask of the cells with exactly `n` live neighbours."""
+    mask = FULL_MASK
+    for i, plane in enumerate(bits):
+        mask &= plane if n >> i & 1 else plane ^ FULL_MASK
+    return mask
+
+def step(board, rule):
+    """Compute the next generation of the whole board with a few dozen shifts and bitwise ops."""
+    birth, survive = rule
+    bits = count_bits(neighbour_planes(board))
+    born = 0
+    for n in birth:
+        born |= count_equals(bits, n)
+    survives = 0
+    for n in survive:
+        survives |= count_equals(bits, n)
+    return ((board ^ FULL_MASK) & born) | (board & survives)
+
+def random_board():
+    """A random board with about three in eight cells alive."""
+    return random.getrandbits(CELLS) & (random.getrandbits(CELLS) | random.getrandbits(CELLS))
+
+class Life:
+    """Run a cellular automaton and reseed it when it dies out or falls into a cycle."""
+
+    def __init__(self, rule=LIFE_RULE, history=LIFE_HISTORY):
+        self.rule = parse_rule(rule)
+        self.history = history
+        self.reseed()
+
+    def reseed(self):
+        self.board = random_board()
+        self.recent = {self.board: 0}  # Board -> generation, for the last `history` generations
+        self.generation = 0
+
+    def advance(self):
+        """Step one generation; returns False when the board repeats and has been reseeded."""
+        self.board = step(self.board, self.rule)
+        self.generation += 1
+        if self.board in self.recent:
+            if DEBUG:
+                period = self.generation - self.recent[self.board]
+                print(f"Life settled into a period {period} cycle after {self.generation} generations")
+            self.reseed()
+            return False
+        self.recent[self.board] = self.generation
+        if len(self.recent) > self.history:
+            del self.recent[next(iter(self.recent))]  # Oldest first, dicts keep insertion order
+        return True
+
+# Life screensaver loop, cross-fading into a new random board whenever the old one repeats
+def life_animation(serial_connection):
+    global life_running
+    life_running = True
+    life = Life()
+    reseed = AnimationPlayer()
+    frame = bits_frame(life.board)
+    send_frame(serial_connection, frame)
+
+    while life_running:
+        if reseed.active:
+            transition_frame = reseed.next_frame()
+            if transition_frame is not None:
+                send_frame(serial_connection, transition_frame)
+            time.sleep(min(reseed.time_to_next(), LIFE_DELAY))
+            continue
+
+        settled = not life.advance()
+        next_frame = bits_frame(life.board)
+        if settled:
+            reseed.play(make_transition("dissolve", frame, next_frame, TRANSITION_TIME))
+        elif next_frame != frame:
+            send_frame(serial_connection, next_frame)
+        frame = next_frame
+        time.sleep(LIFE_DELAY)
+
+    clear_leds(serial_connection)
+
+# Start the screensaver in a separate thread
+def start_life_thread(serial_connection):
+    life_thread = threading.Thread(target=life_animation, args=(serial_connection,), daemon=True)
+    life_thread.start()
+
+# Main loop to detect the serial port and start the screensaver
+def main_loop():
+    SERIAL_PORT = detect_serial_port()
+    if not SERIAL_PORT and needs_serial_port():
+        return
+
+    try:
+        with open_output(SERIAL_PORT) as ser:
+            set_brightness(ser, 64)
+            start_life_thread(ser)
+
+            while True:
+                # Keep the main loop alive
+                time.sleep(1)
+
+    except (IOError, OSError) as ex:
+        print(f"Error: {ex}")
+
+if __name__ == "__main__":
+    main_loop()
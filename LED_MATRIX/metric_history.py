@@ -0,0 +1,168 @@
+# metric_history.py
+import fcntl
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from settings import METRIC_HISTORY_DIR
+
+# File layout: a header, the open minute and hour totals, then three round-robin rings
+MAGIC = b"FWMH"
+LAYOUT_VERSION = 1
+RAW_SLOTS = 2400  # Every sample: 10 minutes of CPU readings at 0.25 s
+MINUTE_SLOTS = 1440  # One average per minute for a day
+HOUR_SLOTS = 720  # One average per hour for 30 days
+HEADER = struct.Struct("<4sHxxIII")  # Magic, layout version, raw, minute and hour slot counts
+HEADER_SIZE = 32
+ACCUMULATOR = struct.Struct("<dddI")  # Bucket start, sum, peak and count of the minute or hour still open
+MINUTE_TOTALS = HEADER_SIZE
+HOUR_TOTALS = MINUTE_TOTALS + 32
+RING_HEADER = struct.Struct("<II")  # Next slot to write, slots written so far (up to the ring size)
+SLOT = struct.Struct("<dffI")  # Bucket start (Unix time), mean, peak, samples averaged
+RINGS_OFFSET = HOUR_TOTALS + 32
+
+COLUMNS = 9  # One column of the panel per point in a view
+VIEWS = {  # Span in seconds and bucket length of the rollup each view reads; "seconds" reads raw samples
+    "seconds": None,
+    "hour": (3600, 60),
+    "day": (86400, 3600),
+}
+
+def file_size(raw_slots, minute_slots, hour_slots):
+    return RINGS_OFFSET + sum(RING_HEADER.size + slots * SLOT.size for slots in (raw_slots, minute_slots, hour_slots))
+
+class Ring:
+    """Fixed-size round-robin of SLOT records at `offset` in a mapped file."""
+
+    def __init__(self, map, offset, slots):
+        self.map = map
+        self.offset = offset
+        self.slots = slots
+
+    def append(self, start, mean, peak, count):
+        position, filled = RING_HEADER.unpack_from(self.map, self.offset)
+        SLOT.pack_into(self.map, self.offset + RING_HEADER.size + position * SLOT.size, start, mean, peak, count)
+        # The slot is written before the header moves past it, so a crash loses at most this sample
+        RING_HEADER.pack_into(self.map, self.offset, (position + 1) % self.slots, min(filled + 1, self.slots))
+
+    def latest(self, count):
+        """Up to `count` of the newest records, oldest first."""
+        position, filled = RING_HEADER.unpack_from(self.map, self.offset)
+        count = min(count, filled)
+        start = self.offset + RING_HEADER.size
+        return [SLOT.unpack_from(self.map, start + ((position - count + i) % self.slots) * SLOT.size)
+                for i in range(count)]
+
+class MetricHistory:
+    """One metric's samples on disk, with 1-minute and 1-hour averages rolled up as samples arrive.
+
+    The file is memory-mapped, so adding a sample is a few stores and reading a view touches only
+    the records it shows. One process writes at a time; others opening the file read it live.
+    """
+
+    def __init__(self, path, raw_slots=RAW_SLOTS, minute_slots=MINUTE_SLOTS, hour_slots=HOUR_SLOTS):
+        self.lock = threading.Lock()
+        size = file_size(raw_slots, minute_slots, hour_slots)
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            self.writable = True
+        except BlockingIOError:
+            self.writable = False  # Another monitor is recording; follow its writes
+        if os.fstat(self.fd).st_size != size and self.writable:
+            os.ftruncate(self.fd, size)
+        self.map = mmap.mmap(self.fd, size)
+        layout = (MAGIC, LAYOUT_VERSION, raw_slots, minute_slots, hour_slots)
+        if HEADER.unpack_from(self.map) != layout:
+            if not self.writable:
+                raise ValueError(f"{path} is being written with a different layout")
+            self.map[:] = bytes(size)
+            HEADER.pack_into(self.map, 0, *layout)
+        self.raw = Ring(self.map, RINGS_OFFSET, raw_slots)
+        self.minutes = Ring(self.map, self.raw.offset + RING_HEADER.size + raw_slots * SLOT.size, minute_slots)
+        self.hours = Ring(self.map, self.minutes.offset + RING_HEADER.size + minute_slots * SLOT.size, hour_slots)
+
+    def add(self, value, now=None):
+        """Record a sample taken at Unix time `now`, closing the minute and hour it ends."""
+        if not self.writable or value is None:
+            return
+        now = time.time() if now is None else now
+        with self.lock:
+            self.raw.append(now, value, value, 1)
+            minute = now - now % 60
+            start, total, peak, count = ACCUMULATOR.unpack_from(self.map, MINUTE_TOTALS)
+            if count and minute > start:  # A clock stepped back keeps adding to the open minute
+                self.close_minute(start, total, peak, count)
+                count = 0
+            if not count:
+                start, total, peak = minute, 0.0, value
+            ACCUMULATOR.pack_into(self.map, MINUTE_TOTALS, start, total + value, max(peak, value), count + 1)
+
+    def close_minute(self, start, total, peak, count):
+        self.minutes.append(start, total / count, peak, count)
+        hour = start - start % 3600
+        hour_start, hour_total, hour_peak, hour_count = ACCUMULATOR.unpack_from(self.map, HOUR_TOTALS)
+        if hour_count and hour > hour_start:
+            self.hours.append(hour_start, hour_total / hour_count, hour_peak, hour_count)
+            hour_count = 0
+        if not hour_count:
+            hour_start, hour_total, hour_peak = hour, 0.0, peak
+        ACCUMULATOR.pack_into(self.map, HOUR_TOTALS, hour_start, hour_total + total, max(hour_peak, peak),
+                              hour_count + count)
+        self.map.flush()  # Once a minute, so a power cut loses at most the open minute
+
+    def recent(self, count=COLUMNS):
+        """The newest `count` raw samples, oldest first."""
+        return [mean for _, mean, _, _ in self.raw.latest(count)]
+
+    def open_bucket(self, offset):
+        """The minute or hour still being summed as a SLOT record, or None before its first sample."""
+        start, total, peak, count = ACCUMULATOR.unpack_from(self.map, offset)
+        return (start, total / count, peak, count) if count else None
+
+    def view(self, name, now=None, columns=COLUMNS):
+        """Values for `columns` equal slices of the view's span, oldest first; None where nothing was recorded.
+
+        "hour" reads at most an hour of minute averages and "day" a day of hourly ones, never raw
+        samples. Each column is the sample-weighted mean of the buckets starting inside it.
+        """
+        if VIEWS[name] is None:
+            values = self.recent(columns)
+            return [None] * (columns - len(values)) + values
+        span, bucket = VIEWS[name]
+        now = time.time() if now is None else now
+        with self.lock:
+            ring = self.minutes if bucket == 60 else self.hours
+            records = ring.latest(span // bucket + 1)
+            # The open hour only holds closed minutes, so the open minute is counted on its own
+            open_totals = [MINUTE_TOTALS] if bucket == 60 else [HOUR_TOTALS, MINUTE_TOTALS]
+            records += [self.open_bucket(offset) for offset in open_totals]
+        sums = [0.0] * columns
+        counts = [0] * columns
+        begin = now - span
+        for start, mean, _, count in filter(None, records):
+            if start >= begin:
+                column = min(columns - 1, int((start - begin) * columns / span))
+                sums[column] += mean * count
+                counts[column] += count
+        return [total / count if count else None for total, count in zip(sums, counts)]
+
+    def close(self):
+        self.map.close()
+        os.close(self.fd)
+
+def history_path(name, directory=METRIC_HISTORY_DIR):
+    return os.path.join(directory, f"{name}.hist")
+
+def open_history(name, directory=METRIC_HISTORY_DIR):
+    os.makedirs(directory, exist_ok=True)
+    return MetricHistory(history_path(name, directory))
+
+if __name__ == "__main__":
+    # Usage: python metric_history.py [metric] -- prints each view of a recorded metric, e.g. cpu
+    history = open_history(sys.argv[1] if len(sys.argv) > 1 else "cpu")
+    for name in VIEWS:
+        print(f"{name:<8}", " ".join("   -" if value is None else f"{value:4.0f}" for value in history.view(name)))
+    history.close()
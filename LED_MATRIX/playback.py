@@ -0,0 +1,354 @@
+# playback.py
+import hashlib
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from backends import open_output, needs_serial_port, FrameRecorder, read_recorded_frames, KIND_BW, KIND_GREY
+from led_serial import detect_serial_port, set_brightness, clear_leds, send_frame, send_greyscale
+from settings import (DEBUG, BRIGHTNESS, PLAYBACK_MODE, PLAYBACK_FPS, PLAYBACK_PREFETCH, PLAYBACK_CACHE,
+                      PLAYBACK_CACHE_DIR, PLAYBACK_LOOP)
+
+WIDTH = 9
+HEIGHT = 34
+FRAME_PIXELS = WIDTH * HEIGHT
+BATCH_FRAMES = 16  # Frames converted together; dithering is vectorized across the batch
+GIF_DEFAULT_DURATION = 0.1  # Seconds for GIF frames without a duration
+BAYER_4X4 = [[0, 8, 2, 10], [12, 4, 14, 6], [3, 11, 1, 9], [15, 7, 13, 5]]
+
+# Global flag to stop playback
+playback_running = False
+
+def stop_playback():
+    global playback_running
+    playback_running = False
+
+def import_numpy():
+    """NumPy is only needed for playback, so it is imported when a clip starts."""
+    try:
+        import numpy
+    except ImportError:
+        raise RuntimeError("Playback needs NumPy: pip install numpy")
+    return numpy
+
+def gif_frames(np, path):
+    """(levels, duration) for each frame of a GIF, downscaled with Pillow."""
+    try:
+        from PIL import Image, ImageSequence
+    except ImportError:
+        raise RuntimeError("GIF playback needs Pillow (pip install pillow) or ffmpeg")
+    with Image.open(path) as image:
+        for frame in ImageSequence.Iterator(image):
+            duration = frame.info.get("duration", 0) / 1000 or GIF_DEFAULT_DURATION
+            levels = np.asarray(frame.convert("L").resize((WIDTH, HEIGHT), Image.BOX), dtype=np.uint8)
+            yield levels, duration
+
+def ffmpeg_frames(np, path, fps=PLAYBACK_FPS):
+    """(levels, duration) for each frame of any clip ffmpeg can decode, scaled down by ffmpeg itself."""
+    command = ["ffmpeg", "-loglevel", "error", "-i", path, "-vf", f"fps={fps},scale={WIDTH}:{HEIGHT}:flags=area",
+               "-f", "rawvideo", "-pix_fmt", "gray", "-"]
+    errors = tempfile.TemporaryFile()  # A file, not a pipe, so a flood of warnings cannot stall ffmpeg
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stdin=subprocess.DEVNULL, stderr=errors)
+    try:
+        while True:
+            data = process.stdout.read(FRAME_PIXELS)
+            if len(data) < FRAME_PIXELS:
+                break
+            yield np.frombuffer(data, dtype=np.uint8).reshape(HEIGHT, WIDTH), 1 / fps
+        if process.wait() != 0:
+            errors.seek(0)
+            message = errors.read().decode(errors="replace").strip().splitlines()
+            raise RuntimeError(f"ffmpeg could not decode {path}: {message[-1] if message else process.returncode}")
+    finally:
+        process.terminate()
+        process.wait()
+        process.stdout.close()
+        errors.close()
+
+def decode_clip(np, path, fps=PLAYBACK_FPS):
+    """Frames of a GIF through Pillow when it is installed, anything else through ffmpeg."""
+    if path.lower().endswith(".gif"):
+        try:
+            import PIL  # noqa: F401
+            return gif_frames(np, path)
+        except ImportError:
+            pass
+    if not shutil.which("ffmpeg"):
+        raise RuntimeError("Video playback needs ffmpeg")
+    return ffmpeg_frames(np, path, fps)
+
+class FrameConverter:
+    """Convert batches of 34x9 greyscale frames into panel payloads, vectorized with NumPy."""
+
+    def __init__(self, np, mode=PLAYBACK_MODE):
+        if mode not in ("floyd", "ordered", "grey"):
+            raise ValueError(f"Unknown playback mode {mode!r}")
+        self.np = np
+        self.mode = mode
+        bayer = (np.array(BAYER_4X4, dtype=np.float32) + 0.5) * 16
+        self.thresholds = np.tile(bayer, (HEIGHT // 4 + 1, WIDTH // 4 + 1))[:HEIGHT, :WIDTH]
+
+    def floyd_steinberg(self, levels):
+        """Error diffusion for every frame of the batch at once: the loop is over pixels, not frames."""
+        work = levels.astype(self.np.float32)
+        bits = self.np.zeros(levels.shape, dtype=bool)
+        for y in range(HEIGHT):
+            for x in range(WIDTH):
+                old = work[:, y, x]
+                on = old >= 128
+                bits[:, y, x] = on
+                error = old - on * 255.0
+                if x + 1 < WIDTH:
+                    work[:, y, x + 1] += error * (7 / 16)
+                if y + 1 < HEIGHT:
+                    if x > 0:
+                        work[:, y + 1, x - 1] += error * (3 / 16)
+                    work[:, y + 1, x] += error * (5 / 16)
+                    if x + 1 < WIDTH:
+                        work[:, y + 1, x + 1] += error * (1 / 16)
+        return bits
+
+    def convert(self, levels):
+        """(kind, payload) for each frame of a (frames, 34, 9) uint8 batch."""
+        np = self.np
+        count = len(levels)
+        if self.mode == "grey":
+            columns = np.ascontiguousarray(levels.transpose(0, 2, 1)).reshape(count, FRAME_PIXELS)
+            return [(KIND_GREY, row.tobytes()) for row in columns]
+        if self.mode == "ordered":
+            bits = levels > self.thresholds
+        else:
+            bits = self.floyd_steinberg(levels)
+        # Bit x + 9 * y, least significant first: the layout of led_serial.pack_grid
+        packed = np.packbits(bits.reshape(count, FRAME_PIXELS), axis=1, bitorder="little")
+        return [(KIND_BW, row.tobytes()) for row in packed]
+
+class ClipPipeline:
+    """Decode and convert a clip on a background thread, at most PLAYBACK_PREFETCH frames ahead."""
+
+    def __init__(self, path, mode=PLAYBACK_MODE, fps=PLAYBACK_FPS, prefetch=PLAYBACK_PREFETCH):
+        self.np = import_numpy()
+        self.converter = FrameConverter(self.np, mode)
+        self.frames = decode_clip(self.np, path, fps)
+        self.queue = queue.Queue(maxsize=prefetch)
+        self.running = True
+        self.convert_time = 0.0  # Seconds spent converting, for stats
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def put(self, item):
+        while self.running:
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def run(self):
+        try:
+            batch, durations = [], []
+            for levels, duration in self.frames:
+                batch.append(levels)
+                durations.append(duration)
+                if len(batch) == BATCH_FRAMES:
+                    self.convert_batch(batch, durations)
+                    batch, durations = [], []
+                if not self.running:
+                    return
+            if batch:
+                self.convert_batch(batch, durations)
+            self.put(None)
+        except Exception as e:
+            self.put(e)
+        finally:
+            close = getattr(self.frames, "close", None)
+            if close is not None:
+                close()
+
+    def convert_batch(self, batch, durations):
+        start = time.perf_counter()
+        converted = self.converter.convert(self.np.stack(batch))
+        self.convert_time += time.perf_counter() - start
+        for (kind, payload), duration in zip(converted, durations):
+            self.put((kind, payload, duration))
+
+    def __iter__(self):
+        """Converted (kind, payload, duration) frames in order; re-raises decoding errors."""
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def close(self):
+        self.running = False
+        self.thread.join()
+
+def cache_path(path, mode=PLAYBACK_MODE, fps=PLAYBACK_FPS):
+    """Where the converted frames of `path` are kept; changes when the file or settings do."""
+    info = os.stat(path)
+    key = f"{os.path.abspath(path)}:{info.st_mtime_ns}:{info.st_size}:{mode}:{fps}"
+    return os.path.join(PLAYBACK_CACHE_DIR, hashlib.sha1(key.encode()).hexdigest()[:20] + ".ring")
+
+def save_clip(path, frames):
+    """Store (kind, payload, duration) frames as a frame ring file, timestamped with each frame's end."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    recorder = FrameRecorder(temporary, slots=len(frames))
+    elapsed = 0.0
+    for kind, payload, duration in frames:
+        elapsed += duration
+        recorder.record(kind, payload, elapsed)
+    recorder.close()
+    os.replace(temporary, path)  # Never leave a half-written cache behind
+
+def load_clip(path):
+    """The frames of a cached clip as (kind, payload, duration), or None if there is none."""
+    try:
+        recorded = read_recorded_frames(path)
+    except (OSError, ValueError):
+        return None
+    frames = []
+    previous_end = 0.0
+    for end, kind, payload in recorded:
+        frames.append((kind, payload, end - previous_end))
+        previous_end = end
+    return frames or None
+
+class PlaybackStats:
+    """Frames shown and dropped, and process CPU use, over one playback."""
+
+    def __init__(self):
+        self.shown = 0
+        self.dropped = 0
+        self.convert_time = 0.0
+        self.start = time.monotonic()
+        self.cpu_start = time.process_time()
+
+    def report(self):
+        elapsed = max(time.monotonic() - self.start, 1e-9)
+        return {
+            "fps": self.shown / elapsed,
+            "dropped": self.dropped,
+            "convert_ms_per_frame": self.convert_time / max(self.shown + self.dropped, 1) * 1000,
+            "cpu_percent": (time.process_time() - self.cpu_start) / elapsed * 100,
+        }
+
+def panel_output(serial_connection):
+    """Show (kind, payload) frames on a panel."""
+    def show(kind, payload):
+        if kind == KIND_GREY:
+            send_greyscale(serial_connection, [payload[col * HEIGHT:(col + 1) * HEIGHT] for col in range(WIDTH)])
+        else:
+            send_frame(serial_connection, payload)
+    return show
+
+def framebuffer_output(writer):
+    """Show (kind, payload) frames through the running dashboard's shared framebuffer."""
+    def show(kind, payload):
+        if kind == KIND_GREY:
+            writer.write_greyscale([payload[col * HEIGHT:(col + 1) * HEIGHT] for col in range(WIDTH)])
+        else:
+            writer.write_frame(payload)
+    return show
+
+def play_frames(show, frames, stats, record=None):
+    """Show frames on their own clock, dropping any whose time has already passed.
+
+    Returns True if every frame was played, so `record` holds the whole clip.
+    """
+    due = time.monotonic()
+    last_payload = None
+    for kind, payload, duration in frames:
+        if not playback_running:
+            return False
+        if record is not None:
+            record.append((kind, payload, duration))
+        now = time.monotonic()
+        if now >= due + duration:
+            stats.dropped += 1  # Late enough that the next frame is already due
+        else:
+            if now < due:
+                time.sleep(due - now)
+            if payload != last_payload:
+                show(kind, payload)
+                last_payload = payload
+            stats.shown += 1
+        due += duration
+    if due > time.monotonic():
+        time.sleep(due - time.monotonic())  # Hold the last frame for its duration
+    return True
+
+def play_clip(show, path, mode=PLAYBACK_MODE, loop=PLAYBACK_LOOP, stats=None):
+    """Play `path` until stopped, converting it once and replaying from the packed-frame cache."""
+    global playback_running
+    playback_running = True
+    stats = stats or PlaybackStats()
+    cached_path = cache_path(path, mode) if PLAYBACK_CACHE else None
+    frames = load_clip(cached_path) if cached_path else None
+    if DEBUG and frames:
+        print(f"Playing {path} from {cached_path}")
+
+    while playback_running:
+        if frames is not None:
+            play_frames(show, frames, stats)
+        else:
+            pipeline = ClipPipeline(path, mode)
+            recorded = []
+            try:
+                complete = play_frames(show, pipeline, stats, recorded)
+            finally:
+                pipeline.close()
+                stats.convert_time += pipeline.convert_time
+            if complete and not recorded:
+                raise RuntimeError(f"{path} has no frames")
+            if complete:
+                frames = recorded
+                if cached_path:
+                    save_clip(cached_path, recorded)
+        if not loop:
+            break
+
+# Play a clip in a separate thread
+def start_playback_thread(serial_connection, path, mode=PLAYBACK_MODE):
+    playback_thread = threading.Thread(target=play_clip, args=(panel_output(serial_connection), path, mode), daemon=True)
+    playback_thread.start()
+    return playback_thread
+
+# Main loop to detect the serial port, or use the dashboard's framebuffer, and play a clip
+def main_loop(path, mode=PLAYBACK_MODE, loop=PLAYBACK_LOOP, to_framebuffer=False, show_stats=False):
+    stats = PlaybackStats()
+    try:
+        if to_framebuffer:
+            from framebuffer import FramebufferWriter
+            writer = FramebufferWriter()
+            try:
+                play_clip(framebuffer_output(writer), path, mode, loop, stats)
+            finally:
+                writer.close()
+        else:
+            SERIAL_PORT = detect_serial_port()
+            if not SERIAL_PORT and needs_serial_port():
+                return
+            with open_output(SERIAL_PORT) as ser:
+                set_brightness(ser, BRIGHTNESS)
+                try:
+                    play_clip(panel_output(ser), path, mode, loop, stats)
+                finally:
+                    clear_leds(ser)
+
+    except (IOError, OSError, RuntimeError, ValueError) as ex:
+        print(f"Error: {ex}")
+    finally:
+        if show_stats:
+            print(stats.report(), file=sys.stderr)
+
+if __name__ == "__main__":
+    # Usage: python playback.py clip.gif [floyd|ordered|grey]
+    main_loop(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else PLAYBACK_MODE, loop=False, show_stats=True)
@@ -0,0 +1,82 @@
+# proc_counters.py
+import os
+import time
+from array import array
+
+NET_DEV = "/proc/net/dev"
+DISKSTATS = "/proc/diskstats"
+SYS_BLOCK = "/sys/block"
+SECTOR_SIZE = 512  # /proc/diskstats always counts 512-byte sectors
+READ_SIZE = 65536
+
+# Indexes into the counter and rate arrays
+NET_RX = 0
+NET_TX = 1
+DISK_READ = 2
+DISK_WRITE = 3
+
+# Block devices that would double count or are not real disks
+SKIPPED_DISK_PREFIXES = (b"loop", b"ram", b"zram", b"dm-", b"md", b"sr")
+
+def whole_disks(sys_block=SYS_BLOCK):
+    """Names of the physical whole-disk devices, discovered once."""
+    try:
+        names = os.listdir(sys_block)
+    except OSError:
+        return frozenset()
+    return frozenset(name.encode() for name in names if not name.encode().startswith(SKIPPED_DISK_PREFIXES))
+
+class ProcCounters:
+    """Network and disk byte totals read from /proc once per tick, with rates from the deltas."""
+
+    def __init__(self, net_dev=NET_DEV, diskstats=DISKSTATS, sys_block=SYS_BLOCK):
+        self.net_fd = os.open(net_dev, os.O_RDONLY)
+        self.disk_fd = os.open(diskstats, os.O_RDONLY)
+        self.disks = whole_disks(sys_block)
+        self.previous = array("Q", [0, 0, 0, 0])
+        self.current = array("Q", [0, 0, 0, 0])
+        self.rates = array("d", [0.0, 0.0, 0.0, 0.0])  # Bytes per second
+        self.last_time = None
+        self.sample()
+
+    def read_totals(self):
+        """Fill self.current with byte totals summed over interfaces and disks."""
+        rx = tx = 0
+        for line in os.pread(self.net_fd, READ_SIZE, 0).split(b"\n")[2:]:
+            name, _, fields = line.partition(b":")
+            if not fields or name.strip() == b"lo":
+                continue
+            fields = fields.split()
+            rx += int(fields[0])
+            tx += int(fields[8])
+
+        read = write = 0
+        for line in os.pread(self.disk_fd, READ_SIZE, 0).split(b"\n"):
+            fields = line.split()
+            if len(fields) > 9 and fields[2] in self.disks:
+                read += int(fields[5])
+                write += int(fields[9])
+
+        current = self.current
+        current[NET_RX] = rx
+        current[NET_TX] = tx
+        current[DISK_READ] = read * SECTOR_SIZE
+        current[DISK_WRITE] = write * SECTOR_SIZE
+
+    def sample(self, now=None):
+        """Read the counters and update self.rates; returns the rates array."""
+        if now is None:
+            now = time.monotonic()
+        self.previous, self.current = self.current, self.previous
+        self.read_totals()
+        if self.last_time is not None and now > self.last_time:
+            elapsed = now - self.last_time
+            for i in range(4):
+                delta = self.current[i] - self.previous[i]
+                self.rates[i] = delta / elapsed if delta > 0 else 0.0  # Counters can reset
+        self.last_time = now
+        return self.rates
+
+    def close(self):
+        os.close(self.net_fd)
+        os.close(self.disk_fd)
@@ -0,0 +1,153 @@
+# proc_top.py
+import errno
+import os
+import time
+from collections import OrderedDict
+
+PROC = "/proc"
+STAT_READ_SIZE = 1024
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+DISCOVER_EVERY = 4  # Samples between scans of /proc for new processes
+IDLE_EVERY = 8  # Samples between re-reads of processes that used no CPU last time
+MAX_OPEN_STATS = 64  # Stat files of recently busy processes kept open; the rest are opened per read
+OUT_OF_FDS = (errno.EMFILE, errno.ENFILE)
+
+# Indexes into each process entry
+FD = 0
+NAME = 1
+TICKS = 2
+TIME = 3
+CPU = 4
+IDLE = 5
+
+def parse_stat(data):
+    """Command name and user + system CPU ticks from the contents of /proc/<pid>/stat."""
+    open_paren = data.index(b"(")
+    close_paren = data.rindex(b")")  # Names can contain spaces and parentheses
+    fields = data[close_paren + 2:].split(b" ", 14)
+    return data[open_paren + 1:close_paren].decode(errors="replace"), int(fields[11]) + int(fields[12])
+
+class ProcessTable:
+    """Per-process CPU use from /proc/<pid>/stat.
+
+    New processes are found every DISCOVER_EVERY samples, and processes that were idle are only
+    re-read every IDLE_EVERY samples, spread evenly by PID, so most of a sample is the busy few.
+    The stat files of the MAX_OPEN_STATS most recently busy processes stay open between samples,
+    so a busy host cannot use up the descriptors the serial port and sockets need.
+    """
+
+    def __init__(self, proc=PROC):
+        self.proc = proc
+        self.processes = {}  # pid -> [fd or None, name, cpu ticks, read time, cpu percent, idle]
+        self.open_stats = OrderedDict()  # pids whose fd is open, least recently busy first
+        self.samples = 0
+        self.own_pid = os.getpid()
+        self.out_of_fds = 0  # Reads skipped because this process had no descriptors left
+
+    def read_stat(self, pid, process=None):
+        """Name and CPU ticks of `pid`, through its open stat file when it has one."""
+        if process is not None and process[FD] is not None:
+            return parse_stat(os.pread(process[FD], STAT_READ_SIZE, 0))
+        fd = os.open(os.path.join(self.proc, str(pid), "stat"), os.O_RDONLY)
+        try:
+            return parse_stat(os.pread(fd, STAT_READ_SIZE, 0))
+        finally:
+            os.close(fd)
+
+    def keep_open(self, pid, process):
+        """Keep the stat file of a busy process open, closing the least recently busy beyond the cap."""
+        if process[FD] is not None:
+            self.open_stats.move_to_end(pid)
+            return
+        try:
+            process[FD] = os.open(os.path.join(self.proc, str(pid), "stat"), os.O_RDONLY)
+        except OSError:
+            return  # Read by path next time instead
+        self.open_stats[pid] = True
+        if len(self.open_stats) > MAX_OPEN_STATS:
+            self.forget_fd(self.open_stats.popitem(last=False)[0])
+
+    def forget_fd(self, pid):
+        process = self.processes[pid]
+        os.close(process[FD])
+        process[FD] = None
+
+    def discover(self, now):
+        try:
+            entries = os.listdir(self.proc)
+        except OSError as ex:
+            if ex.errno not in OUT_OF_FDS:
+                raise
+            self.report_out_of_fds()
+            return
+        for entry in entries:
+            if entry.isdigit() and int(entry) not in self.processes:
+                try:
+                    name, ticks = self.read_stat(int(entry))
+                except OSError as ex:
+                    if ex.errno in OUT_OF_FDS:
+                        self.report_out_of_fds()
+                        return
+                    continue  # Exited since listdir
+                except (ValueError, IndexError):
+                    continue
+                self.processes[int(entry)] = [None, name, ticks, now, 0.0, False]
+
+    def report_out_of_fds(self):
+        self.out_of_fds += 1
+        if self.out_of_fds == 1:
+            print("Process table: out of file descriptors, skipping processes until some are free")
+
+    def sample(self, now=None):
+        """Update the CPU use of the processes due a read; returns the process table."""
+        if now is None:
+            now = time.monotonic()
+        idle_slot = self.samples % IDLE_EVERY
+        if self.samples % DISCOVER_EVERY == 0:
+            self.discover(now)
+        self.samples += 1
+
+        exited = []
+        for pid, process in self.processes.items():
+            if process[IDLE] and pid % IDLE_EVERY != idle_slot:
+                continue
+            try:
+                name, ticks = self.read_stat(pid, process)
+            except OSError as ex:
+                if ex.errno in OUT_OF_FDS:
+                    self.report_out_of_fds()  # Not an exit: read it again next time
+                else:
+                    exited.append(pid)  # Reads of a reaped process fail with ESRCH, opens with ENOENT
+                continue
+            except (ValueError, IndexError):
+                exited.append(pid)
+                continue
+            if ticks < process[TICKS]:  # The PID was reused by a new process
+                process[NAME], process[TICKS], process[CPU] = name, ticks, 0.0
+            delta = ticks - process[TICKS]
+            elapsed = now - process[TIME]
+            if elapsed > 0:
+                process[CPU] = delta / CLOCK_TICKS / elapsed * 100
+            process[TICKS] = ticks
+            process[TIME] = now
+            process[IDLE] = delta == 0
+            if delta:
+                self.keep_open(pid, process)
+        for pid in exited:
+            if pid in self.open_stats:
+                del self.open_stats[pid]
+                self.forget_fd(pid)
+            del self.processes[pid]
+        return self.processes
+
+    def top(self, count=5, include_self=False):
+        """The `count` busiest processes as [name, cpu percent] pairs, busiest first."""
+        busiest = sorted((process[CPU], pid) for pid, process in self.processes.items()
+                         if include_self or pid != self.own_pid)
+        return [[self.processes[pid][NAME], round(cpu, 1)] for cpu, pid in reversed(busiest[-count:])]
+
+    def close(self):
+        for pid in self.open_stats:
+            self.forget_fd(pid)
+        self.open_stats.clear()
+        self.processes.clear()
@@ -0,0 +1,136 @@
+# providers.py
+import asyncio
+import functools
+import json
+import threading
+import time
+from settings import DEBUG, PROVIDER_MODE, PROVIDER_LOG, REPLAY_SPEED
+
+# Active record/replay targets, set up by configure_providers()
+recorder = None
+replay_source = None
+configure_lock = threading.Lock()
+
+class Recorder:
+    """Append timestamped provider samples to a compact JSON-lines log."""
+
+    def __init__(self, path):
+        self.start = time.time()
+        self.lock = threading.Lock()
+        self.file = open(path, "w", buffering=1)
+        self.file.write(json.dumps({"start": self.start}) + "\n")
+
+    def write(self, name, value):
+        offset = round(time.time() - self.start, 3)
+        line = json.dumps([offset, name, value], separators=(",", ":"))
+        with self.lock:
+            self.file.write(line + "\n")
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+class ReplaySource:
+    """Feed recorded samples back in order, paced at `speed` times real time (0 = no waiting).
+
+    The recording's clock is replayed too (see provider_time), so forecasts and schedules see the
+    times the samples were taken at rather than today.
+    """
+
+    def __init__(self, path, speed=1.0):
+        self.speed = speed
+        self.samples = {}
+        self.positions = {}
+        self.lock = threading.Lock()
+        self.latest_offset = 0.0  # Offset of the newest sample handed out, the clock when not pacing
+        with open(path, "r") as f:
+            self.recorded_start = json.loads(f.readline())["start"]
+            for line in f:
+                if line.strip():
+                    offset, name, value = json.loads(line)
+                    self.samples.setdefault(name, []).append((offset, value))
+        self.start = time.time()
+
+    def has(self, name):
+        return name in self.samples
+
+    def next_sample(self, name):
+        """Return the next sample for `name` and the seconds until it is due."""
+        with self.lock:
+            samples = self.samples[name]
+            position = self.positions.get(name, 0)
+            self.positions[name] = min(position + 1, len(samples) - 1)
+        offset, value = samples[position]
+        with self.lock:
+            self.latest_offset = max(self.latest_offset, offset)
+        wait = self.start + offset / self.speed - time.time() if self.speed > 0 else 0
+        return value, max(0.0, wait)
+
+    def time(self):
+        """The recording's wall-clock time at this point of the replay."""
+        if self.speed > 0:
+            return self.recorded_start + (time.time() - self.start) * self.speed
+        return self.recorded_start + self.latest_offset
+
+    def next(self, name):
+        """Return the next sample for `name`, repeating the last one once the log runs out."""
+        value, wait = self.next_sample(name)
+        if wait > 0:
+            time.sleep(wait)
+        return value
+
+def provider_time():
+    """Wall-clock time as the data sources see it: the recording's clock while replaying."""
+    if replay_source is not None:
+        return replay_source.time()
+    return time.time()
+
+def start_recording(path):
+    global recorder
+    recorder = Recorder(path)
+
+def start_replay(path, speed=1.0):
+    global replay_source
+    replay_source = ReplaySource(path, speed)
+
+def configure_providers(mode=PROVIDER_MODE, path=PROVIDER_LOG, speed=REPLAY_SPEED):
+    """Set up recording or replay once per process according to the settings."""
+    with configure_lock:
+        if recorder is not None or replay_source is not None:
+            return
+        if mode == "record":
+            start_recording(path)
+        elif mode == "replay":
+            start_replay(path, speed)
+        if DEBUG and mode != "live":
+            print(f"Providers in {mode} mode using {path}")
+
+def provider(name):
+    """Route a data source through the active record/replay mode."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if replay_source is not None and replay_source.has(name):
+                return replay_source.next(name)
+            value = func(*args, **kwargs)
+            if recorder is not None:
+                recorder.write(name, value)
+            return value
+        return wrapper
+    return decorate
+
+def async_provider(name):
+    """Like provider, for coroutine data sources; replay waits without blocking the event loop."""
+    def decorate(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if replay_source is not None and replay_source.has(name):
+                value, wait = replay_source.next_sample(name)
+                await asyncio.sleep(wait)
+                return value
+            value = await func(*args, **kwargs)
+            if recorder is not None:
+                recorder.write(name, value)
+            return value
+        return wrapper
+    return decorate
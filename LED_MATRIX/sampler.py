@@ -0,0 +1,94 @@
+# sampler.py
+import subprocess
+import threading
+import time
+from settings import DEBUG
+from state_store import StateStore
+
+class SensorSampler:
+    """Read local sensors on one background thread, each at its own rate, into a single store."""
+
+    def __init__(self, store=None):
+        self.store = store or StateStore()
+        self.sources = {}  # name -> [read function, interval in seconds, next due time]
+        self.wake = threading.Event()
+        self.lock = threading.Lock()
+        self.running = False
+        self.watchers = []  # Event monitor processes started by trigger_on_output
+        self.closers = []  # Called by stop(), e.g. to release a source's open files
+        self.sampled = {}  # name -> monotonic time of its latest reading, published as "sampled"
+
+    def add_source(self, name, read, interval, close=None):
+        """Read `name` every `interval` seconds; `close()`, if given, is called when the sampler stops."""
+        with self.lock:
+            self.sources[name] = [read, interval, 0.0]
+            if close is not None:
+                self.closers.append(close)
+
+    def trigger(self, name):
+        """Read `name` on the next pass instead of waiting for its interval."""
+        with self.lock:
+            self.sources[name][2] = 0.0
+        self.wake.set()
+
+    def trigger_on_output(self, name, command):
+        """Re-read `name` whenever `command` prints a line, e.g. a mixer event monitor."""
+        def watch():
+            try:
+                with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL) as process:
+                    self.watchers.append(process)
+                    for _ in process.stdout:
+                        self.trigger(name)
+            except (IOError, OSError) as ex:
+                if DEBUG:
+                    print(f"Event watcher for {name} stopped: {ex}")
+        watcher = threading.Thread(target=watch, daemon=True)
+        watcher.start()
+        return watcher
+
+    def sample_due(self, now):
+        """Read every source that is due and publish the results as one snapshot.
+
+        "sampled" changes with every reading, so readers can tell a new sample from a repeated value.
+        """
+        with self.lock:
+            due = [(name, source) for name, source in self.sources.items() if source[2] <= now]
+            for _, source in due:
+                source[2] = now + source[1]
+        readings = {}
+        for name, (read, _, _) in due:
+            try:
+                readings[name] = read()
+            except Exception as e:
+                if DEBUG:
+                    print(f"Error sampling {name}: {e}")
+        if readings:
+            self.sampled.update((name, now) for name in readings)
+            self.store.publish(sampled=dict(self.sampled), **readings)
+
+    def next_due(self, now):
+        """Monotonic time at which the next source is due."""
+        with self.lock:
+            return min((source[2] for source in self.sources.values()), default=now + 1)
+
+    def run(self):
+        self.running = True
+        while self.running:
+            now = time.monotonic()
+            self.sample_due(now)
+            self.wake.wait(max(0.0, self.next_due(now) - time.monotonic()))
+            self.wake.clear()
+
+    def start(self):
+        sampler_thread = threading.Thread(target=self.run, daemon=True)
+        sampler_thread.start()
+        return sampler_thread
+
+    def stop(self):
+        self.running = False
+        self.wake.set()
+        for process in self.watchers:
+            process.terminate()
+        for close in self.closers:
+            close()
+        self.closers = []
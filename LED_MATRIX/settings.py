@@ -1,13 +1,122 @@
 # settings.py
+import os
 
 DEBUG = False  # Enable or disable debug mode
 DELAY = 0.2  # Delay used for display animation wait time
 BRIGHTNESS = 128 #0-255 how might are the leds
 
+# Automatic brightness
+AUTO_BRIGHTNESS = False  # Follow the ambient light sensor, or the sun when there is none
+MIN_BRIGHTNESS = 16  # Level in a dark room
+NIGHT_BRIGHTNESS = 32  # Level between sunset and sunrise without a light sensor
+BRIGHTNESS_SMOOTHING = 0.2  # Weight of each new light reading (lower is smoother)
+BRIGHTNESS_HYSTERESIS = 8  # Minimum change in level before a new brightness is sent
+IIO_ROOT = "/sys/bus/iio/devices"  # Where to look for the ambient light sensor
+
+SERIAL_PORT_OVERRIDE = None  # Use this port instead of detecting /dev/ttyACM*, e.g. an emulator pty
+
 # Constants for LED matrix display
 WIDTH = 9  # Number of columns on the LED matrix
 HEIGHT = 35  # Number of rows on the LED matrix
 
+# System monitor
+MONITOR_PAGES = ["usage"]  # Pages the monitor cycles through: any of "usage", "io", "thermal" and "top"
+MONITOR_PAGE_TIME = 10  # Seconds each page is shown
+
+SAMPLE_RATES = {  # Seconds between background reads of each local sensor
+    "battery": 10,
+    "charging": 2,
+    "volume": 5,  # Also re-read on mixer events when VOLUME_EVENTS is set
+    "cpu": 0.25,
+    "memory": 1,
+    "io": 0.25,
+    "thermal": 1,
+    "brightness": 1,
+    "processes": 2,  # Only sampled when the "top" page is shown
+}
+VOLUME_EVENTS = True  # Watch `amixer events` so volume changes show immediately
+HWMON_ROOT = "/sys/class/hwmon"  # Point at a fake tree (hwmon.make_fake_hwmon) to develop without sensors
+TEMP_GRAPH_MIN = 30  # Degrees C shown as an empty temperature bar
+TEMP_GRAPH_MAX = 100  # Degrees C shown as a full temperature bar
+FAN_GRAPH_MAX = 6000  # RPM shown as a full fan bar
+HISTORY_VIEW = "seconds"  # Span of the CPU and memory graphs: "seconds" (the latest samples), "hour" or "day"
+METRIC_HISTORY = True  # Keep CPU and memory samples on disk, with minute and hour averages, so graphs survive restarts
+METRIC_HISTORY_DIR = os.path.join(os.environ.get("XDG_STATE_HOME", os.path.expanduser("~/.local/state")), "fw16-led")
+
+# Screen changes
+TRANSITION = "wipe"  # Effect between the dashboard and pushed items: "wipe", "slide", "dissolve" or None
+TRANSITION_TIME = 0.4  # Seconds a transition takes
+
+# Weather refresh
+WEATHER_REFRESH_INTERVAL = 3600  # Seconds between hourly forecast downloads
+WEATHER_RETRY_INTERVAL = 60  # Seconds before trying again after a failed download
+NEXT_HOURS = 0  # Upcoming hours to scroll after the forecast word (0 disables)
+
+# Data provider record/replay
+PROVIDER_MODE = "live"  # "live", "record" or "replay"
+PROVIDER_LOG = "providers.log"  # Sample log written when recording, read when replaying
+REPLAY_SPEED = 1.0  # Replay pacing as a multiple of real time (0 replays as fast as possible)
+
+# Clock widget in the dashboard's free rows, updated exactly when the digits change
+CLOCK_WIDGET = None  # None, "time" (hours over minutes) or "date" (day over month)
+CLOCK_24_HOUR = True
+COUNTDOWN_HOLD = 5  # Seconds a finished countdown keeps flashing 00 00
+
+# Calendar widget: the next event from local .ics files, scrolled in place of the private IP
+SHOW_CALENDAR = False
+CALENDAR_PATHS = [os.path.expanduser("~/.calendars")]  # .ics files, or directories searched for them (e.g. vdirsyncer's)
+CALENDAR_HORIZON_DAYS = 30  # How far ahead recurring events are expanded into the index
+CALENDAR_POLL_INTERVAL = 60  # Seconds between checks for changed files when inotify cannot watch them
+
+# Worker supervision
+WORKER_BACKOFF_MIN = 1  # Seconds before restarting a failed worker the first time
+WORKER_BACKOFF_MAX = 60  # Longest wait between restarts of a worker that keeps failing
+WORKER_STUCK_AFTER = 30  # Seconds without a heartbeat before a worker is reported stuck
+
+# Dashboard runtime: "threads" (a thread per worker) or "asyncio" (one event loop)
+RUNTIME = "threads"
+HTTP_TIMEOUT = 10  # Seconds an asyncio-runtime web request may take before it is cancelled
+LOOP_LAG_WARNING = 0.1  # Seconds the event loop may be blocked before it is reported
+
+# Idle screen shown while there is no public IP: "breaker" or "life"
+IDLE_SCREEN = "breaker"
+LIFE_RULE = "B3/S23"  # Birth/survival neighbour counts, e.g. "B36/S23" for HighLife
+LIFE_DELAY = 0.2  # Seconds per generation
+LIFE_HISTORY = 64  # Recent boards remembered to spot cycles before reseeding
+
+# Audio spectrum visualizer (needs NumPy)
+AUDIO_SOURCE = "monitor"  # "monitor" (what is playing), "capture" (microphone), a .wav file, a FIFO or "-" for stdin
+AUDIO_RATE = 44100  # Sample rate asked of recorders and assumed for raw pipes (s16le mono)
+SPECTRUM_FPS = 40  # Frames per second; each frame analyses the newest audio
+SPECTRUM_FFT_SIZE = 2048  # Samples per FFT window
+SPECTRUM_MIN_FREQ = 40  # Hz at the left edge of the first band
+SPECTRUM_MAX_FREQ = 16000  # Hz at the right edge of the last band
+SPECTRUM_FLOOR_DB = -60  # Band level shown as an empty bar (0 dB is a full-scale sine)
+SPECTRUM_DECAY = 0.75  # Brightness a bar top keeps each frame as it fades
+
+# GIF and video playback (needs NumPy, plus Pillow for GIFs or ffmpeg for anything else)
+PLAYBACK_MODE = "floyd"  # "floyd" (Floyd-Steinberg) or "ordered" (Bayer) dithering to 1-bit, or "grey"
+PLAYBACK_FPS = 30  # Frame rate video is decoded at; GIFs keep their own frame durations
+PLAYBACK_PREFETCH = 64  # Converted frames decoded ahead of the display
+PLAYBACK_LOOP = True
+PLAYBACK_CACHE = True  # Keep converted clips as packed frames so replays skip decoding
+PLAYBACK_CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "fw16-led")
+
+# Push API for external messages and frames
+CONTROL_SOCKET = os.path.join(os.environ.get("XDG_RUNTIME_DIR", "/tmp"), "fw16-led.sock")
+PUSH_DEFAULT_TTL = 10  # Seconds a pushed item stays on screen unless the client sets a ttl
+
+# Shared-memory framebuffer for high-rate producers such as video (framebuffer.FramebufferWriter)
+SHARED_FRAMEBUFFER = False  # Creates the framebuffer file and its FIFO when the dashboard starts
+SHARED_FRAMEBUFFER_PATH = os.path.join(os.environ.get("XDG_RUNTIME_DIR", "/dev/shm"), "fw16-led.fb")
+SHARED_FRAMEBUFFER_PRIORITY = 0  # Priority of its frames against pushed items
+SHARED_FRAMEBUFFER_TTL = 1  # Seconds the last frame stays up after its producer stops
+
+# Output backends: "serial" for the module, "terminal" for a preview, "record" for a frame ring file
+OUTPUT_BACKENDS = ["serial"]
+RECORDER_PATH = "frames-{name}.ring"  # {name} is the serial port name, e.g. frames-ttyACM0.ring
+RECORDER_SLOTS = 3000  # Frames kept in the ring file (10 minutes at the 0.2 s display delay)
+
 #fallback location if location api fails
 LATITUDE = 30.06 
 LONGITUDE = -85.56
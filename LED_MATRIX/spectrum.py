@@ -0,0 +1,271 @@
+# spectrum.py
+import fcntl
+import os
+import shutil
+import subprocess
+import sys
+import termios
+import threading
+import time
+import wave
+from backends import open_output, needs_serial_port
+from led_serial import detect_serial_port, set_brightness, clear_leds, send_greyscale
+from settings import (DEBUG, AUDIO_SOURCE, AUDIO_RATE, SPECTRUM_FPS, SPECTRUM_FFT_SIZE, SPECTRUM_MIN_FREQ,
+                      SPECTRUM_MAX_FREQ, SPECTRUM_FLOOR_DB, SPECTRUM_DECAY)
+
+WIDTH = 9
+HEIGHT = 34
+SAMPLE_BYTES = 2  # Signed 16-bit little-endian mono
+PIPE_LATENCY_MS = 10  # Audio buffered by the recorder before it reaches us
+STATS_INTERVAL = 5  # Seconds between stats lines in debug mode
+
+# Global flag to stop the visualizer thread
+spectrum_running = False
+
+def stop_spectrum():
+    global spectrum_running
+    spectrum_running = False
+
+def import_numpy():
+    """NumPy is only needed by the visualizer, so it is imported when one starts."""
+    try:
+        import numpy
+    except ImportError:
+        raise RuntimeError("The spectrum visualizer needs NumPy: pip install numpy")
+    return numpy
+
+class FdSource:
+    """Raw PCM from a pipe, FIFO or recorder process, always returning the newest audio."""
+
+    def __init__(self, fd, rate, process=None):
+        self.fd = fd
+        self.rate = rate
+        self.process = process
+        self.partial = bytearray()  # Odd trailing byte of a sample split across reads
+        self.np = import_numpy()
+
+    def read(self, count):
+        """Block for `count` samples, plus anything else already waiting so a slow frame never builds a backlog."""
+        data = self.partial
+        needed = count * SAMPLE_BYTES
+        while len(data) < needed:
+            chunk = os.read(self.fd, needed - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        waiting = int.from_bytes(fcntl.ioctl(self.fd, termios.FIONREAD, b"\0\0\0\0"), sys.byteorder)
+        if waiting:
+            data += os.read(self.fd, waiting)
+        whole = len(data) - len(data) % SAMPLE_BYTES
+        self.partial = data[whole:]
+        return self.np.frombuffer(bytes(data[:whole]), dtype="<i2")
+
+    def close(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait()
+        os.close(self.fd)
+
+class WavSource:
+    """Samples from a WAV file, paced like live audio unless `realtime` is False."""
+
+    def __init__(self, path, realtime=True):
+        self.np = import_numpy()
+        self.wav = wave.open(path, "rb")
+        if self.wav.getsampwidth() != SAMPLE_BYTES:
+            raise ValueError(f"{path}: only 16-bit WAV files are supported")
+        self.rate = self.wav.getframerate()
+        self.channels = self.wav.getnchannels()
+        self.realtime = realtime
+        self.start = None
+        self.position = 0
+
+    def read(self, count):
+        if self.start is None:
+            self.start = time.monotonic()
+        if self.realtime:
+            delay = self.start + (self.position + count) / self.rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        data = self.wav.readframes(count)
+        if not data:
+            return None
+        self.position += count
+        samples = self.np.frombuffer(data, dtype="<i2")
+        if self.channels > 1:
+            samples = samples.reshape(-1, self.channels).mean(axis=1)
+        return samples
+
+    def close(self):
+        self.wav.close()
+
+def open_audio_source(source=AUDIO_SOURCE, rate=AUDIO_RATE):
+    """Open "monitor" (what is playing), "capture" (the microphone), a WAV file, a FIFO or "-" for stdin.
+
+    Pipes and FIFOs carry raw signed 16-bit little-endian mono at `rate`.
+    """
+    if source == "-":
+        return FdSource(os.dup(sys.stdin.fileno()), rate)
+    if source in ("monitor", "capture"):
+        if shutil.which("parec"):
+            command = ["parec", "--format=s16le", f"--rate={rate}", "--channels=1",
+                       f"--latency-msec={PIPE_LATENCY_MS}"]
+            if source == "monitor":
+                command.append("--device=@DEFAULT_MONITOR@")
+        elif source == "capture" and shutil.which("arecord"):
+            command = ["arecord", "-q", "-t", "raw", "-f", "S16_LE", "-r", str(rate), "-c", "1",
+                       f"--buffer-time={PIPE_LATENCY_MS * 1000}"]
+        else:
+            raise RuntimeError(f"No recorder for the {source} source (install pulseaudio-utils or alsa-utils)")
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0)
+        return FdSource(os.dup(process.stdout.fileno()), rate, process)
+    if source.lower().endswith(".wav"):
+        return WavSource(source)
+    return FdSource(os.open(source, os.O_RDONLY), rate)
+
+class StreamRing:
+    """The last `size` samples of a stream, overwritten in place."""
+
+    def __init__(self, np, size):
+        self.np = np
+        self.buffer = np.zeros(size, dtype=np.float32)
+        self.position = 0
+
+    def write(self, samples):
+        size = len(self.buffer)
+        samples = samples[-size:]
+        end = self.position + len(samples)
+        if end <= size:
+            self.buffer[self.position:end] = samples
+        else:
+            split = size - self.position
+            self.buffer[self.position:] = samples[:split]
+            self.buffer[:end - size] = samples[split:]
+        self.position = end % size
+
+    def latest(self):
+        """The buffered samples, oldest first."""
+        return self.np.concatenate((self.buffer[self.position:], self.buffer[:self.position]))
+
+class SpectrumAnalyzer:
+    """Windowed FFT of the newest samples, summed into log-spaced bands and scaled to 0-1."""
+
+    def __init__(self, np, rate, fft_size=SPECTRUM_FFT_SIZE, bands=WIDTH):
+        self.np = np
+        self.window = np.hanning(fft_size).astype(np.float32)
+        # A full-scale sine through the Hann window peaks at 32768 * fft_size / 4: call that 0 dB
+        self.reference = (32768 * fft_size / 4) ** 2
+        max_freq = min(SPECTRUM_MAX_FREQ, rate / 2)
+        edges = np.geomspace(SPECTRUM_MIN_FREQ, max_freq, bands + 1) * fft_size / rate
+        edges = np.round(edges).astype(int)
+        edges = np.maximum(edges, np.arange(bands + 1) + 1)  # Every band gets at least one bin
+        for i in range(1, len(edges)):
+            edges[i] = max(edges[i], edges[i - 1] + 1)
+        self.starts = edges[:-1]
+        self.end = edges[-1]
+
+    def levels(self, samples):
+        power = self.np.abs(self.np.fft.rfft(samples * self.window)[:self.end]) ** 2
+        band_power = self.np.add.reduceat(power, self.starts) / self.reference
+        decibels = 10 * self.np.log10(band_power + 1e-12)
+        return self.np.clip(1 - decibels / SPECTRUM_FLOOR_DB, 0.0, 1.0)
+
+class SpectrumRenderer:
+    """Turn band levels into greyscale bars whose tops fade out instead of dropping."""
+
+    def __init__(self, np, decay=SPECTRUM_DECAY):
+        self.np = np
+        self.decay = decay
+        self.canvas = np.zeros((WIDTH, HEIGHT), dtype=np.float32)  # Column-major, like the module
+        self.height_above_bottom = np.arange(HEIGHT - 1, -1, -1, dtype=np.float32)
+
+    def render(self, levels):
+        """Return the 9 columns of 34 brightness values for `levels`."""
+        bars = self.np.clip(levels[:, None] * HEIGHT - self.height_above_bottom, 0.0, 1.0)
+        self.np.maximum(self.canvas * self.decay, bars, out=self.canvas)
+        return [column.tobytes() for column in (self.canvas * 255).astype(self.np.uint8)]
+
+class SpectrumStats:
+    """Frame rate, per-frame processing time and process CPU use of the visualizer."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.frames = 0
+        self.frame_times = []
+        self.start = time.monotonic()
+        self.cpu_start = time.process_time()
+
+    def add(self, seconds):
+        self.frames += 1
+        self.frame_times.append(seconds)
+
+    def report(self):
+        elapsed = max(time.monotonic() - self.start, 1e-9)
+        times = sorted(self.frame_times) or [0.0]
+        return {
+            "fps": self.frames / elapsed,
+            "frame_median_ms": times[len(times) // 2] * 1000,
+            "frame_max_ms": times[-1] * 1000,
+            "cpu_percent": (time.process_time() - self.cpu_start) / elapsed * 100,
+        }
+
+def spectrum_animation(serial_connection, source=AUDIO_SOURCE, stats=None):
+    """Draw the spectrum of `source` until stopped or the audio ends, adding every frame to `stats`."""
+    global spectrum_running
+    spectrum_running = True
+    np = import_numpy()
+    audio = open_audio_source(source)
+    hop = max(1, audio.rate // SPECTRUM_FPS)  # New samples per frame; also bounds the latency
+    ring = StreamRing(np, SPECTRUM_FFT_SIZE)
+    analyzer = SpectrumAnalyzer(np, audio.rate)
+    renderer = SpectrumRenderer(np)
+    stats = stats or SpectrumStats()
+    recent = SpectrumStats()  # Printed and reset every STATS_INTERVAL in debug mode
+
+    try:
+        while spectrum_running:
+            samples = audio.read(hop)
+            if samples is None:
+                break
+            frame_start = time.perf_counter()
+            ring.write(samples)
+            columns = renderer.render(analyzer.levels(ring.latest()))
+            send_greyscale(serial_connection, columns)
+            frame_time = time.perf_counter() - frame_start
+            stats.add(frame_time)
+            recent.add(frame_time)
+            if DEBUG and time.monotonic() - recent.start >= STATS_INTERVAL:
+                print(f"Spectrum: {recent.report()}")
+                recent.reset()
+    finally:
+        audio.close()
+        clear_leds(serial_connection)
+
+# Start the visualizer in a separate thread
+def start_spectrum_thread(serial_connection, source=AUDIO_SOURCE):
+    spectrum_thread = threading.Thread(target=spectrum_animation, args=(serial_connection, source), daemon=True)
+    spectrum_thread.start()
+
+# Main loop to detect the serial port and run the visualizer
+def main_loop(source=AUDIO_SOURCE, show_stats=False):
+    SERIAL_PORT = detect_serial_port()
+    if not SERIAL_PORT and needs_serial_port():
+        return
+
+    try:
+        with open_output(SERIAL_PORT) as ser:
+            set_brightness(ser, 64)
+            stats = SpectrumStats()
+            try:
+                spectrum_animation(ser, source, stats)
+            finally:
+                if show_stats:
+                    print(stats.report(), file=sys.stderr)
+
+    except (IOError, OSError, RuntimeError) as ex:
+        print(f"Error: {ex}")
+
+if __name__ == "__main__":
+    main_loop(sys.argv[1] if len(sys.argv) > 1 else AUDIO_SOURCE, show_stats=True)
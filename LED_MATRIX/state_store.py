@@ -0,0 +1,57 @@
+# state_store.py
+import threading
+from types import MappingProxyType
+
+class StateStore:
+    """Shared values published as immutable, versioned snapshots that readers can wait on."""
+
+    def __init__(self, **initial):
+        self.condition = threading.Condition()
+        # Version and snapshot live in one tuple so readers get a consistent pair without locking
+        self.current = (0, MappingProxyType(dict(initial)))
+        self.listeners = []  # Called after every new version, e.g. to wake an event loop
+
+    def snapshot(self):
+        """Return the latest (version, snapshot) pair."""
+        return self.current
+
+    def publish(self, **changes):
+        """Apply `changes` as a new snapshot; returns the version, unchanged if nothing differs."""
+        with self.condition:
+            version, snapshot = self.current
+            if all(key in snapshot and snapshot[key] == value for key, value in changes.items()):
+                return version
+            data = dict(snapshot)
+            data.update(changes)
+            self.current = (version + 1, MappingProxyType(data))
+            self.condition.notify_all()
+        self.call_listeners()
+        return version + 1
+
+    def notify(self):
+        """Wake waiting readers without changing any value, e.g. when an outside event needs a redraw."""
+        with self.condition:
+            version, snapshot = self.current
+            self.current = (version + 1, snapshot)
+            self.condition.notify_all()
+        self.call_listeners()
+
+    def add_listener(self, callback):
+        """Call `callback()` whenever the version changes; it runs on the publishing thread."""
+        self.listeners.append(callback)
+
+    def call_listeners(self):
+        for callback in self.listeners:
+            callback()
+
+    def wait_for_change(self, since_version, timeout=None):
+        """Block until the version differs from `since_version` or `timeout` passes; returns (version, snapshot)."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.current[0] != since_version, timeout)
+            return self.current
+
+    def wait_until(self, predicate, timeout=None):
+        """Block until predicate(snapshot) is true or `timeout` passes; returns (version, snapshot)."""
+        with self.condition:
+            self.condition.wait_for(lambda: predicate(self.current[1]), timeout)
+            return self.current
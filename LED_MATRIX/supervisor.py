@@ -0,0 +1,154 @@
+# supervisor.py
+import threading
+import time
+import traceback
+from settings import DEBUG, WORKER_BACKOFF_MIN, WORKER_BACKOFF_MAX, WORKER_STUCK_AFTER
+
+HEARTBEAT_INTERVAL = 10  # Longest a supervised loop should block between heartbeats
+BACKOFF_RESET = 60  # A worker that ran this long before failing restarts after the minimum backoff
+CHECK_INTERVAL = 5  # Seconds between health checks
+
+# The worker running on each supervised thread, for heartbeat()
+WORKERS_BY_THREAD = {}
+
+def heartbeat():
+    """Mark the start of a loop iteration on the calling worker; does nothing outside a supervisor."""
+    worker = WORKERS_BY_THREAD.get(threading.get_ident())
+    if worker is not None:
+        worker.beat()
+
+class Worker:
+    """One supervised loop: its thread, restart schedule and heartbeat statistics."""
+
+    def __init__(self, name, target, args, stuck_after, slow_after):
+        self.name = name
+        self.target = target
+        self.args = args
+        self.stuck_after = stuck_after  # None for loops that legitimately block, e.g. on a socket
+        self.slow_after = slow_after  # Longest expected time between heartbeats, or None
+        self.thread = None
+        self.started = None
+        self.restarts = 0
+        self.backoff = WORKER_BACKOFF_MIN
+        self.restart_at = None
+        self.last_error = None
+        self.last_beat = None
+        self.last_interval = None
+        self.max_interval = 0.0
+        self.stuck = False
+        self.slow = False
+        self.finished = False  # Returned normally: nothing left to do, so it is not restarted
+
+    def beat(self):
+        now = time.monotonic()
+        if self.last_beat is not None and self.last_beat > self.started:
+            self.last_interval = now - self.last_beat
+            self.max_interval = max(self.max_interval, self.last_interval)
+        self.last_beat = now
+
+class Supervisor:
+    """Run worker loops on daemon threads, restart them with exponential backoff and report unhealthy ones."""
+
+    def __init__(self):
+        self.workers = []
+        self.wake = threading.Event()
+        self.running = False
+
+    def add(self, name, target, *args, stuck_after=WORKER_STUCK_AFTER, slow_after=None):
+        self.workers.append(Worker(name, target, args, stuck_after, slow_after))
+
+    def run_worker(self, worker):
+        WORKERS_BY_THREAD[threading.get_ident()] = worker
+        try:
+            worker.target(*worker.args)
+            worker.finished = True
+            if DEBUG:
+                print(f"Worker {worker.name} finished")
+        except Exception as e:
+            worker.last_error = f"{type(e).__name__}: {e}"
+            print(f"Error in {worker.name} thread: {worker.last_error}")
+            if DEBUG:
+                traceback.print_exc()
+        finally:
+            del WORKERS_BY_THREAD[threading.get_ident()]
+            self.wake.set()  # Schedule the restart now rather than at the next check
+
+    def start_worker(self, worker):
+        worker.started = worker.last_beat = time.monotonic()
+        worker.last_interval = None
+        worker.stuck = worker.slow = False
+        worker.thread = threading.Thread(target=self.run_worker, args=(worker,), name=worker.name, daemon=True)
+        worker.thread.start()
+
+    def check(self, now=None):
+        """Restart workers that are due and report stuck or slow ones; returns when the next restart is due."""
+        now = time.monotonic() if now is None else now
+        next_restart = None
+        for worker in self.workers:
+            if worker.finished:
+                continue
+            if not worker.thread.is_alive():
+                if worker.restart_at is None:
+                    if now - worker.started >= BACKOFF_RESET:
+                        worker.backoff = WORKER_BACKOFF_MIN
+                    worker.restart_at = now + worker.backoff
+                    print(f"Restarting {worker.name} in {worker.backoff:g}s")
+                    worker.backoff = min(worker.backoff * 2, WORKER_BACKOFF_MAX)
+                if now >= worker.restart_at:
+                    worker.restart_at = None
+                    worker.restarts += 1
+                    self.start_worker(worker)
+                else:
+                    next_restart = min(next_restart or worker.restart_at, worker.restart_at)
+                continue
+
+            stuck = worker.stuck_after is not None and now - worker.last_beat > worker.stuck_after
+            if stuck != worker.stuck:
+                if stuck:
+                    print(f"Worker {worker.name} looks stuck: no heartbeat for {now - worker.last_beat:.0f}s")
+                else:
+                    print(f"Worker {worker.name} recovered")
+                worker.stuck = stuck
+
+            slow = (worker.slow_after is not None and worker.last_interval is not None
+                    and worker.last_interval > worker.slow_after)
+            if slow and not worker.slow:
+                print(f"Worker {worker.name} is slow: {worker.last_interval:.1f}s per loop, expected {worker.slow_after:g}s")
+            worker.slow = slow
+        return next_restart
+
+    def status(self):
+        """Health of every worker, e.g. for debugging."""
+        now = time.monotonic()
+        return {worker.name: {
+            "alive": worker.thread is not None and worker.thread.is_alive(),
+            "finished": worker.finished,
+            "restarts": worker.restarts,
+            "last_error": worker.last_error,
+            "since_heartbeat": now - worker.last_beat if worker.last_beat is not None else None,
+            "last_interval": worker.last_interval,
+            "max_interval": worker.max_interval,
+            "stuck": worker.stuck,
+            "slow": worker.slow,
+        } for worker in self.workers}
+
+    def run(self):
+        self.running = True
+        while self.running:
+            next_restart = self.check()
+            timeout = CHECK_INTERVAL
+            if next_restart is not None:
+                timeout = min(timeout, max(0.0, next_restart - time.monotonic()))
+            self.wake.wait(timeout)
+            self.wake.clear()
+
+    def start(self):
+        for worker in self.workers:
+            self.start_worker(worker)
+        supervisor_thread = threading.Thread(target=self.run, name="supervisor", daemon=True)
+        supervisor_thread.start()
+        return supervisor_thread
+
+    def stop(self):
+        self.running = False
+        self.wake.set()
@@ -1,11 +1,25 @@
 import psutil
 import time
-import serial
 import os
 import subprocess
 import glob
-from settings import DEBUG, BRIGHTNESS
+import math
+from functools import lru_cache
+from settings import DEBUG, BRIGHTNESS, SERIAL_PORT_OVERRIDE
 from led_serial import set_brightness
+from providers import provider, configure_providers, provider_time
+from backends import open_output, needs_serial_port
+from proc_counters import ProcCounters, NET_RX, NET_TX, DISK_READ, DISK_WRITE
+from settings import MONITOR_PAGES, MONITOR_PAGE_TIME, SAMPLE_RATES, VOLUME_EVENTS
+from settings import TEMP_GRAPH_MIN, TEMP_GRAPH_MAX, FAN_GRAPH_MAX
+from settings import HISTORY_VIEW, METRIC_HISTORY, PROVIDER_MODE
+from sampler import SensorSampler
+from hwmon import HwmonReader
+from brightness import BrightnessController
+from supervisor import heartbeat
+from proc_top import ProcessTable
+from generation import scroll_text, sanitize_text
+from metric_history import open_history, VIEWS
 
 FWK_MAGIC = [0x32, 0xAC]
 SERIAL_PORT = None  # Placeholder for the serial port that will be detected
@@ -13,9 +27,48 @@ WIDTH = 9  # Number of columns
 HEIGHT = 34  # Number of rows
 CPU_HISTORY = [[0] * 10 for _ in range(9)]  # Initialize a 9x10 grid for CPU history
 MEMORY_HISTORY = [[0] * 10 for _ in range(9)]  # Initialize a 9x10 grid for memory history
+LAST_SAMPLED = {}  # name -> "sampled" time of the reading last added to its graph
+FIRST_READINGS_TIMEOUT = 1  # Seconds to wait for every sensor before drawing with defaults for the missing ones
+DEFAULT_READINGS = {  # Drawn for a sensor that has not produced a reading, e.g. because it keeps failing
+    "battery": 0,
+    "charging": False,
+    "volume": 0,
+    "cpu": 0,
+    "memory": 0,
+    "io": (0, 0, 0, 0),
+    "thermal": {"cpu_temp": None, "gpu_temp": None, "fan": None},
+    "brightness": BRIGHTNESS,
+    "processes": [],
+}
+METRIC_HISTORIES = {}  # "cpu" and "memory" -> MetricHistory, opened by open_metric_histories
+VIEW_MARKERS = {  # Line under the CPU graph, showing the span of the graphs
+    "seconds": [1] * 9,
+    "hour": [1, 0, 1, 0, 1, 0, 1, 0, 1],
+    "day": [1, 1, 0, 1, 1, 0, 1, 1, 0],
+}
+IO_COUNTERS = None  # ProcCounters, opened on first use
+HWMON_READER = None  # HwmonReader, discovered on first use
+PROCESS_TABLE = None  # ProcessTable, scanned on first use
+TOP_PROCESSES = 3  # Processes listed on the top page
+MONITOR_FRAME_TIME = 0.25  # Seconds between monitor frames
+VOLUME_EVENTS_COMMAND = ['amixer', 'events']  # Prints a line on every mixer change
+SENSOR_NAMES = ("battery", "charging", "volume", "cpu", "memory", "io", "thermal", "brightness")
+if "top" in MONITOR_PAGES:
+    SENSOR_NAMES += ("processes",)  # Only sampled while the page is shown
+THERMAL_GRAPH_ROWS = 9  # Height of each graph on the thermal page
+CPU_TEMP_HISTORY = [[0] * THERMAL_GRAPH_ROWS for _ in range(9)]  # CPU temperature, one column per sample
+GPU_TEMP_HISTORY = [[0] * THERMAL_GRAPH_ROWS for _ in range(9)]  # GPU temperature
+FAN_HISTORY = [[0] * THERMAL_GRAPH_ROWS for _ in range(9)]  # Fastest fan speed
+IO_GRAPH_ROWS = 7  # Height of each throughput graph on the io page
+NET_RX_HISTORY = [[0] * IO_GRAPH_ROWS for _ in range(9)]  # Network receive, one column per sample
+NET_TX_HISTORY = [[0] * IO_GRAPH_ROWS for _ in range(9)]  # Network transmit
+DISK_READ_HISTORY = [[0] * IO_GRAPH_ROWS for _ in range(9)]  # Disk reads
+DISK_WRITE_HISTORY = [[0] * IO_GRAPH_ROWS for _ in range(9)]  # Disk writes
 
 def detect_serial_port():
     """Detect the first available /dev/ttyACM* port."""
+    if SERIAL_PORT_OVERRIDE:
+        return SERIAL_PORT_OVERRIDE
     ports = glob.glob('/dev/ttyACM*')
     if ports:
         return ports[0]  # Return the first available serial port
@@ -34,24 +87,23 @@ def set_brightness(serial_connection, brightness_level):
     command = FWK_MAGIC + [0x00, brightness_level]  # 0x00 is CommandVals.Brightness
     send_command_raw(serial_connection, command)
 
+@lru_cache(maxsize=None)
+def battery_icon_rows(led_count):
+    """Build the battery icon with `led_count` of the 6 charge LEDs lit, once per count."""
+    return (
+        (1, 1, 1, 1, 1, 1, 1, 1, 0),  # Row 1 (top)
+        (1,) + tuple(1 if j < led_count else 0 for j in range(6)) + (1, 1),  # Row 2 (charge level)
+        (1, 1, 1, 1, 1, 1, 1, 1, 0),  # Row 3 (bottom)
+    )
+
 def display_battery_icon(battery_percentage, combined_grid):
     """Display the battery icon with dynamic second row indicating charge level."""
-    
-    # Battery icon structure
-    battery_icon = [
-        [1, 1, 1, 1, 1, 1, 1, 1, 0],  # Row 1 (top)
-        [1, 0, 0, 0, 0, 0, 0, 1, 1],  # Row 2 (dynamic row for battery level)
-        [1, 1, 1, 1, 1, 1, 1, 1, 0],  # Row 3 (bottom)
-    ]
-    
-    # Update row 2 based on battery percentage
     led_count = int(6 * (battery_percentage / 100))  # 6 LEDs to display charge level
-    for i in range(1, led_count + 1):
-        battery_icon[1][i] = 1
+    battery_icon = battery_icon_rows(led_count)
 
     # Insert the battery icon into the combined grid (assumed to be rows 0-2 in the combined grid)
     for row in range(3):
-        combined_grid[row] = battery_icon[row]
+        combined_grid[row] = list(battery_icon[row])
 
     return combined_grid
 
@@ -136,12 +188,94 @@ def shift_and_update_memory_usage(memory_usage):
     # Update the last column with the new memory usage value (list of row values for the last column)
     MEMORY_HISTORY[8] = [1 if row < usage_rows else 0 for row in range(10)]
 
+def usage_column(usage_percentage):
+    """A 10-row bar for a usage percentage; empty where nothing was recorded."""
+    if usage_percentage is None:
+        return [0] * 10
+    usage_rows = map_percentage_to_rows(usage_percentage)
+    return [1 if row < usage_rows else 0 for row in range(10)]
+
+def load_history_view(view=None):
+    """Redraw the CPU and memory graphs from the stored view, e.g. on startup or a view change."""
+    for name, history in (("cpu", CPU_HISTORY), ("memory", MEMORY_HISTORY)):
+        if name in METRIC_HISTORIES:
+            history[:] = [usage_column(value) for value in METRIC_HISTORIES[name].view(view or HISTORY_VIEW)]
+
+def set_history_view(view):
+    """Switch the CPU and memory graphs between the "seconds", "hour" and "day" views."""
+    global HISTORY_VIEW
+    if view not in VIEWS:
+        raise ValueError(f"unknown history view {view!r}")
+    HISTORY_VIEW = view
+    load_history_view()
+
+def open_metric_histories():
+    """Open the on-disk CPU and memory histories, so the graphs start where they left off."""
+    if not METRIC_HISTORY:
+        return
+    for name in ("cpu", "memory"):
+        if name not in METRIC_HISTORIES:  # Kept open when a supervisor restarts the monitor
+            try:
+                METRIC_HISTORIES[name] = open_history(name)
+            except (IOError, OSError, ValueError) as ex:
+                print(f"No {name} history: {ex}")
+    load_history_view()
+
+def recorded(name, read):
+    """Wrap a sensor read so every value is also added to the metric's history."""
+    history = METRIC_HISTORIES.get(name)
+    if history is None or PROVIDER_MODE == "replay":  # Replayed samples would land at today's times
+        return read
+    def read_and_record():
+        value = read()
+        history.add(value)
+        return value
+    return read_and_record
+
+def history_spacer():
+    """A spacer whose line shows which view the graphs are in."""
+    spacer = add_spacer()
+    spacer[1] = list(VIEW_MARKERS[HISTORY_VIEW])
+    return spacer
+
+def map_rate_to_rows(bytes_per_second, rows=IO_GRAPH_ROWS):
+    """Map a throughput to a bar height on a log scale, from 1 KiB/s (1 row) to 1 GiB/s (all rows)."""
+    if bytes_per_second < 1024:
+        return 0
+    return min(rows, 1 + int((math.log2(bytes_per_second) - 10) * (rows - 1) / 20))
+
+def shift_and_update_history(history, usage_rows):
+    """Shift a bar history to the left and add a column with `usage_rows` lit from the bottom."""
+    for i in range(8):
+        history[i] = history[i + 1]
+    history[8] = [1 if row < usage_rows else 0 for row in range(len(history[0]))]
+
+def update_io_histories(rates):
+    """Add the latest network and disk rates from ProcCounters to their graphs."""
+    shift_and_update_history(NET_RX_HISTORY, map_rate_to_rows(rates[NET_RX]))
+    shift_and_update_history(NET_TX_HISTORY, map_rate_to_rows(rates[NET_TX]))
+    shift_and_update_history(DISK_READ_HISTORY, map_rate_to_rows(rates[DISK_READ]))
+    shift_and_update_history(DISK_WRITE_HISTORY, map_rate_to_rows(rates[DISK_WRITE]))
+
+def map_range_to_rows(value, low, high, rows=THERMAL_GRAPH_ROWS):
+    """Map a value between `low` and `high` to a bar height (0 when unknown or at the bottom)."""
+    if value is None or value <= low:
+        return 0
+    return min(rows, 1 + int((value - low) * (rows - 1) / (high - low)))
+
+def update_thermal_histories(thermal):
+    """Add the latest temperatures and fan speed from HwmonReader to their graphs."""
+    shift_and_update_history(CPU_TEMP_HISTORY, map_range_to_rows(thermal["cpu_temp"], TEMP_GRAPH_MIN, TEMP_GRAPH_MAX))
+    shift_and_update_history(GPU_TEMP_HISTORY, map_range_to_rows(thermal["gpu_temp"], TEMP_GRAPH_MIN, TEMP_GRAPH_MAX))
+    shift_and_update_history(FAN_HISTORY, map_range_to_rows(thermal["fan"], 0, FAN_GRAPH_MAX))
+
 def display_usage_icon(usage_history, combined_grid, start_row):
     """Display CPU or memory usage history as bars on the matrix, starting from the bottom."""
     # Populate the grid based on usage history, starting from the bottom (row 9) and moving up
+    height = len(usage_history[0])
     for col in range(9):
-        for row in range(10):
-            combined_grid[start_row + (9 - row)][col] = usage_history[col][row]  # Update the combined grid
+        for row in range(height):
+            combined_grid[start_row + (height - 1 - row)][col] = usage_history[col][row]  # Update the combined grid
 
     return combined_grid
 
@@ -173,6 +307,83 @@ def combine_icons(battery_icon, volume_icon, cpu_icon, memory_icon):
     combined.extend(memory_icon)
     return combined
 
+def render_usage_page(combined_grid, battery_level, charging, volume_level, cycle_count):
+    """Battery, volume, CPU history and memory usage."""
+    # Check if charging
+    if charging:
+        # Animate battery if charging
+        combined_grid = animate_battery_charge(battery_level, combined_grid, cycle_count)
+    else:
+        # Display static battery level if not charging
+        combined_grid = display_battery_icon(battery_level, combined_grid)
+
+    # Add spacer after battery
+    spacer = add_spacer()
+    combined_grid[3:6] = spacer
+
+    combined_grid = display_volume_icon(volume_level, combined_grid)
+
+    # Add spacer after volume
+    spacer = add_spacer()
+    combined_grid[8:11] = spacer
+
+    combined_grid = display_usage_icon(CPU_HISTORY, combined_grid, start_row=11)  # CPU icon at rows 17-26
+
+    # Add spacer after CPU
+    combined_grid[21:24] = history_spacer()
+
+    # Memory usage history
+    combined_grid = display_usage_icon(MEMORY_HISTORY, combined_grid, start_row=24)  # Memory icon at rows 24-33
+
+    return combined_grid
+
+def render_thermal_page(combined_grid):
+    """CPU and GPU temperature and fan speed graphs."""
+    combined_grid = display_usage_icon(CPU_TEMP_HISTORY, combined_grid, start_row=0)  # Rows 0-8
+    combined_grid[9:12] = add_spacer()
+    combined_grid = display_usage_icon(GPU_TEMP_HISTORY, combined_grid, start_row=12)  # Rows 12-20
+    combined_grid[21:24] = add_spacer()
+    combined_grid = display_usage_icon(FAN_HISTORY, combined_grid, start_row=24)  # Rows 24-32
+    combined_grid[33] = [0] * 9
+    return combined_grid
+
+def render_io_page(combined_grid):
+    """Network receive/transmit and disk read/write throughput graphs."""
+    combined_grid = display_usage_icon(NET_RX_HISTORY, combined_grid, start_row=0)  # Rows 0-6
+    combined_grid[7] = [0] * 9
+    combined_grid = display_usage_icon(NET_TX_HISTORY, combined_grid, start_row=8)  # Rows 8-14
+
+    # Spacer between the network and disk graphs
+    combined_grid[15:18] = add_spacer()
+
+    combined_grid = display_usage_icon(DISK_READ_HISTORY, combined_grid, start_row=18)  # Rows 18-24
+    combined_grid[25] = [0] * 9
+    combined_grid = display_usage_icon(DISK_WRITE_HISTORY, combined_grid, start_row=26)  # Rows 26-32
+    combined_grid[33] = [0] * 9
+    return combined_grid
+
+def render_top_page(combined_grid, top_processes, cycle_count):
+    """CPU history above the busiest processes, each a scrolling name and CPU% with a usage bar."""
+    combined_grid = display_usage_icon(CPU_HISTORY, combined_grid, start_row=0)  # Rows 0-9
+    combined_grid[10:13] = history_spacer()
+
+    for line in range(TOP_PROCESSES):
+        start_row = 13 + line * 7  # Text, usage bar and a blank row for each process
+        if line < len(top_processes):
+            name, cpu = top_processes[line]
+            text_grid = scroll_text(sanitize_text(f"{name} {cpu:.0f}"))
+            offset = cycle_count % len(text_grid[0])
+            for row in range(5):
+                visible = text_grid[row][offset:offset + 9]
+                combined_grid[start_row + row] = visible + text_grid[row][:9 - len(visible)]
+            lit = min(9, math.ceil(cpu * 9 / 100))  # A process using more than one core fills the bar
+            combined_grid[start_row + 5] = [1] * lit + [0] * (9 - lit)
+        else:
+            combined_grid[start_row:start_row + 6] = [[0] * 9 for _ in range(6)]
+        combined_grid[start_row + 6] = [0] * 9
+    return combined_grid
+
+@provider("battery")
 def get_battery_level():
     """Retrieve the battery level from the system."""
     try:
@@ -183,33 +394,26 @@ def get_battery_level():
         print("Could not find battery capacity file.")
         return 0
     
+@lru_cache(maxsize=None)
+def battery_charge_sequence(initial_led_count):
+    """Icons for one charging cycle, filling up from the current level to full."""
+    return tuple(battery_icon_rows(min(initial_led_count + step, 6)) for step in range(7 - initial_led_count))
+
 def animate_battery_charge(current_battery_level, combined_grid, cycle_count):
     """Animate battery filling up one LED at a time, starting from current battery level."""
-    
-    # Convert battery percentage to number of filled LEDs (0-6)
-    initial_led_count = int(6 * (current_battery_level / 100))
-
-    # Calculate the total number of LEDs to be filled in the animation
-    animated_led_count = initial_led_count + (cycle_count % (7 - initial_led_count))
-
-    # Ensure that we don't exceed the maximum 6 LEDs
-    led_count = min(animated_led_count, 6)
-
-    # Construct the battery icon with animated LED count
-    battery_icon = [
-        [1, 1, 1, 1, 1, 1, 1, 1, 0],  # Top border
-        [1] + [1 if j < led_count else 0 for j in range(6)] + [1, 1],  # Animated row
-        [1, 1, 1, 1, 1, 1, 1, 1, 0],  # Bottom border
-    ]
+    initial_led_count = min(int(6 * (current_battery_level / 100)), 6)
+    sequence = battery_charge_sequence(initial_led_count)
+    battery_icon = sequence[cycle_count % len(sequence)]
 
     # Update the combined grid with the current battery icon
     for row in range(3):
-        combined_grid[row] = battery_icon[row]
+        combined_grid[row] = list(battery_icon[row])
 
     return combined_grid
 
 
 
+@provider("charging")
 def is_charging():
     """Check if the laptop is charging."""
     try:
@@ -223,6 +427,42 @@ def is_charging():
         return False
 
 
+@provider("cpu")
+def get_cpu_usage():
+    """Retrieve the CPU usage since the previous call."""
+    return psutil.cpu_percent()
+
+@provider("memory")
+def get_memory_usage():
+    """Retrieve the current memory usage percentage."""
+    return psutil.virtual_memory().percent
+
+@provider("io")
+def get_io_rates():
+    """Retrieve network RX/TX and disk read/write rates in bytes per second."""
+    global IO_COUNTERS
+    if IO_COUNTERS is None:
+        IO_COUNTERS = ProcCounters()
+    return tuple(IO_COUNTERS.sample())
+
+@provider("thermal")
+def get_thermal_readings():
+    """Retrieve CPU/GPU temperatures and fan speed from hwmon."""
+    global HWMON_READER
+    if HWMON_READER is None:
+        HWMON_READER = HwmonReader()
+    return HWMON_READER.read()
+
+@provider("processes")
+def get_top_processes():
+    """Retrieve the busiest processes as [name, cpu percent] pairs."""
+    global PROCESS_TABLE
+    if PROCESS_TABLE is None:
+        PROCESS_TABLE = ProcessTable()
+    PROCESS_TABLE.sample()
+    return PROCESS_TABLE.top(TOP_PROCESSES)
+
+@provider("volume")
 def get_system_volume():
     """Retrieve the current system volume level."""
     try:
@@ -238,79 +478,141 @@ def get_system_volume():
         print(f"Error retrieving system volume: {e}")
         return 0
         
+def build_sensor_sampler():
+    """A sampler with every local sensor added at the rates in SAMPLE_RATES, not yet running."""
+    open_metric_histories()
+    sampler = SensorSampler()
+    sampler.add_source("battery", get_battery_level, SAMPLE_RATES["battery"])
+    sampler.add_source("charging", is_charging, SAMPLE_RATES["charging"])
+    sampler.add_source("volume", get_system_volume, SAMPLE_RATES["volume"])
+    sampler.add_source("cpu", recorded("cpu", get_cpu_usage), SAMPLE_RATES["cpu"])
+    sampler.add_source("memory", recorded("memory", get_memory_usage), SAMPLE_RATES["memory"])
+    sampler.add_source("io", get_io_rates, SAMPLE_RATES["io"])
+    sampler.add_source("thermal", get_thermal_readings, SAMPLE_RATES["thermal"])
+    brightness = BrightnessController()
+    sampler.add_source("brightness", lambda: brightness.update() or brightness.level, SAMPLE_RATES["brightness"],
+                       close=brightness.close)
+    if "top" in MONITOR_PAGES:
+        sampler.add_source("processes", get_top_processes, SAMPLE_RATES["processes"])
+    return sampler
+
+def start_sensor_sampler():
+    """Sample every local sensor in the background at the rates in SAMPLE_RATES."""
+    sampler = build_sensor_sampler()
+    if VOLUME_EVENTS:
+        sampler.trigger_on_output("volume", VOLUME_EVENTS_COMMAND)
+    sampler.start()
+    return sampler
+
+def has_all_readings(readings):
+    """True once the sampler has read every sensor the monitor draws."""
+    return all(name in readings for name in SENSOR_NAMES)
+
+def with_defaults(readings):
+    """The readings, with defaults for sensors that have not been read."""
+    return {**DEFAULT_READINGS, **readings}
+
+def is_new_sample(readings, name):
+    """True the first time a frame sees the latest reading of `name`, so graphs advance at its sample rate."""
+    sampled = readings.get("sampled")
+    if sampled is None:
+        return True  # Not from a SensorSampler: every frame is a sample
+    if name not in sampled or LAST_SAMPLED.get(name) == sampled[name]:
+        return False
+    LAST_SAMPLED[name] = sampled[name]
+    return True
+
+def render_monitor_frame(combined_grid, readings, cycle_count):
+    """Add new readings to the histories and draw the current page; returns the grid and command."""
+    readings = with_defaults(readings)
+    battery_level = readings["battery"]
+    volume_level = readings["volume"] or 0
+    cpu_usage = readings["cpu"]
+    memory_usage = readings["memory"]
+
+    if DEBUG:
+        # Print for debugging
+        print(f"Memory Usage: {memory_usage}%")
+        print(f"CPU Usage: {cpu_usage}%")
+
+    if HISTORY_VIEW != "seconds":
+        load_history_view()  # Minute or hour averages, never a rescan of the samples
+    else:
+        # Update CPU and memory usage history and shift
+        if is_new_sample(readings, "cpu"):
+            shift_and_update_cpu_usage(cpu_usage)
+        if is_new_sample(readings, "memory"):
+            shift_and_update_memory_usage(memory_usage)
+
+    if is_new_sample(readings, "io"):
+        update_io_histories(readings["io"])
+    if is_new_sample(readings, "thermal"):
+        update_thermal_histories(readings["thermal"])
+
+    # Pages take turns every MONITOR_PAGE_TIME seconds
+    page = MONITOR_PAGES[int(provider_time() / MONITOR_PAGE_TIME) % len(MONITOR_PAGES)]
+    if page == "io":
+        combined_grid = render_io_page(combined_grid)
+    elif page == "thermal":
+        combined_grid = render_thermal_page(combined_grid)
+    elif page == "top":
+        combined_grid = render_top_page(combined_grid, readings["processes"], cycle_count)
+    else:
+        combined_grid = render_usage_page(combined_grid, battery_level, readings["charging"], volume_level, cycle_count)
+
+    # Flatten the combined grid (34 rows by 9 columns = 306 bits)
+    flattened_vals = [val for row in combined_grid for val in row]
+    
+    # Prepare the `vals` array (39 bytes)
+    vals = [0x00 for _ in range(39)]
+    for i in range(min(len(flattened_vals), 306)):  # 306 bits for 34x9 grid
+        if flattened_vals[i]:
+            vals[i // 8] |= (1 << (i % 8))  # Convert to bytes
+
+    return combined_grid, FWK_MAGIC + [0x06] + vals
+
 def main_loop():
     global SERIAL_PORT
+    configure_providers()
     SERIAL_PORT = detect_serial_port()
-    if not SERIAL_PORT:
+    if not SERIAL_PORT and needs_serial_port():
         print("No serial port found. Exiting...")
         return
 
+    sampler = None
+
+    # Serial errors are left to the caller: the supervisor restarts the monitor, the command line prints them
     try:
-        with serial.Serial(SERIAL_PORT, 115200) as ser:
-            set_brightness(ser, BRIGHTNESS)  # Set brightness to 25%
+        with open_output(SERIAL_PORT) as ser:
             combined_grid = [[0] * 9 for _ in range(34)]  # Initialize a 9x34 grid for the full display
 
             cycle_count = 0  # Used to track cycles for animations
+            last_brightness = None
+            sampler = start_sensor_sampler()
+            sensors = sampler.store
+            # A sensor that keeps failing is drawn with its default rather than holding up every frame
+            sensors.wait_until(has_all_readings, FIRST_READINGS_TIMEOUT)
 
             while True:
-                battery_level = get_battery_level()  # Get actual battery level
-                volume_level = get_system_volume()  # Get actual volume level
-                cpu_usage = psutil.cpu_percent()  # Get current CPU usage
-                memory_usage = psutil.virtual_memory().percent  # Get current memory usage
-
-                if DEBUG:
-                    # Print for debugging
-                    print(f"Memory Usage: {memory_usage}%")
-                    print(f"CPU Usage: {cpu_usage}%")
-
-                # Update CPU usage history and shift
-                shift_and_update_cpu_usage(cpu_usage)
-
-                # Check if charging
-                if is_charging():
-                    # Animate battery if charging
-                    combined_grid = animate_battery_charge(battery_level, combined_grid, cycle_count)
-                else:
-                    # Display static battery level if not charging
-                    combined_grid = display_battery_icon(battery_level, combined_grid)
-
-                # Add spacer after battery
-                spacer = add_spacer()
-                combined_grid[3:6] = spacer
-
-                combined_grid = display_volume_icon(volume_level, combined_grid)
-
-                # Add spacer after volume
-                spacer = add_spacer()
-                combined_grid[8:11] = spacer
-
-                combined_grid = display_usage_icon(CPU_HISTORY, combined_grid, start_row=11)  # CPU icon at rows 17-26
-
-                # Add spacer after CPU
-                spacer = add_spacer()
-                combined_grid[21:24] = spacer
-
-                # Memory usage history
-                memory_history = [[1 if row < map_percentage_to_rows(memory_usage) else 0 for row in range(10)] for _ in range(9)]
-                combined_grid = display_usage_icon(memory_history, combined_grid, start_row=24)  # Memory icon at rows 24-33
-
-                # Flatten the combined grid (34 rows by 9 columns = 306 bits)
-                flattened_vals = [val for row in combined_grid for val in row]
-                
-                # Prepare the `vals` array (39 bytes)
-                vals = [0x00 for _ in range(39)]
-                for i in range(min(len(flattened_vals), 306)):  # 306 bits for 34x9 grid
-                    if flattened_vals[i]:
-                        vals[i // 8] |= (1 << (i % 8))  # Convert to bytes
-
-                command = FWK_MAGIC + [0x06] + vals
+                heartbeat()
+
+                # Latest readings from the sampler thread; rendering never waits on a sensor
+                readings = with_defaults(sensors.snapshot()[1])
+
+                # Only send brightness when the controller picks a new level
+                if readings["brightness"] != last_brightness:
+                    set_brightness(ser, readings["brightness"])
+                    last_brightness = readings["brightness"]
+
+                combined_grid, command = render_monitor_frame(combined_grid, readings, cycle_count)
                 send_command_raw(ser, command)
 
                 cycle_count += 1  # Increment cycle count to control animations
-                time.sleep(.25)  # Wait 1 second
+                time.sleep(MONITOR_FRAME_TIME)
 
-    except (IOError, OSError) as ex:
-        print(f"Error: {ex}")
+    finally:
+        if sampler is not None:
+            sampler.stop()  # A restarted monitor starts its own sampler
 
 if __name__ == "__main__":
     main_loop()
@@ -1,9 +1,19 @@
 # weather.py
+from bisect import bisect_right
+from datetime import datetime
 import requests
 from settings import LATITUDE, LONGITUDE, DEBUG
+from providers import provider, provider_time
 
 LOCATION_API = f"http://ip-api.com/json/"
 
+# Hourly forecast kept in memory between network refreshes
+FORECAST_URL = None
+FORECAST_PERIODS = []  # Parsed periods, ordered by start time
+FORECAST_ENDS = []  # End timestamps of FORECAST_PERIODS, for bisecting
+FORECAST_VALIDATORS = {}  # ETag / Last-Modified of the cached forecast
+
+@provider("forecast_url")
 def get_nws_forecast_url():
     latitude = LATITUDE
     longitude = LONGITUDE
@@ -30,18 +40,106 @@ def get_nws_forecast_url():
             print(NWS_POINTS_API)
         return None
 
-def get_current_temperature_and_icon_from_forecast(forecast_url):
+def parse_period(period):
+    """Keep only the fields the display needs from an NWS forecast period."""
+    return {
+        "start": datetime.fromisoformat(period['startTime']),
+        "end": datetime.fromisoformat(period['endTime']),
+        "temperature": period['temperature'],
+        "shortForecast": period['shortForecast'],
+    }
+
+@provider("forecast")
+def fetch_forecast(forecast_url, headers):
+    """Download the hourly forecast; returns the status, raw periods and cache validators."""
     try:
-        response = requests.get(forecast_url)
+        response = requests.get(forecast_url, headers=headers)
+        if response.status_code == 304:
+            return {"status": 304}
         forecast_data = response.json()
-        current_period = forecast_data['properties']['periods'][0]
-        current_temp = current_period['temperature']
-        short_forecast = current_period['shortForecast']
-        return current_temp, short_forecast
+        return {
+            "status": response.status_code,
+            "periods": forecast_data['properties']['periods'],
+            "etag": response.headers.get('ETag'),
+            "last_modified": response.headers.get('Last-Modified'),
+        }
     except Exception as e:
         if DEBUG:
             print(f"Error getting forecast data: {e}")
+        return None
+
+def conditional_headers(forecast_url):
+    """Headers that let the server answer 304 when the cached forecast is still current."""
+    headers = {}
+    if forecast_url == FORECAST_URL and FORECAST_PERIODS:
+        if "etag" in FORECAST_VALIDATORS:
+            headers['If-None-Match'] = FORECAST_VALIDATORS["etag"]
+        if "last_modified" in FORECAST_VALIDATORS:
+            headers['If-Modified-Since'] = FORECAST_VALIDATORS["last_modified"]
+    return headers
+
+def refresh_forecast(forecast_url):
+    """Refresh the cached hourly periods, using a conditional request when possible."""
+    return apply_forecast(forecast_url, fetch_forecast(forecast_url, conditional_headers(forecast_url)))
+
+def apply_forecast(forecast_url, result):
+    """Cache the periods of a fetch_forecast result; returns False if the fetch failed."""
+    global FORECAST_URL, FORECAST_PERIODS, FORECAST_ENDS, FORECAST_VALIDATORS
+    if result is None:
+        return False
+    if result["status"] == 304:
+        if DEBUG:
+            print("Forecast not modified, keeping cached periods")
+        return True
+
+    try:
+        periods = [parse_period(period) for period in result["periods"]]
+    except Exception as e:
+        if DEBUG:
+            print(f"Error parsing forecast periods: {e}")
+        return False
+
+    FORECAST_URL = forecast_url
+    FORECAST_PERIODS = periods
+    FORECAST_ENDS = [period["end"].timestamp() for period in periods]
+    FORECAST_VALIDATORS = {}
+    if result["etag"]:
+        FORECAST_VALIDATORS["etag"] = result["etag"]
+    if result["last_modified"]:
+        FORECAST_VALIDATORS["last_modified"] = result["last_modified"]
+    return True
+
+def get_current_period(now=None):
+    """Return the cached period covering `now`, or None if the cache does not reach it."""
+    if now is None:
+        now = provider_time()
+    index = bisect_right(FORECAST_ENDS, now)
+    if index >= len(FORECAST_PERIODS):
+        return None
+    period = FORECAST_PERIODS[index]
+    if period["start"].timestamp() > now:
+        return None
+    return period
+
+def get_current_temperature_and_icon_from_forecast(forecast_url):
+    refresh_forecast(forecast_url)
+    current_period = get_current_period()
+    if current_period is None:
         return 00, "None"
+    return current_period['temperature'], current_period['shortForecast']
+
+def format_period_hour(period):
+    """Format a period's start as a short local hour, e.g. 3P or 11A."""
+    hour = period["start"].hour
+    return f"{hour % 12 or 12}{'A' if hour < 12 else 'P'}"
+
+def get_next_hours_text(count, now=None):
+    """Build a scrolling summary of the next `count` hourly temperatures."""
+    if now is None:
+        now = provider_time()
+    index = bisect_right(FORECAST_ENDS, now) + 1
+    upcoming = FORECAST_PERIODS[index:index + count]
+    return " ".join(f"{format_period_hour(period)} {period['temperature']}" for period in upcoming)
 
 def get_forecast_text(short_forecast):
     short_forecast = short_forecast.lower()
@@ -1,8 +1,16 @@
+import os
+import sys
 import time
-import serial
+
+# The port detection and output backends live with the LED matrix scripts
+LED_MATRIX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "LED_MATRIX")
+if LED_MATRIX_DIR not in sys.path:
+    sys.path.insert(0, LED_MATRIX_DIR)
+
+from led_serial import detect_serial_port
+from backends import open_output, needs_serial_port
 
 FWK_MAGIC = [0x32, 0xAC]
-SERIAL_PORT = '/dev/ttyACM0'  # Assuming we use ACM0 for the LED controller
 
 # Constants for the color values
 COLORS = {
@@ -13,38 +21,112 @@ COLORS = {
 }
 
 # Initialize the number of LEDs in your matrix
-NUM_LEDS = 9 * 34  # Adjust to 9x34 or however many LEDs you have
+WIDTH = 9
+NUM_LEDS = WIDTH * 34  # Adjust to 9x34 or however many LEDs you have, LED x, y is x + WIDTH * y
+
+# RGB commands. Partial updates need firmware that understands RGB_RUN and RGB_FILL, so they are
+# off unless DELTA_COMMANDS is set; without them unchanged frames are still skipped.
+RGB_DRAW = 0x06  # Whole frame: NUM_LEDS RGB triples
+RGB_RUN = 0x30  # Start LED and count (2 bytes little-endian each), then count RGB triples
+RGB_FILL = 0x31  # Start LED and count (2 bytes little-endian each), then one RGB triple for all of them
+DELTA_COMMANDS = False
+MERGE_GAP = 2  # Unchanged LEDs between two runs that are cheaper to resend than a new run header
 
 def send_command_raw(serial_connection, command):
     try:
-        serial_connection.write(command)
+        serial_connection.write(bytes(command))
     except (IOError, OSError) as ex:
         print(f"Error sending command: {ex}")
 
-def set_rgb_all(serial_connection, r, g, b):
-    """Set all LEDs to the same RGB value."""
-    vals = []
-    
-    # Loop over each LED and set the RGB values for each one
+def changed_runs(old, new):
+    """(start, end) LED ranges where `new` differs from `old`, merging runs split by short gaps."""
+    runs = []
     for led in range(NUM_LEDS):
-        vals += [r, g, b]
-    
-    # Send the RGB values to the matrix
-    command = FWK_MAGIC + [0x06] + vals[:NUM_LEDS * 3]  # 0x06 is the command to set LED values
-    send_command_raw(serial_connection, command)
+        if old[led * 3:led * 3 + 3] != new[led * 3:led * 3 + 3]:
+            if runs and led - runs[-1][1] <= MERGE_GAP:
+                runs[-1][1] = led + 1
+            else:
+                runs.append([led, led + 1])
+    return runs
+
+def encode_run(frame, start, end):
+    """One command redrawing LEDs start to end, as a fill when they all share a color."""
+    pixels = frame[start * 3:end * 3]
+    header = FWK_MAGIC + [RGB_FILL if pixels == pixels[:3] * (end - start) else RGB_RUN]
+    header += list(start.to_bytes(2, "little") + (end - start).to_bytes(2, "little"))
+    return bytes(header) + (pixels[:3] if header[2] == RGB_FILL else pixels)
+
+class RgbDeltaEncoder:
+    """Remember the last frame sent and send only what changed, or the whole frame when that is shorter."""
+
+    def __init__(self, delta_commands=None):
+        # Read when the encoder is made, so setting DELTA_COMMANDS after import takes effect
+        self.delta_commands = DELTA_COMMANDS if delta_commands is None else delta_commands
+        self.last = None
+        self.frames_sent = 0
+        self.bytes_sent = 0
+
+    def encode(self, frame):
+        """Return the commands that turn the last frame into `frame` (none if it is unchanged)."""
+        frame = bytes(frame)
+        if len(frame) != NUM_LEDS * 3:
+            raise ValueError(f"RGB frame must be {NUM_LEDS * 3} bytes")
+        if frame == self.last:
+            return []
+        commands = [bytes(FWK_MAGIC + [RGB_DRAW]) + frame]
+        if self.last is not None and self.delta_commands:
+            delta = [encode_run(frame, start, end) for start, end in changed_runs(self.last, frame)]
+            if sum(len(command) for command in delta) < len(commands[0]):
+                commands = delta
+        self.last = frame
+        return commands
+
+    def send(self, serial_connection, frame):
+        commands = self.encode(frame)
+        for command in commands:
+            send_command_raw(serial_connection, command)
+        if commands:
+            self.frames_sent += 1
+            self.bytes_sent += sum(len(command) for command in commands)
+
+def set_rgb_all(serial_connection, r, g, b, encoder=None):
+    """Set all LEDs to the same RGB value."""
+    frame = bytes([r, g, b]) * NUM_LEDS
+    if encoder is not None:
+        encoder.send(serial_connection, frame)
+    else:
+        send_command_raw(serial_connection, FWK_MAGIC + [RGB_DRAW] + list(frame))
 
 def cycle_colors(serial_connection):
     """Cycle through red, green, blue, and white across all LEDs."""
+    encoder = RgbDeltaEncoder()
     while True:
         for color, (r, g, b) in COLORS.items():
             print(f"Setting color: {color}")
-            set_rgb_all(serial_connection, r, g, b)
+            set_rgb_all(serial_connection, r, g, b, encoder)
             time.sleep(2)  # Display each color for 2 seconds
 
-def main():
+def wipe_colors(serial_connection, delay=0.02):
+    """Sweep each color down the matrix one row per frame; each frame only changes one row."""
+    encoder = RgbDeltaEncoder()
+    frame = bytearray(NUM_LEDS * 3)
+    while True:
+        for color, rgb in COLORS.items():
+            for row in range(NUM_LEDS // WIDTH):
+                frame[row * WIDTH * 3:(row + 1) * WIDTH * 3] = bytes(rgb) * WIDTH
+                encoder.send(serial_connection, frame)
+                time.sleep(delay)
+
+EFFECTS = {"cycle": cycle_colors, "wipe": wipe_colors}
+
+def main(effect="cycle"):
+    port = detect_serial_port()
+    if not port and needs_serial_port():
+        print("No serial port found. Exiting...")
+        return
     try:
-        with serial.Serial(SERIAL_PORT, 115200) as ser:
-            cycle_colors(ser)  # This will now loop indefinitely
+        with open_output(port) as ser:
+            EFFECTS[effect](ser)  # This will now loop indefinitely
     except (IOError, OSError) as ex:
         print(f"Error: {ex}")
 